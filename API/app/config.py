@@ -41,6 +41,86 @@ class Settings:
     API_TITLE: str = "E-Sport Social Platform API"
     API_VERSION: str = "2.0"
 
+    # Presence ("looking to play now")
+    PRESENCE_TTL_SECONDS: int = int(os.getenv("PRESENCE_TTL_SECONDS", "120"))
+    PRESENCE_MATCH_BOOST: int = int(os.getenv("PRESENCE_MATCH_BOOST", "10"))
+
+    # Collaborative filtering recommendations
+    RECOMMENDATIONS_TOP_K: int = int(os.getenv("RECOMMENDATIONS_TOP_K", "20"))
+    RECOMMENDATIONS_REFRESH_SECONDS: int = int(os.getenv("RECOMMENDATIONS_REFRESH_SECONDS", "3600"))
+    RECOMMENDATIONS_MATCH_WEIGHT: int = int(os.getenv("RECOMMENDATIONS_MATCH_WEIGHT", "15"))
+
+    # Player search: "like" (substring scan), "fulltext" (ngram FULLTEXT indexes,
+    # migration 013) or "fuzzy" (typo-tolerant username search in memory)
+    PLAYER_SEARCH_ENGINE: str = os.getenv("PLAYER_SEARCH_ENGINE", "like")
+
+    # Search suggestions indexes (full rebuild interval, to pick up other workers' changes)
+    SUGGESTIONS_REFRESH_SECONDS: int = int(os.getenv("SUGGESTIONS_REFRESH_SECONDS", "600"))
+    # Trie nodes a fuzzy username lookup visits at most (closest branches first)
+    SUGGESTIONS_FUZZY_MAX_NODES: int = int(os.getenv("SUGGESTIONS_FUZZY_MAX_NODES", "20000"))
+
+    # Player facets index (full rebuild interval, to pick up other workers' changes)
+    FACETS_REFRESH_SECONDS: int = int(os.getenv("FACETS_REFRESH_SECONDS", "600"))
+
+    # Realtime pub/sub ("local" for a single worker, "redis" across workers)
+    REALTIME_BACKEND: str = os.getenv("REALTIME_BACKEND", "local")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Server-sent events (notifications stream)
+    SSE_HEARTBEAT_SECONDS: int = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+    SSE_RETRY_MILLISECONDS: int = int(os.getenv("SSE_RETRY_MILLISECONDS", "5000"))
+
+    # Incremental sync: longest transaction expected to hold an unseen message
+    # or notification ID (rows newer than this are re-scanned until stable)
+    SYNC_SAFETY_WINDOW_SECONDS: int = int(os.getenv("SYNC_SAFETY_WINDOW_SECONDS", "60"))
+    # Most rows of one stream a sync token may list as already returned
+    # (beyond it the client is asked to reload and start over)
+    SYNC_MAX_SEEN_IDS: int = int(os.getenv("SYNC_MAX_SEEN_IDS", "1000"))
+
+    # Unread notification counters
+    NOTIFICATION_COUNT_CACHE_SIZE: int = int(os.getenv("NOTIFICATION_COUNT_CACHE_SIZE", "100000"))
+    NOTIFICATION_COUNT_CACHE_TTL_SECONDS: int = int(os.getenv("NOTIFICATION_COUNT_CACHE_TTL_SECONDS", "30"))
+    NOTIFICATION_COUNTER_RECONCILE_SECONDS: int = int(os.getenv("NOTIFICATION_COUNTER_RECONCILE_SECONDS", "3600"))
+    NOTIFICATION_BULK_ROWS_PER_SECOND: int = int(os.getenv("NOTIFICATION_BULK_ROWS_PER_SECOND", "5000"))
+
+    # Notification coalescing (0 disables it) and retention of read notifications
+    NOTIFICATION_COALESCE_WINDOW_SECONDS: int = int(os.getenv("NOTIFICATION_COALESCE_WINDOW_SECONDS", "3600"))
+    NOTIFICATION_RETENTION_DAYS: int = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+    NOTIFICATION_PURGE_BATCH_SIZE: int = int(os.getenv("NOTIFICATION_PURGE_BATCH_SIZE", "500"))
+
+    # Outbox of side effects (notifications) dispatched in the background
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_POLL_INTERVAL_MS: int = int(os.getenv("OUTBOX_POLL_INTERVAL_MS", "500"))
+    OUTBOX_LEASE_SECONDS: int = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+    OUTBOX_RETENTION_HOURS: int = int(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+
+    # Pair compatibility score cache (personalized search)
+    SCORE_CACHE_SIZE: int = int(os.getenv("SCORE_CACHE_SIZE", "100000"))
+    SCORE_CACHE_TTL_SECONDS: int = int(os.getenv("SCORE_CACHE_TTL_SECONDS", "600"))
+
+    # Accepted match partners cache (message authorization)
+    MATCH_AUTH_CACHE_SIZE: int = int(os.getenv("MATCH_AUTH_CACHE_SIZE", "50000"))
+    MATCH_AUTH_CACHE_TTL_SECONDS: int = int(os.getenv("MATCH_AUTH_CACHE_TTL_SECONDS", "300"))
+
+    # Message write path: "direct" (one transaction per message), "group"
+    # (group commit, acknowledged after commit) or "async" (group commit,
+    # acknowledged when queued)
+    MESSAGE_WRITE_MODE: str = os.getenv("MESSAGE_WRITE_MODE", "direct")
+    MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "200"))
+    MESSAGE_FLUSH_INTERVAL_MS: int = int(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "5"))
+    # "group" only: wait before acknowledging a message as queued (202) instead of committed
+    MESSAGE_COMMIT_TIMEOUT_SECONDS: int = int(os.getenv("MESSAGE_COMMIT_TIMEOUT_SECONDS", "10"))
+
+    # Compression of long message bodies (0 disables it)
+    MESSAGE_COMPRESSION_THRESHOLD: int = int(os.getenv("MESSAGE_COMPRESSION_THRESHOLD", "0"))
+    MESSAGE_COMPRESSION_LEVEL: int = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", "6"))
+
+    # Message archive (hot window kept in messages, older rows in messages_archive)
+    MESSAGE_HOT_DAYS: int = int(os.getenv("MESSAGE_HOT_DAYS", "90"))
+    MESSAGE_ARCHIVE_BATCH_SIZE: int = int(os.getenv("MESSAGE_ARCHIVE_BATCH_SIZE", "1000"))
+    MESSAGE_ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("MESSAGE_ARCHIVE_INTERVAL_SECONDS", "86400"))
+
     # --- Properties for controlled access to sensitive data ---
 
     @property
@@ -13,6 +13,14 @@ from .config import settings
 from .routes import api_router
 from .middleware.activity import ActivityMiddleware
 from .services.activity_monitor import check_inactive_accounts_task
+from .services.recommendations import refresh_similar_players_task
+from .services.realtime import realtime_hub
+from .services.messaging import message_writer
+from .services.message_archive import archive_messages_task
+from .services.outbox import dispatch_outbox_task
+from .services.suggestions import refresh_suggestions_task
+from .services.facets import refresh_player_facets_task
+from .services.notifications import purge_read_notifications_task, reconcile_unread_counters_task
 
 
 @asynccontextmanager
@@ -22,10 +30,23 @@ async def lifespan(app: FastAPI):
     Handles startup and shutdown events.
     """
     # Startup
-    task = asyncio.create_task(check_inactive_accounts_task())
+    await realtime_hub.start()
+    tasks = [
+        asyncio.create_task(check_inactive_accounts_task()),
+        asyncio.create_task(refresh_similar_players_task()),
+        asyncio.create_task(archive_messages_task()),
+        asyncio.create_task(reconcile_unread_counters_task()),
+        asyncio.create_task(purge_read_notifications_task()),
+        asyncio.create_task(dispatch_outbox_task()),
+        asyncio.create_task(refresh_suggestions_task()),
+        asyncio.create_task(refresh_player_facets_task()),
+    ]
     yield
     # Shutdown
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    await asyncio.to_thread(message_writer.stop)
+    await realtime_hub.stop()
 
 
 # Create FastAPI application
@@ -2,8 +2,8 @@
 Match-related Pydantic models.
 """
 
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
 from datetime import datetime
 
 
@@ -13,6 +13,19 @@ class MatchAction(BaseModel):
     action: str  # 'accept' or 'reject'
 
 
+class MatchDecision(BaseModel):
+    """Model for a single decision in a batch."""
+
+    match_id: int = Field(..., gt=0)
+    action: Literal["accept", "reject"]
+
+
+class MatchDecisionBatch(BaseModel):
+    """Model for a batch of match decisions (swipe session)."""
+
+    decisions: List[MatchDecision] = Field(..., min_length=1, max_length=100)
+
+
 class MatchResponse(BaseModel):
     """Model for match response."""
 
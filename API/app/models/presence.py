@@ -0,0 +1,16 @@
+"""
+Presence-related Pydantic models.
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+
+class PresenceHeartbeat(BaseModel):
+    """Model for a "looking to play now" heartbeat."""
+
+    game_ids: Optional[List[int]] = Field(
+        None,
+        max_length=50,
+        description="Games the user wants to play now (defaults to all profile games)"
+    )
@@ -13,6 +13,8 @@ from .messages import router as messages_router
 from .stats import router as stats_router
 from .search import router as search_router
 from .notifications import router as notifications_router
+from .presence import router as presence_router
+from .sync import router as sync_router
 
 # Main API router
 api_router = APIRouter()
@@ -26,5 +28,7 @@ api_router.include_router(messages_router, tags=["Messages"])
 api_router.include_router(stats_router, tags=["Statistics"])
 api_router.include_router(search_router, tags=["Search"])
 api_router.include_router(notifications_router, tags=["Notifications"])
+api_router.include_router(presence_router, tags=["Presence"])
+api_router.include_router(sync_router, tags=["Sync"])
 
 __all__ = ["api_router"]
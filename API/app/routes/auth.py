@@ -8,6 +8,8 @@ import MySQLdb.cursors
 
 from ..models.user import UserRegister, UserLogin
 from ..services.auth import create_access_token, hash_password, verify_password
+from ..services.facets import update_player_facets
+from ..services.suggestions import on_profile_changed
 from ..database import DatabaseSession
 
 router = APIRouter()
@@ -68,18 +70,26 @@ def register(user: UserRegister):
             ),
         )
 
-        # Generate token
-        token = create_access_token(user_id)
-
-        return {
-            "success": True,
-            "token": token,
-            "user": {
-                "id": user_id,
-                "email": user.email,
-                "username": user.username,
-            },
-        }
+    # Index the new player once committed
+    visibility = profile.get("profile_visibility", "public")
+    on_profile_changed(user_id, user.username, profile.get("avatar_url"), visibility)
+    update_player_facets(
+        user_id, visibility, profile.get("region"),
+        profile.get("skill_level", "beginner"), profile.get("looking_for", "teammates"),
+    )
+
+    # Generate token
+    token = create_access_token(user_id)
+
+    return {
+        "success": True,
+        "token": token,
+        "user": {
+            "id": user_id,
+            "email": user.email,
+            "username": user.username,
+        },
+    }
 
 
 @router.post("/login")
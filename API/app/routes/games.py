@@ -8,6 +8,8 @@ from typing import List
 
 from ..models.game import UserGame, GameResponse, UserGameResponse
 from ..services.auth import get_current_user_id
+from ..services.facets import player_facets
+from ..services.suggestions import game_suggestions
 from ..database import DatabaseSession
 
 router = APIRouter()
@@ -100,12 +102,15 @@ def add_user_game(game_data: UserGame, user_id: int = Depends(get_current_user_i
             ),
         )
 
-        return {
-            "success": True,
-            "message": f"Game '{game['name']}' added to your profile",
-            "game_id": game_data.game_id,
-            "game_name": game['name']
-        }
+    game_suggestions.adjust(game_data.game_id, "player_count", 1)
+    player_facets.set_game(user_id, game_data.game_id, True)
+
+    return {
+        "success": True,
+        "message": f"Game '{game['name']}' added to your profile",
+        "game_id": game_data.game_id,
+        "game_name": game['name']
+    }
 
 
 @router.put("/user/games/{game_id}")
@@ -186,10 +191,13 @@ def remove_user_game(game_id: int, user_id: int = Depends(get_current_user_id)):
             (user_id, game_id),
         )
 
-        return {
-            "success": True,
-            "message": f"Game '{game['name']}' removed from your profile"
-        }
+    game_suggestions.adjust(game_id, "player_count", -1)
+    player_facets.set_game(user_id, game_id, False)
+
+    return {
+        "success": True,
+        "message": f"Game '{game['name']}' removed from your profile"
+    }
 
 
 @router.get("/games/categories")
@@ -3,19 +3,47 @@ Matching routes.
 Handles player matching and match management.
 """
 
+import json
+
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 
+from ..models.match import MatchDecisionBatch
 from ..services.auth import get_current_user_id
-from ..services.matching import find_matches_advanced, create_match_record
+from ..services.matching import find_matches_advanced, iter_match_deck, create_match_records
+from ..services import outbox
+from ..services.messaging import accepted_pairs
+from ..services.realtime import realtime_hub
 from ..database import DatabaseSession
 
 router = APIRouter()
 
+# Candidates scored per batch of the streamed deck
+MATCH_STREAM_BATCH_SIZE = 10
+
+
+def _publish_match_status(match_id: int, pair, status: str) -> None:
+    """Notify both users of a match that its status changed."""
+    event = {"type": "match", "match_id": match_id, "status": status}
+    for user_id in pair:
+        realtime_hub.publish_threadsafe(user_id, event)
+
+
+def _no_matches_message(user_id: int) -> str:
+    """Explain why no matches were found for a user."""
+    with DatabaseSession(dict_cursor=True) as db:
+        db.execute("SELECT COUNT(*) as count FROM user_games WHERE user_id = %s", (user_id,))
+        if db.fetchone()["count"] == 0:
+            return "Ajoute des jeux à ton profil pour trouver des matchs"
+        return "Aucun nouveau match disponible pour le moment"
+
 
 @router.post("/matches")
 def find_matches(
     user_id: int = Depends(get_current_user_id),
     limit: int = Query(default=10, le=20),
+    online_only: bool = Query(default=False, description="Only players online right now"),
+    boost_online: bool = Query(default=False, description="Boost players online right now"),
 ):
     """
     Find potential matches for the current user.
@@ -27,26 +55,85 @@ def find_matches(
     - Same region bonus (15 pts)
     - Same timezone bonus (up to 10 pts)
     - Compatible playstyle (up to 15 pts)
+    - Optional bonus for players online right now
     """
     # Use advanced matching algorithm
-    potential_matches = find_matches_advanced(user_id, limit=limit)
+    potential_matches = find_matches_advanced(
+        user_id,
+        limit=limit,
+        online_only=online_only,
+        boost_online=boost_online,
+    )
 
     if not potential_matches:
-        # Check if user has games
-        with DatabaseSession(dict_cursor=True) as db:
-            db.execute("SELECT COUNT(*) as count FROM user_games WHERE user_id = %s", (user_id,))
-            if db.fetchone()["count"] == 0:
-                return {"matches": [], "message": "Ajoute des jeux à ton profil pour trouver des matchs"}
-            return {"matches": [], "message": "Aucun nouveau match disponible pour le moment"}
+        return {"matches": [], "message": _no_matches_message(user_id)}
 
     # Create match records and build response
-    matches = []
+    match_ids = create_match_records(
+        user_id,
+        [(match["user_id"], match["match_score"]) for match in potential_matches],
+    )
     for match in potential_matches:
-        match_id = create_match_record(user_id, match["user_id"], match["match_score"])
-        match["match_id"] = match_id
-        matches.append(match)
+        match["match_id"] = match_ids.get(match["user_id"])
+
+    return {"matches": potential_matches}
+
+
+@router.post("/matches/stream")
+def stream_matches(
+    user_id: int = Depends(get_current_user_id),
+    limit: int = Query(default=10, le=20),
+    online_only: bool = Query(default=False, description="Only players online right now"),
+    boost_online: bool = Query(default=False, description="Boost players online right now"),
+):
+    """
+    Stream the match deck as NDJSON while it is being scored.
+
+    Candidates are fetched and scored in batches of MATCH_STREAM_BATCH_SIZE
+    (similar players first); each batch refines the ranking, so the first
+    cards arrive after one small batch instead of the whole deck.
+
+    Each line is a JSON object:
+    - {"type": "match", "user_id": n, ...}: a scored candidate entering the
+      deck (sent once)
+    - {"type": "ranking", "user_ids": [...]}: the deck order, best first,
+      sent when a batch changes it; the last one is final
+    - {"type": "match_ids", "match_ids": {user_id: match_id}}: sent last,
+      once match records of the final deck have been persisted
+    - {"type": "empty", "message": ...}: no candidate available
+    """
+    def generate():
+        sent = set()
+        deck = []
+        order = None
+        for deck in iter_match_deck(
+            user_id,
+            limit=limit,
+            online_only=online_only,
+            boost_online=boost_online,
+            batch_size=MATCH_STREAM_BATCH_SIZE,
+        ):
+            for match in deck:
+                if match["user_id"] not in sent:
+                    sent.add(match["user_id"])
+                    yield json.dumps({"type": "match", **match}, default=str) + "\n"
+            if [m["user_id"] for m in deck] != order:
+                order = [m["user_id"] for m in deck]
+                yield json.dumps({"type": "ranking", "user_ids": order}) + "\n"
+
+        if not deck:
+            yield json.dumps({"type": "empty", "message": _no_matches_message(user_id)}) + "\n"
+            return
 
-    return {"matches": matches}
+        match_ids = create_match_records(
+            user_id, [(match["user_id"], match["match_score"]) for match in deck]
+        )
+        yield json.dumps({
+            "type": "match_ids",
+            "match_ids": {str(uid): match_id for uid, match_id in match_ids.items()},
+        }) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @router.get("/matches")
@@ -112,7 +199,18 @@ def accept_match(match_id: int, user_id: int = Depends(get_current_user_id)):
         if db.rowcount == 0:
             raise HTTPException(status_code=404, detail="Match not found or already processed")
 
-        return {"success": True, "message": "Match accepted"}
+        db.execute("SELECT user1_id, user2_id FROM matches WHERE id = %s", (match_id,))
+        pair = db.fetchone()
+
+        outbox.enqueue(db, "match.accepted", [
+            {"match_id": match_id, "user_ids": list(pair), "accepted_by": user_id}
+        ])
+
+    # Update the messaging authorization cache once committed
+    accepted_pairs.add([pair])
+    _publish_match_status(match_id, pair, "accepted")
+
+    return {"success": True, "message": "Match accepted"}
 
 
 @router.post("/matches/{match_id}/reject")
@@ -126,13 +224,113 @@ def reject_match(match_id: int, user_id: int = Depends(get_current_user_id)):
     with DatabaseSession() as db:
         db.execute(
             """
-            UPDATE matches SET status = 'rejected'
+            SELECT user1_id, user2_id FROM matches
             WHERE id = %s AND (user1_id = %s OR user2_id = %s)
+            FOR UPDATE
             """,
             (match_id, user_id, user_id),
         )
+        pair = db.fetchone()
 
-        if db.rowcount == 0:
+        if not pair:
             raise HTTPException(status_code=404, detail="Match not found")
 
-        return {"success": True, "message": "Match rejected"}
+        db.execute("UPDATE matches SET status = 'rejected' WHERE id = %s", (match_id,))
+
+    # Update the messaging authorization cache once committed
+    accepted_pairs.remove([pair])
+    _publish_match_status(match_id, pair, "rejected")
+
+    return {"success": True, "message": "Match rejected"}
+
+
+@router.post("/matches/decisions")
+def apply_match_decisions(batch: MatchDecisionBatch, user_id: int = Depends(get_current_user_id)):
+    """
+    Accept or reject several matches in a single transaction.
+
+    Applies one set-based UPDATE per action and returns a result per decision.
+    If the same match appears several times, the last decision wins.
+    """
+    # Last decision wins for duplicated match IDs
+    final_actions = {}
+    for index, decision in enumerate(batch.decisions):
+        final_actions[decision.match_id] = (index, decision.action)
+
+    match_ids = list(final_actions)
+    placeholders = ",".join(["%s"] * len(match_ids))
+
+    with DatabaseSession(dict_cursor=True) as db:
+        # Lock the user's matches that are part of the batch
+        db.execute(
+            f"""
+            SELECT id, user1_id, user2_id, status FROM matches
+            WHERE id IN ({placeholders}) AND (user1_id = %s OR user2_id = %s)
+            FOR UPDATE
+            """,
+            match_ids + [user_id, user_id],
+        )
+        rows = db.fetchall()
+        statuses = {row["id"]: row["status"] for row in rows}
+        pairs = {row["id"]: (row["user1_id"], row["user2_id"]) for row in rows}
+
+        accept_ids = [
+            match_id for match_id, (_, action) in final_actions.items()
+            if action == "accept" and statuses.get(match_id) == "pending"
+        ]
+        reject_ids = [
+            match_id for match_id, (_, action) in final_actions.items()
+            if action == "reject" and match_id in statuses
+        ]
+
+        if accept_ids:
+            db.execute(
+                f"""
+                UPDATE matches SET status = 'accepted'
+                WHERE id IN ({",".join(["%s"] * len(accept_ids))}) AND status = 'pending'
+                """,
+                accept_ids,
+            )
+            outbox.enqueue(db, "match.accepted", (
+                {"match_id": match_id, "user_ids": list(pairs[match_id]), "accepted_by": user_id}
+                for match_id in accept_ids
+            ))
+
+        if reject_ids:
+            db.execute(
+                f"""
+                UPDATE matches SET status = 'rejected'
+                WHERE id IN ({",".join(["%s"] * len(reject_ids))})
+                """,
+                reject_ids,
+            )
+
+    # Update the messaging authorization cache once committed
+    accepted_pairs.add(pairs[match_id] for match_id in accept_ids)
+    accepted_pairs.remove(pairs[match_id] for match_id in reject_ids)
+    for match_id in accept_ids:
+        _publish_match_status(match_id, pairs[match_id], "accepted")
+    for match_id in reject_ids:
+        _publish_match_status(match_id, pairs[match_id], "rejected")
+
+    applied = set(accept_ids) | set(reject_ids)
+    results = []
+    for index, decision in enumerate(batch.decisions):
+        result = {"match_id": decision.match_id, "action": decision.action}
+
+        if final_actions[decision.match_id][0] != index:
+            result.update(success=False, detail="Superseded by a later decision")
+        elif decision.match_id in applied:
+            result.update(success=True, detail=f"Match {decision.action}ed")
+        elif decision.action == "accept":
+            result.update(success=False, detail="Match not found or already processed")
+        else:
+            result.update(success=False, detail="Match not found")
+
+        results.append(result)
+
+    return {
+        "results": results,
+        "applied": len(applied),
+        "failed": len(results) - len(applied),
+    }
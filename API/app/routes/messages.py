@@ -3,21 +3,41 @@ Messages routes.
 Handles conversations and messaging between matched users.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+import re
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import ValidationError
+from typing import Optional
 
 from ..models.message import Message
-from ..services.auth import get_current_user_id
+from ..services.auth import get_current_user_id, verify_token
+from ..services.messaging import (
+    ensure_matched,
+    get_read_watermarks,
+    inflate_messages,
+    mark_read,
+    send_message as deliver_message,
+)
+from ..services.realtime import realtime_hub
 from ..database import DatabaseSession
 
 router = APIRouter()
 
+# innodb_ft_min_token_size default: shorter words are not indexed
+FULLTEXT_MIN_WORD_LENGTH = 3
+
 
 @router.get("/messages")
 def get_conversations(user_id: int = Depends(get_current_user_id)):
     """
     Get all conversations for the current user.
 
-    Returns a list of conversations with last message and unread count.
+    Returns a list of conversations with last message and unread count,
+    read from the conversations summary table.
     """
     with DatabaseSession(dict_cursor=True) as db:
         db.execute(
@@ -26,120 +46,474 @@ def get_conversations(user_id: int = Depends(get_current_user_id)):
                 u.id as user_id,
                 u.username,
                 p.avatar_url,
-                MAX(m.created_at) as last_message_time,
-                (
-                    SELECT content FROM messages
-                    WHERE (sender_id = u.id AND receiver_id = %s)
-                       OR (sender_id = %s AND receiver_id = u.id)
-                    ORDER BY created_at DESC LIMIT 1
-                ) as last_message,
-                COUNT(CASE WHEN m.is_read = 0 AND m.receiver_id = %s THEN 1 END) as unread_count
-            FROM users u
+                c.last_message_time,
+                c.last_message,
+                c.unread_count
+            FROM (
+                (SELECT user_high_id as peer_id, last_message_time, last_message,
+                        unread_low as unread_count
+                 FROM conversations WHERE user_low_id = %s)
+                UNION ALL
+                (SELECT user_low_id as peer_id, last_message_time, last_message,
+                        unread_high as unread_count
+                 FROM conversations WHERE user_high_id = %s)
+            ) c
+            JOIN users u ON u.id = c.peer_id
             JOIN user_profiles p ON u.id = p.user_id
-            JOIN messages m ON (m.sender_id = u.id AND m.receiver_id = %s)
-                            OR (m.sender_id = %s AND m.receiver_id = u.id)
-            WHERE u.id != %s
-            GROUP BY u.id
-            ORDER BY last_message_time DESC
+            ORDER BY c.last_message_time DESC
             """,
-            (user_id, user_id, user_id, user_id, user_id, user_id),
+            (user_id, user_id),
         )
 
         return {"conversations": db.fetchall()}
 
 
+def _publish_read(reader_id: int, peer_id: int, message_id: int) -> None:
+    """Tell the peer (read receipt) and the reader's other devices that a watermark moved."""
+    event = {
+        "type": "read",
+        "reader_id": reader_id,
+        "peer_id": peer_id,
+        "last_read_message_id": message_id,
+    }
+    realtime_hub.publish_threadsafe(peer_id, event)
+    realtime_hub.publish_threadsafe(reader_id, event)
+
+
+def _fetch_page(
+    db: DatabaseSession,
+    user_id: int,
+    other_user_id: int,
+    cursor: Optional[dict],
+    newer: bool,
+    limit: int,
+    table: str = "messages",
+) -> list:
+    """
+    Fetch one page of a conversation using keyset pagination.
+
+    Each direction of the conversation is read from the
+    (sender_id, receiver_id, created_at) index and the two ranges are merged.
+
+    Args:
+        db: Open database session
+        user_id: Current user's ID
+        other_user_id: The other user's ID
+        cursor: Row (id, created_at) to paginate from, or None for the latest page
+        newer: If True, fetch messages after the cursor, otherwise before it
+        limit: Maximum number of rows to fetch
+        table: "messages" (hot) or "messages_archive" (cold)
+
+    Returns:
+        Rows ordered from the cursor outwards
+    """
+    order = "ASC" if newer else "DESC"
+    cursor_condition = ""
+    cursor_params = []
+    if cursor:
+        op = ">" if newer else "<"
+        cursor_condition = f"AND (created_at {op} %s OR (created_at = %s AND id {op} %s))"
+        cursor_params = [cursor["created_at"], cursor["created_at"], cursor["id"]]
+
+    branch = f"""
+        (SELECT id, sender_id, receiver_id, content, content_zip, is_compressed, created_at
+         FROM {table}
+         WHERE sender_id = %s AND receiver_id = %s {cursor_condition}
+         ORDER BY created_at {order}, id {order}
+         LIMIT %s)
+    """
+
+    db.execute(
+        f"""
+        {branch}
+        UNION ALL
+        {branch}
+        ORDER BY created_at {order}, id {order}
+        LIMIT %s
+        """,
+        [user_id, other_user_id] + cursor_params + [limit]
+        + [other_user_id, user_id] + cursor_params + [limit]
+        + [limit],
+    )
+    return list(db.fetchall())
+
+
+def _find_message(db: DatabaseSession, message_id: int, user_id: int, other_user_id: int) -> Optional[dict]:
+    """
+    Find a message of a conversation in the hot table, then in the archive.
+
+    Returns:
+        Row (id, created_at, sender_id, archived), or None if not found
+    """
+    for table in ("messages", "messages_archive"):
+        db.execute(
+            f"""
+            SELECT id, created_at, sender_id FROM {table}
+            WHERE id = %s
+                AND ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s))
+            """,
+            (message_id, user_id, other_user_id, other_user_id, user_id),
+        )
+        row = db.fetchone()
+        if row:
+            row["archived"] = table == "messages_archive"
+            return row
+    return None
+
+
+def _fetch_conversation_page(
+    db: DatabaseSession,
+    user_id: int,
+    other_user_id: int,
+    cursor: Optional[dict],
+    newer: bool,
+    limit: int,
+) -> list:
+    """
+    Fetch one page of a conversation across the hot table and the archive.
+
+    Archived messages are all older than hot ones, so the archive is only
+    read when a page reaches back past the oldest hot message, or when
+    paging forward from an archived cursor.
+    """
+    if newer:
+        rows = []
+        if cursor and cursor["archived"]:
+            rows = _fetch_page(db, user_id, other_user_id, cursor, True, limit, "messages_archive")
+            if len(rows) == limit:
+                return rows
+            cursor = rows[-1] if rows else cursor
+        return rows + _fetch_page(db, user_id, other_user_id, cursor, True, limit - len(rows))
+
+    rows = []
+    if not (cursor and cursor["archived"]):
+        rows = _fetch_page(db, user_id, other_user_id, cursor, False, limit)
+        if len(rows) == limit:
+            return rows
+        cursor = rows[-1] if rows else cursor
+    return rows + _fetch_page(
+        db, user_id, other_user_id, cursor, False, limit - len(rows), "messages_archive"
+    )
+
+
 @router.get("/messages/{other_user_id}")
-def get_messages(other_user_id: int, user_id: int = Depends(get_current_user_id)):
+def get_messages(
+    other_user_id: int,
+    before_id: Optional[int] = Query(None, gt=0, description="Return messages older than this ID"),
+    after_id: Optional[int] = Query(None, gt=0, description="Return messages newer than this ID"),
+    limit: int = Query(default=50, ge=1, le=100),
+    user_id: int = Depends(get_current_user_id),
+):
     """
     Get messages between current user and another user.
 
+    Without a cursor, returns the most recent page. Use before_id to load
+    older messages and after_id to load newer ones.
+
     Args:
         other_user_id: The ID of the other user in the conversation
+        before_id: Optional keyset cursor for older messages
+        after_id: Optional keyset cursor for newer messages
+        limit: Page size
 
     Returns:
-        List of messages in the conversation
+        A page of messages in chronological order, the participants'
+        username and avatar (once per page), has_more telling whether
+        more messages exist in the paging direction, and peer_last_read_id
+        (read receipt for the current user's messages)
     """
+    if before_id and after_id:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
     with DatabaseSession(dict_cursor=True) as db:
         # Check if users are matched
-        db.execute(
-            """
-            SELECT id FROM matches
-            WHERE ((user1_id = %s AND user2_id = %s) OR (user1_id = %s AND user2_id = %s))
-                AND status = 'accepted'
-            """,
-            (user_id, other_user_id, other_user_id, user_id),
-        )
+        ensure_matched(db, user_id, other_user_id)
 
-        if not db.fetchone():
-            raise HTTPException(status_code=403, detail="You can only message matched users")
+        # Resolve the cursor row
+        cursor = None
+        cursor_id = before_id or after_id
+        if cursor_id:
+            cursor = _find_message(db, cursor_id, user_id, other_user_id)
+            if not cursor:
+                raise HTTPException(status_code=404, detail="Cursor message not found")
 
-        # Get messages
+        newer = after_id is not None
+        messages = _fetch_conversation_page(db, user_id, other_user_id, cursor, newer, limit + 1)
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not newer:
+            messages.reverse()
+        inflate_messages(messages)
+
+        # Participants, resolved once per page
         db.execute(
             """
-            SELECT
-                m.id,
-                m.sender_id,
-                m.receiver_id,
-                m.content,
-                m.is_read,
-                m.created_at,
-                u.username as sender_username,
-                p.avatar_url as sender_avatar
-            FROM messages m
-            JOIN users u ON m.sender_id = u.id
-            JOIN user_profiles p ON u.id = p.user_id
-            WHERE (m.sender_id = %s AND m.receiver_id = %s)
-               OR (m.sender_id = %s AND m.receiver_id = %s)
-            ORDER BY m.created_at ASC
+            SELECT u.id, u.username, p.avatar_url
+            FROM users u
+            LEFT JOIN user_profiles p ON u.id = p.user_id
+            WHERE u.id IN (%s, %s)
             """,
-            (user_id, other_user_id, other_user_id, user_id),
+            (user_id, other_user_id),
         )
+        participants = {
+            str(row["id"]): {"username": row["username"], "avatar_url": row["avatar_url"]}
+            for row in db.fetchall()
+        }
 
-        messages = db.fetchall()
+        # Read state is derived from the participants' watermarks
+        last_read_id, peer_last_read_id = get_read_watermarks(db, user_id, other_user_id)
+        for message in messages:
+            reader_watermark = last_read_id if message["receiver_id"] == user_id else peer_last_read_id
+            message["is_read"] = message["id"] <= reader_watermark
 
-        # Mark as read
-        db.execute(
-            """
-            UPDATE messages SET is_read = TRUE
-            WHERE sender_id = %s AND receiver_id = %s AND is_read = FALSE
-            """,
-            (other_user_id, user_id),
+        # Move the watermark to the newest message received on this page
+        received_ids = [m["id"] for m in messages if m["sender_id"] == other_user_id]
+        read_up_to = None
+        if received_ids and max(received_ids) > last_read_id:
+            if mark_read(db, user_id, other_user_id, max(received_ids)):
+                read_up_to = max(received_ids)
+
+    if read_up_to:
+        _publish_read(user_id, other_user_id, read_up_to)
+
+    return {
+        "messages": messages,
+        "participants": participants,
+        "has_more": has_more,
+        "oldest_id": messages[0]["id"] if messages else None,
+        "newest_id": messages[-1]["id"] if messages else None,
+        "peer_last_read_id": peer_last_read_id,
+    }
+
+
+@router.post("/messages/{other_user_id}/read")
+def mark_conversation_read(
+    other_user_id: int,
+    message_id: int = Query(..., gt=0, description="Last message read"),
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Mark a conversation as read up to a message.
+
+    Used by clients that received messages in real time. The watermark
+    only moves forward.
+
+    Args:
+        other_user_id: The ID of the other user in the conversation
+        message_id: ID of the last message read
+    """
+    with DatabaseSession(dict_cursor=True) as db:
+        message = _find_message(db, message_id, user_id, other_user_id)
+        if not message or message["sender_id"] != other_user_id:
+            raise HTTPException(status_code=404, detail="Message not found")
+
+        moved = mark_read(db, user_id, other_user_id, message_id)
+
+    if moved:
+        _publish_read(user_id, other_user_id, message_id)
+
+    return {"success": True, "updated": moved}
+
+
+def _fulltext_query(q: str) -> str:
+    """
+    Build a boolean-mode FULLTEXT query requiring every word of a search.
+
+    Operators and punctuation typed by the user are dropped; words shorter
+    than the InnoDB minimum token size are ignored as they are not indexed.
+    """
+    words = re.findall(r"\w+", q)
+    return " ".join(f"+{word}*" for word in words if len(word) >= FULLTEXT_MIN_WORD_LENGTH)
+
+
+def _search_table(
+    db: DatabaseSession,
+    table: str,
+    user_id: int,
+    other_user_id: int,
+    query: str,
+    before_id: Optional[int],
+    limit: int,
+) -> list:
+    """Search one message table of a conversation, newest first."""
+    id_condition = "AND id < %s" if before_id else ""
+    id_params = [before_id] if before_id else []
+
+    db.execute(
+        f"""
+        SELECT id, sender_id, receiver_id, content, content_zip, is_compressed, created_at
+        FROM {table}
+        WHERE MATCH(content) AGAINST (%s IN BOOLEAN MODE)
+            AND ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s))
+            {id_condition}
+        ORDER BY id DESC
+        LIMIT %s
+        """,
+        [query, user_id, other_user_id, other_user_id, user_id] + id_params + [limit],
+    )
+    return list(db.fetchall())
+
+
+@router.get("/messages/{other_user_id}/search")
+def search_messages(
+    other_user_id: int,
+    q: str = Query(..., min_length=FULLTEXT_MIN_WORD_LENGTH, max_length=200),
+    before_id: Optional[int] = Query(None, gt=0, description="Return matches older than this ID"),
+    limit: int = Query(default=20, ge=1, le=50),
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Search the messages of a conversation.
+
+    Uses the FULLTEXT index on message content; every word must match
+    (prefix match). Compressed messages are only searchable by their
+    preview. Results are newest first and paginated with before_id.
+
+    Args:
+        other_user_id: The ID of the other user in the conversation
+        q: Search text
+        before_id: Optional keyset cursor (next_before_id of the previous page)
+        limit: Page size
+    """
+    query = _fulltext_query(q)
+    if not query:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Search words must have at least {FULLTEXT_MIN_WORD_LENGTH} characters",
         )
 
-        return {"messages": messages}
+    with DatabaseSession(dict_cursor=True) as db:
+        ensure_matched(db, user_id, other_user_id)
+
+        # Archived messages are older, so the archive is searched only if needed
+        results = _search_table(db, "messages", user_id, other_user_id, query, before_id, limit + 1)
+        if len(results) <= limit:
+            cursor_id = results[-1]["id"] if results else before_id
+            results += _search_table(
+                db, "messages_archive", user_id, other_user_id, query,
+                cursor_id, limit + 1 - len(results),
+            )
+
+    has_more = len(results) > limit
+    results = results[:limit]
+    inflate_messages(results)
+
+    return {
+        "results": results,
+        "has_more": has_more,
+        "next_before_id": results[-1]["id"] if has_more else None,
+    }
 
 
 @router.post("/messages")
-def send_message(message: Message, user_id: int = Depends(get_current_user_id)):
+def send_message(message: Message, response: Response, user_id: int = Depends(get_current_user_id)):
     """
     Send a message to another user.
 
     Users can only message each other if they have an accepted match.
+    The recipient's open WebSockets receive the message immediately.
+    Answers 202 with a null message_id when the message is queued but not
+    committed yet (MESSAGE_WRITE_MODE "async", or "group" past its timeout):
+    it must not be sent again.
     """
-    with DatabaseSession() as db:
-        # Verify users are matched
-        db.execute(
-            """
-            SELECT id FROM matches
-            WHERE (
-                (user1_id = %s AND user2_id = %s) OR
-                (user1_id = %s AND user2_id = %s)
-            )
-            AND status = 'accepted'
-            """,
-            (user_id, message.receiver_id, message.receiver_id, user_id),
-        )
+    sent = deliver_message(user_id, message.receiver_id, message.content)
+    realtime_hub.publish_threadsafe(message.receiver_id, {"type": "message", "message": sent})
+    if sent["id"] is None:
+        response.status_code = 202
 
-        if not db.fetchone():
-            raise HTTPException(status_code=403, detail="You can only message matched users")
+    return {"success": True, "message": "Message sent", "message_id": sent["id"]}
 
-        # Insert the message
-        db.execute(
-            """
-            INSERT INTO messages (sender_id, receiver_id, content, is_read)
-            VALUES (%s, %s, %s, FALSE)
-            """,
-            (user_id, message.receiver_id, message.content),
-        )
 
-        return {"success": True, "message": "Message sent"}
+@router.websocket("/ws/messages")
+async def messages_socket(websocket: WebSocket, token: str = Query(...)):
+    """
+    Real-time messaging over WebSocket.
+
+    Authenticate with the JWT in the `token` query parameter.
+
+    Client frames:
+    - {"type": "send", "receiver_id": int, "content": str, "client_id": any}
+    - {"type": "ping"}
+
+    Server frames:
+    - {"type": "message", "message": {...}}: a message received by the user
+    - {"type": "sent", "client_id": any, "message": {...}}: send acknowledgement
+    - {"type": "error", "client_id": any, "status": int, "detail": str}
+    - {"type": "pong"}
+    """
+    try:
+        payload = verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+
+    user_id = get_current_user_id(payload)
+    await websocket.accept()
+    queue = realtime_hub.subscribe(user_id)
+
+    # Starlette does not serialize concurrent writes on one socket: hub
+    # events, acks, errors and pongs all go through this single writer.
+    send_lock = asyncio.Lock()
+
+    async def send(frame: dict) -> None:
+        async with send_lock:
+            await websocket.send_json(frame)
+
+    async def push_events():
+        while True:
+            await send(await queue.get())
+
+    pusher = asyncio.create_task(push_events())
+
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except ValueError:
+                await send({"type": "error", "status": 400, "detail": "Invalid JSON"})
+                continue
+
+            if not isinstance(frame, dict):
+                await send({"type": "error", "status": 400, "detail": "Invalid frame"})
+                continue
+
+            if frame.get("type") == "ping":
+                await send({"type": "pong"})
+                continue
+
+            if frame.get("type") != "send":
+                await send({"type": "error", "status": 400, "detail": "Unknown frame type"})
+                continue
+
+            client_id = frame.get("client_id")
+            try:
+                message = Message(receiver_id=frame.get("receiver_id"), content=frame.get("content"))
+                sent = await run_in_threadpool(
+                    deliver_message, user_id, message.receiver_id, message.content
+                )
+            except ValidationError as e:
+                await send({
+                    "type": "error", "client_id": client_id, "status": 422, "detail": str(e),
+                })
+                continue
+            except HTTPException as e:
+                await send({
+                    "type": "error", "client_id": client_id, "status": e.status_code, "detail": e.detail,
+                })
+                continue
+
+            await send({"type": "sent", "client_id": client_id, "message": sent})
+            await realtime_hub.publish(message.receiver_id, {"type": "message", "message": sent})
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        realtime_hub.unsubscribe(user_id, queue)
+        pusher.cancel()
+        try:
+            await pusher
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error pushing events to user {user_id}: {e}")
@@ -3,15 +3,61 @@ Notifications routes.
 Handles user notifications for matches, messages, etc.
 """
 
-from fastapi import APIRouter, Query, Depends, HTTPException
+import asyncio
+import json
+from fastapi import APIRouter, Query, Depends, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from typing import Optional
-from datetime import datetime
 
-from ..services.auth import get_current_user_id
+from ..config import settings
+from ..services.auth import get_current_user_id, verify_token
+from ..services.notifications import unread_counters
+from ..services.realtime import realtime_hub
 from ..database import DatabaseSession
 
 router = APIRouter()
 
+# Notifications replayed on reconnection (Last-Event-ID)
+STREAM_REPLAY_LIMIT = 50
+
+
+def _publish_unread_count(user_id: int, unread_count: int) -> None:
+    """Push a user's unread count to their open streams."""
+    realtime_hub.publish_threadsafe(
+        user_id, {"type": "unread_count", "unread_count": unread_count}
+    )
+
+
+def _format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Format a server-sent event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _attach_from_users(db: DatabaseSession, notifications: list) -> None:
+    """Resolve the from_user details of a page with one batched lookup."""
+    from_ids = {n["from_user_id"] for n in notifications if n.get("from_user_id")}
+    users = {}
+    if from_ids:
+        db.execute(f"""
+            SELECT u.id, u.username, p.avatar_url
+            FROM users u
+            LEFT JOIN user_profiles p ON u.id = p.user_id
+            WHERE u.id IN ({",".join(["%s"] * len(from_ids))})
+        """, list(from_ids))
+        users = {row["id"]: row for row in db.fetchall()}
+
+    for notif in notifications:
+        from_user = users.get(notif.pop("from_user_id", None))
+        notif["from_username"] = from_user["username"] if from_user else None
+        notif["from_avatar"] = from_user["avatar_url"] if from_user else None
+
 
 @router.get("/notifications")
 def get_notifications(
@@ -19,6 +65,8 @@ def get_notifications(
     unread_only: bool = Query(default=False),
     limit: int = Query(default=20, le=50),
     offset: int = Query(default=0, ge=0),
+    before_id: Optional[int] = Query(None, gt=0, description="Return notifications older than this ID"),
+    batch_users: bool = Query(default=False, description="Resolve senders once per page instead of joining"),
 ):
     """
     Get user's notifications.
@@ -26,8 +74,15 @@ def get_notifications(
     Args:
         unread_only: If True, only return unread notifications
         limit: Maximum notifications to return
-        offset: Pagination offset
+        offset: Pagination offset (ignored when before_id is used)
+        before_id: Keyset cursor (next_before_id of the previous page),
+            read from the (user_id, created_at, id) index
+        batch_users: If True, resolve from_user details with one lookup per
+            page instead of a LEFT JOIN per row
     """
+    if before_id and offset:
+        raise HTTPException(status_code=400, detail="Use either before_id or offset, not both")
+
     with DatabaseSession(dict_cursor=True) as db:
         conditions = ["n.user_id = %s"]
         params = [user_id]
@@ -35,8 +90,27 @@ def get_notifications(
         if unread_only:
             conditions.append("n.is_read = FALSE")
 
+        if before_id:
+            db.execute("""
+                SELECT created_at FROM notifications WHERE id = %s AND user_id = %s
+            """, (before_id, user_id))
+            cursor = db.fetchone()
+            if not cursor:
+                raise HTTPException(status_code=404, detail="Cursor notification not found")
+            conditions.append("(n.created_at < %s OR (n.created_at = %s AND n.id < %s))")
+            params.extend([cursor["created_at"], cursor["created_at"], before_id])
+
         where_clause = " AND ".join(conditions)
 
+        if batch_users:
+            sender_columns = "n.from_user_id"
+            sender_joins = ""
+        else:
+            sender_columns = "u.username as from_username, p.avatar_url as from_avatar"
+            sender_joins = """
+            LEFT JOIN users u ON n.from_user_id = u.id
+            LEFT JOIN user_profiles p ON u.id = p.user_id"""
+
         query = f"""
             SELECT
                 n.id,
@@ -46,43 +120,43 @@ def get_notifications(
                 n.data,
                 n.is_read,
                 n.created_at,
-                u.username as from_username,
-                p.avatar_url as from_avatar
-            FROM notifications n
-            LEFT JOIN users u ON n.from_user_id = u.id
-            LEFT JOIN user_profiles p ON u.id = p.user_id
+                {sender_columns}
+            FROM notifications n{sender_joins}
             WHERE {where_clause}
-            ORDER BY n.created_at DESC
+            ORDER BY n.created_at DESC, n.id DESC
             LIMIT %s OFFSET %s
         """
 
-        params.extend([limit, offset])
+        params.extend([limit + 1, 0 if before_id else offset])
         db.execute(query, params)
-        notifications = db.fetchall()
+        notifications = list(db.fetchall())
+
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+
+        if batch_users:
+            _attach_from_users(db, notifications)
 
         # Convert datetime and JSON data
         for notif in notifications:
             if notif.get("created_at"):
                 notif["created_at"] = notif["created_at"].isoformat()
             if notif.get("data"):
-                import json
                 try:
                     notif["data"] = json.loads(notif["data"])
                 except (json.JSONDecodeError, TypeError):
                     pass
 
-        # Get unread count
-        db.execute("""
-            SELECT COUNT(*) as count FROM notifications
-            WHERE user_id = %s AND is_read = FALSE
-        """, (user_id,))
-        unread_count = db.fetchone()["count"]
+        # Get unread count (maintained counter)
+        unread_count = unread_counters.get(user_id, db)
 
         return {
             "notifications": notifications,
             "unread_count": unread_count,
             "limit": limit,
             "offset": offset,
+            "has_more": has_more,
+            "next_before_id": notifications[-1]["id"] if has_more else None,
         }
 
 
@@ -90,13 +164,91 @@ def get_notifications(
 def get_unread_count(user_id: int = Depends(get_current_user_id)):
     """
     Get count of unread notifications.
+    Served from the maintained counter (cached in memory).
     """
-    with DatabaseSession(dict_cursor=True) as db:
-        db.execute("""
-            SELECT COUNT(*) as count FROM notifications
-            WHERE user_id = %s AND is_read = FALSE
-        """, (user_id,))
-        return {"unread_count": db.fetchone()["count"]}
+    return {"unread_count": unread_counters.get(user_id)}
+
+
+@router.get("/notifications/stream")
+async def stream_notifications(
+    token: str = Query(..., description="JWT (EventSource cannot send headers)"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Stream notifications with server-sent events.
+
+    Events:
+    - `notification` (id = notification ID): a new notification
+    - `unread_count`: the unread count changed
+
+    The unread count is sent on connection, then only when it changes.
+    A comment line is sent every SSE_HEARTBEAT_SECONDS to keep the
+    connection open. On reconnection, browsers send Last-Event-ID and the
+    notifications missed since then are replayed.
+    """
+    try:
+        payload = verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    user_id = get_current_user_id(payload)
+
+    def load_initial_state():
+        with DatabaseSession(dict_cursor=True) as db:
+            missed = []
+            if last_event_id is not None:
+                db.execute("""
+                    SELECT id, from_user_id, type, title, message, data, is_read, created_at
+                    FROM notifications
+                    WHERE user_id = %s AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                """, (user_id, last_event_id, STREAM_REPLAY_LIMIT))
+                missed = db.fetchall()
+            return missed, unread_counters.get(user_id, db)
+
+    async def events():
+        # Subscribe first so nothing published during the initial load is lost
+        queue = realtime_hub.subscribe(user_id)
+        try:
+            missed, unread_count = await run_in_threadpool(load_initial_state)
+            last_id = last_event_id or 0
+
+            yield f"retry: {settings.SSE_RETRY_MILLISECONDS}\n\n"
+            for notif in missed:
+                last_id = notif["id"]
+                if notif.get("data"):
+                    try:
+                        notif["data"] = json.loads(notif["data"])
+                    except (json.JSONDecodeError, TypeError):
+                        pass
+                yield _format_event("notification", notif, notif["id"])
+            yield _format_event("unread_count", {"unread_count": unread_count})
+
+            # Runs until the client disconnects (the response cancels the generator)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if event.get("type") == "notification":
+                    notif = event["notification"]
+                    if notif["id"] <= last_id:
+                        continue
+                    last_id = notif["id"]
+                    yield _format_event("notification", notif, notif["id"])
+                    yield _format_event("unread_count", {"unread_count": event["unread_count"]})
+                elif event.get("type") == "unread_count":
+                    yield _format_event("unread_count", {"unread_count": event["unread_count"]})
+        finally:
+            realtime_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/notifications/{notification_id}/read")
@@ -107,17 +259,26 @@ def mark_as_read(
     """
     Mark a notification as read.
     """
-    with DatabaseSession() as db:
+    with DatabaseSession(dict_cursor=True) as db:
         db.execute("""
             UPDATE notifications
             SET is_read = TRUE, read_at = NOW()
-            WHERE id = %s AND user_id = %s
+            WHERE id = %s AND user_id = %s AND is_read = FALSE
         """, (notification_id, user_id))
 
         if db.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Notification not found")
+            db.execute("""
+                SELECT id FROM notifications WHERE id = %s AND user_id = %s
+            """, (notification_id, user_id))
+            if not db.fetchone():
+                raise HTTPException(status_code=404, detail="Notification not found")
+            # Already read: the count is unchanged
+            return {"success": True}
 
-        return {"success": True}
+        unread_count = unread_counters.adjust(db, user_id, -1)
+
+    _publish_unread_count(user_id, unread_count)
+    return {"success": True}
 
 
 @router.post("/notifications/read-all")
@@ -131,8 +292,12 @@ def mark_all_as_read(user_id: int = Depends(get_current_user_id)):
             SET is_read = TRUE, read_at = NOW()
             WHERE user_id = %s AND is_read = FALSE
         """, (user_id,))
+        count = db.rowcount
+        unread_counters.reset(db, user_id)
 
-        return {"success": True, "count": db.rowcount}
+    if count:
+        _publish_unread_count(user_id, 0)
+    return {"success": True, "count": count}
 
 
 @router.delete("/notifications/{notification_id}")
@@ -143,16 +308,26 @@ def delete_notification(
     """
     Delete a notification.
     """
-    with DatabaseSession() as db:
+    with DatabaseSession(dict_cursor=True) as db:
         db.execute("""
-            DELETE FROM notifications
+            SELECT is_read FROM notifications
             WHERE id = %s AND user_id = %s
+            FOR UPDATE
         """, (notification_id, user_id))
+        notification = db.fetchone()
 
-        if db.rowcount == 0:
+        if not notification:
             raise HTTPException(status_code=404, detail="Notification not found")
 
-        return {"success": True}
+        db.execute("DELETE FROM notifications WHERE id = %s", (notification_id,))
+
+        if notification["is_read"]:
+            return {"success": True}
+
+        unread_count = unread_counters.adjust(db, user_id, -1)
+
+    _publish_unread_count(user_id, unread_count)
+    return {"success": True}
 
 
 @router.delete("/notifications")
@@ -176,40 +351,12 @@ def clear_notifications(
             db.execute("""
                 DELETE FROM notifications WHERE user_id = %s
             """, (user_id,))
+        deleted = db.rowcount
 
-        return {"success": True, "deleted": db.rowcount}
-
-
-def create_notification(
-    user_id: int,
-    notification_type: str,
-    title: str,
-    message: str,
-    from_user_id: Optional[int] = None,
-    data: Optional[dict] = None,
-) -> int:
-    """
-    Create a new notification.
-
-    Args:
-        user_id: User to notify
-        notification_type: Type of notification (match, message, system, etc.)
-        title: Notification title
-        message: Notification message
-        from_user_id: Optional user who triggered the notification
-        data: Optional JSON data
-
-    Returns:
-        The notification ID
-    """
-    import json
-
-    with DatabaseSession() as db:
-        data_json = json.dumps(data) if data else None
-
-        db.execute("""
-            INSERT INTO notifications (user_id, from_user_id, type, title, message, data)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (user_id, from_user_id, notification_type, title, message, data_json))
+        if not read_only:
+            unread_counters.reset(db, user_id)
 
-        return db.lastrowid
+    # Deleting read notifications leaves the unread count unchanged
+    if deleted and not read_only:
+        _publish_unread_count(user_id, 0)
+    return {"success": True, "deleted": deleted}
@@ -0,0 +1,79 @@
+"""
+Presence routes.
+Handles "looking to play now" heartbeats and online player lookups.
+"""
+
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+
+from ..models.presence import PresenceHeartbeat
+from ..services.auth import get_current_user_id
+from ..services.presence import presence_registry
+from ..database import DatabaseSession
+
+router = APIRouter()
+
+
+@router.post("/presence/heartbeat")
+def heartbeat(
+    payload: Optional[PresenceHeartbeat] = None,
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Mark the current user as online and looking to play.
+
+    Should be called periodically by the client (more often than the TTL).
+    Only games present in the user's profile are registered.
+    """
+    with DatabaseSession(dict_cursor=True) as db:
+        db.execute("SELECT region FROM user_profiles WHERE user_id = %s", (user_id,))
+        profile = db.fetchone() or {}
+
+        db.execute("SELECT game_id FROM user_games WHERE user_id = %s", (user_id,))
+        profile_games = {row["game_id"] for row in db.fetchall()}
+
+    game_ids = profile_games
+    if payload and payload.game_ids is not None:
+        game_ids = profile_games & set(payload.game_ids)
+
+    presence_registry.heartbeat(user_id, game_ids, profile.get("region"))
+
+    return {
+        "online": True,
+        "game_ids": sorted(game_ids),
+        "ttl_seconds": presence_registry.ttl_seconds,
+    }
+
+
+@router.delete("/presence")
+def leave(user_id: int = Depends(get_current_user_id)):
+    """
+    Mark the current user as no longer looking to play.
+    """
+    presence_registry.leave(user_id)
+    return {"online": False}
+
+
+@router.get("/presence/online")
+def get_online_players(
+    game_id: int = Query(..., gt=0),
+    region: Optional[str] = Query(None, description="Filter by region"),
+    limit: int = Query(default=100, le=500),
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Get players currently online for a game.
+
+    Served from the in-memory presence registry, without database access.
+    """
+    players = [
+        uid for uid in presence_registry.online_players(game_id, region, limit=limit + 1)
+        if uid != user_id
+    ][:limit]
+
+    return {
+        "game_id": game_id,
+        "region": region,
+        "user_ids": players,
+        "count": len(players),
+    }
@@ -8,6 +8,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from ..models.user import UserProfile
 from ..services.auth import get_current_user_id
 from ..services.activity_monitor import ActivityMonitor
+from ..services.facets import update_player_facets
+from ..services.suggestions import on_profile_changed
 from ..database import DatabaseSession, get_db_connection
 
 router = APIRouter()
@@ -118,7 +120,17 @@ def update_profile(profile_data: UserProfile, user_id: int = Depends(get_current
             ),
         )
 
-        return {"success": True, "message": "Profile updated"}
+        db.execute("SELECT username FROM users WHERE id = %s", (user_id,))
+        username = db.fetchone()[0]
+
+    # Update the search indexes once committed
+    on_profile_changed(user_id, username, profile_data.avatar_url, profile_data.profile_visibility)
+    update_player_facets(
+        user_id, profile_data.profile_visibility, profile_data.region,
+        profile_data.skill_level, profile_data.looking_for,
+    )
+
+    return {"success": True, "message": "Profile updated"}
 
 
 @router.get("/user/activity-stats")
@@ -3,14 +3,352 @@ Search routes.
 Handles search for players and games.
 """
 
+import re
+
+import MySQLdb
 from fastapi import APIRouter, Query, Depends
-from typing import Optional
+from typing import List, Optional, Tuple
 
-from ..services.auth import get_current_user_id
+from ..config import settings
+from ..services.auth import get_current_user_id, get_optional_user_id
+from ..services.facets import player_facets
+from ..services.matching import get_compatibility_scores
+from ..services.suggestions import game_suggestions, player_suggestions
 from ..database import DatabaseSession
 
 router = APIRouter()
 
+# ngram_token_size of the FULLTEXT indexes (MySQL default)
+NGRAM_TOKEN_SIZE = 2
+
+# Weight of a username match relative to a bio match
+USERNAME_RELEVANCE_WEIGHT = 2
+
+# MySQL error raised by MATCH when the FULLTEXT indexes are missing (migration 013)
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+# Fuzzy engine: query characters per allowed typo, and candidates filtered
+FUZZY_CHARS_PER_EDIT = 3
+FUZZY_MAX_CANDIDATES = 500
+
+# Matching players whose facets are counted at most
+FACETS_MAX_MATCHES = 100000
+
+
+def _profile_filters(
+    skill_level: Optional[str],
+    region: Optional[str],
+    looking_for: Optional[str],
+    game_id: Optional[int] = None,
+) -> Tuple[List[str], list]:
+    """Build the visibility and facet filter conditions of a player search."""
+    conditions = ["(p.profile_visibility != 'private' OR p.profile_visibility IS NULL)"]
+    params = []
+
+    if skill_level:
+        conditions.append("p.skill_level = %s")
+        params.append(skill_level)
+
+    if region:
+        conditions.append("p.region = %s")
+        params.append(region)
+
+    if looking_for:
+        conditions.append("p.looking_for = %s")
+        params.append(looking_for)
+
+    if game_id is not None:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM user_games ug_id WHERE ug_id.user_id = u.id AND ug_id.game_id = %s)"
+        )
+        params.append(game_id)
+
+    return conditions, params
+
+
+def _ngram_query(q: str) -> str:
+    """
+    Build a boolean-mode FULLTEXT query requiring every word of a search.
+    With the ngram parser each word is matched as a phrase of n-grams, so
+    it also matches inside longer words. Shorter words are not indexed.
+    """
+    words = re.findall(r"\w+", q)
+    return " ".join(f"+{word}" for word in words if len(word) >= NGRAM_TOKEN_SIZE)
+
+
+def _with_game_filter(conditions: List[str], params: list, game: Optional[str]) -> Tuple[List[str], list]:
+    """Add a game name filter as an EXISTS condition (no join on the result rows)."""
+    if not game:
+        return conditions, params
+
+    return conditions + ["""EXISTS (
+        SELECT 1 FROM user_games ug_filter
+        JOIN games g_filter ON ug_filter.game_id = g_filter.id
+        WHERE ug_filter.user_id = u.id AND g_filter.name LIKE %s
+    )"""], params + [f"%{game}%"]
+
+
+def _attach_games(db: DatabaseSession, players: list) -> None:
+    """Resolve the games of a page of players with one grouped query."""
+    games = {}
+    if players:
+        db.execute(f"""
+            SELECT
+                ug.user_id,
+                GROUP_CONCAT(DISTINCT g.name ORDER BY g.name SEPARATOR ', ') as games,
+                COUNT(DISTINCT ug.game_id) as game_count
+            FROM user_games ug
+            JOIN games g ON ug.game_id = g.id
+            WHERE ug.user_id IN ({",".join(["%s"] * len(players))})
+            GROUP BY ug.user_id
+        """, [player["id"] for player in players])
+        games = {row["user_id"]: row for row in db.fetchall()}
+
+    for player in players:
+        player_games = games.get(player["id"])
+        player["games"] = player_games["games"] if player_games else None
+        player["game_count"] = player_games["game_count"] if player_games else 0
+
+
+def _search_players_like(
+    db: DatabaseSession,
+    q: str,
+    game: Optional[str],
+    conditions: List[str],
+    params: list,
+    limit: int,
+    offset: int,
+) -> Tuple[list, int]:
+    """Search players with LIKE on username and bio (no index can be used)."""
+    # Search in username and bio
+    conditions = conditions + ["(u.username LIKE %s OR p.bio LIKE %s)"]
+    search_term = f"%{q}%"
+    params = params + [search_term, search_term]
+
+    where_clause = " AND ".join(conditions)
+
+    # Game filter requires a join
+    game_join = ""
+    if game:
+        game_join = """
+            JOIN user_games ug_filter ON u.id = ug_filter.user_id
+            JOIN games g_filter ON ug_filter.game_id = g_filter.id AND g_filter.name LIKE %s
+        """
+        params.insert(0, f"%{game}%")  # Add at beginning for join
+
+    query = f"""
+        SELECT DISTINCT
+            u.id,
+            u.username,
+            p.avatar_url,
+            p.bio,
+            p.skill_level,
+            p.looking_for,
+            p.region,
+            p.timezone,
+            GROUP_CONCAT(DISTINCT g.name ORDER BY g.name SEPARATOR ', ') as games,
+            COUNT(DISTINCT ug.game_id) as game_count
+        FROM users u
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        LEFT JOIN user_games ug ON u.id = ug.user_id
+        LEFT JOIN games g ON ug.game_id = g.id
+        {game_join}
+        WHERE {where_clause}
+        GROUP BY u.id, u.username, p.avatar_url, p.bio, p.skill_level,
+                 p.looking_for, p.region, p.timezone
+        ORDER BY
+            CASE WHEN u.username LIKE %s THEN 0 ELSE 1 END,
+            game_count DESC,
+            u.username ASC
+        LIMIT %s OFFSET %s
+    """
+
+    # Priority sort for exact username match
+    params.append(f"{q}%")
+    params.extend([limit, offset])
+
+    db.execute(query, params)
+    players = db.fetchall()
+
+    # Get total count
+    count_query = f"""
+        SELECT COUNT(DISTINCT u.id) as total
+        FROM users u
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        {game_join}
+        WHERE {where_clause}
+    """
+    # Remove priority sort and limit/offset params for count
+    count_params = params[:-3]
+    db.execute(count_query, count_params)
+    total = db.fetchone()["total"]
+
+    return list(players), total
+
+
+def _search_players_fulltext(
+    db: DatabaseSession,
+    query: str,
+    game: Optional[str],
+    conditions: List[str],
+    params: list,
+    limit: int,
+    offset: int,
+) -> Tuple[list, int]:
+    """
+    Search players with the ngram FULLTEXT indexes on username and bio.
+
+    Each index is searched on its own (a FULLTEXT index covers one table)
+    and the scores are summed, username matches weighing more. Games are
+    only resolved for the returned page.
+    """
+    conditions, params = _with_game_filter(conditions, params, game)
+
+    where_clause = " AND ".join(conditions)
+    matches = f"""
+        SELECT m.user_id, SUM(m.score) AS relevance
+        FROM (
+            SELECT id AS user_id, MATCH(username) AGAINST (%s IN BOOLEAN MODE) * {USERNAME_RELEVANCE_WEIGHT} AS score
+            FROM users
+            WHERE MATCH(username) AGAINST (%s IN BOOLEAN MODE)
+            UNION ALL
+            SELECT user_id, MATCH(bio) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM user_profiles
+            WHERE MATCH(bio) AGAINST (%s IN BOOLEAN MODE)
+        ) m
+        GROUP BY m.user_id
+    """
+    match_params = [query] * 4
+
+    db.execute(f"""
+        SELECT
+            u.id,
+            u.username,
+            p.avatar_url,
+            p.bio,
+            p.skill_level,
+            p.looking_for,
+            p.region,
+            p.timezone,
+            m.relevance
+        FROM ({matches}) m
+        JOIN users u ON u.id = m.user_id
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        WHERE {where_clause}
+        ORDER BY m.relevance DESC, u.username ASC
+        LIMIT %s OFFSET %s
+    """, match_params + params + [limit, offset])
+    players = list(db.fetchall())
+
+    db.execute(f"""
+        SELECT COUNT(*) as total
+        FROM ({matches}) m
+        JOIN users u ON u.id = m.user_id
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        WHERE {where_clause}
+    """, match_params + params)
+    total = db.fetchone()["total"]
+
+    _attach_games(db, players)
+    for player in players:
+        player["relevance"] = float(player["relevance"])
+
+    return players, total
+
+
+def _search_players_fuzzy(
+    db: DatabaseSession,
+    candidates: List[Tuple[int, int]],
+    game: Optional[str],
+    conditions: List[str],
+    params: list,
+    limit: int,
+    offset: int,
+) -> Tuple[list, int]:
+    """
+    Apply the filters to fuzzy username candidates and return a page.
+
+    Args:
+        candidates: (user_id, edit distance) from the in-memory username index
+    """
+    if not candidates:
+        return [], 0
+
+    distances = dict(candidates)
+    conditions, params = _with_game_filter(conditions, params, game)
+    conditions = conditions + [f"u.id IN ({','.join(['%s'] * len(distances))})"]
+
+    db.execute(f"""
+        SELECT
+            u.id,
+            u.username,
+            p.avatar_url,
+            p.bio,
+            p.skill_level,
+            p.looking_for,
+            p.region,
+            p.timezone
+        FROM users u
+        LEFT JOIN user_profiles p ON u.id = p.user_id
+        WHERE {" AND ".join(conditions)}
+    """, params + list(distances))
+    players = sorted(db.fetchall(), key=lambda p: (distances[p["id"]], p["username"].casefold()))
+
+    page = players[offset:offset + limit]
+    _attach_games(db, page)
+    for player in page:
+        player["distance"] = distances[player["id"]]
+
+    return page, len(players)
+
+
+def _matching_player_ids(
+    db: DatabaseSession,
+    engine: str,
+    q: str,
+    query: str,
+    candidates: List[Tuple[int, int]],
+    game: Optional[str],
+) -> List[int]:
+    """
+    Get the players matching the text of a search and its game name
+    filter, before the facet filters, for the facet counts.
+    Visibility is applied by the facet index.
+
+    Returns:
+        Up to FACETS_MAX_MATCHES + 1 player IDs
+    """
+    if engine == "fuzzy" and not game:
+        return [user_id for user_id, _ in candidates]
+
+    conditions, params = _with_game_filter([], [], game)
+    if engine == "fuzzy":
+        if not candidates:
+            return []
+        source = "users u"
+        conditions.append(f"u.id IN ({','.join(['%s'] * len(candidates))})")
+        params += [user_id for user_id, _ in candidates]
+    elif engine == "fulltext":
+        source = """(
+            SELECT id AS user_id FROM users
+            WHERE MATCH(username) AGAINST (%s IN BOOLEAN MODE)
+            UNION
+            SELECT user_id FROM user_profiles
+            WHERE MATCH(bio) AGAINST (%s IN BOOLEAN MODE)
+        ) m JOIN users u ON u.id = m.user_id"""
+        params = [query, query] + params
+    else:
+        source = "users u LEFT JOIN user_profiles p ON u.id = p.user_id"
+        conditions.append("(u.username LIKE %s OR p.bio LIKE %s)")
+        params += [f"%{q}%", f"%{q}%"]
+
+    db.execute(f"""
+        SELECT u.id FROM {source}
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        LIMIT %s
+    """, params + [FACETS_MAX_MATCHES + 1])
+    return [row["id"] for row in db.fetchall()]
+
 
 @router.get("/search/players")
 def search_players(
@@ -19,8 +357,14 @@ def search_players(
     skill_level: Optional[str] = Query(None, description="Filter by skill level"),
     region: Optional[str] = Query(None, description="Filter by region"),
     looking_for: Optional[str] = Query(None, description="Filter by looking_for"),
+    game_id: Optional[int] = Query(None, description="Filter by game ID"),
     limit: int = Query(default=20, le=50),
     offset: int = Query(default=0, ge=0),
+    sort: str = Query(default="relevance", pattern="^(relevance|compatibility)$"),
+    engine: Optional[str] = Query(None, pattern="^(fulltext|like|fuzzy)$", description="Search engine"),
+    max_distance: int = Query(default=2, ge=1, le=2, description="Maximum typos (fuzzy engine)"),
+    facets: bool = Query(default=False, description="Count the matching players per facet value"),
+    user_id: Optional[int] = Depends(get_optional_user_id),
 ):
     """
     Search for players by username, bio, or games.
@@ -31,97 +375,90 @@ def search_players(
         skill_level: Optional filter by skill level
         region: Optional filter by region
         looking_for: Optional filter by looking_for preference
+        game_id: Optional filter by game ID (the values of the game facet)
         limit: Maximum results to return
         offset: Pagination offset
+        sort: "relevance", or "compatibility" to re-rank the page by match
+              score with the authenticated user
+        engine: "fulltext" (ngram FULLTEXT indexes, ranked by relevance),
+                "like" (substring scan) or "fuzzy" (usernames within
+                max_distance typos, ranked by distance);
+                PLAYER_SEARCH_ENGINE by default. Queries without a word of
+                NGRAM_TOKEN_SIZE characters use "like", as does "fulltext"
+                without its indexes and "fuzzy" until the username index is
+                built.
+        max_distance: Maximum edits for the fuzzy engine (one per
+                      FUZZY_CHARS_PER_EDIT characters of the query at most)
+        facets: Also return, for region, skill_level, looking_for and
+                game_id, the number of matching players per value, e.g.
+                "Europe (1203)". The counts of a facet apply the query and
+                the other facets' filters only, so the UI can show the
+                alternatives to the selected value. They come from the
+                in-memory facet index, intersected with the players
+                matching the query (the first FACETS_MAX_MATCHES of them;
+                `facets_partial` is then true). `facets` is null while the
+                index is being built.
     """
-    with DatabaseSession(dict_cursor=True) as db:
-        # Build dynamic query
-        conditions = ["(p.profile_visibility != 'private' OR p.profile_visibility IS NULL)"]
-        params = []
-
-        # Search in username and bio
-        conditions.append("(u.username LIKE %s OR p.bio LIKE %s)")
-        search_term = f"%{q}%"
-        params.extend([search_term, search_term])
-
-        # Optional filters
-        if skill_level:
-            conditions.append("p.skill_level = %s")
-            params.append(skill_level)
-
-        if region:
-            conditions.append("p.region = %s")
-            params.append(region)
-
-        if looking_for:
-            conditions.append("p.looking_for = %s")
-            params.append(looking_for)
-
-        where_clause = " AND ".join(conditions)
-
-        # Game filter requires a join
-        game_join = ""
-        if game:
-            game_join = """
-                JOIN user_games ug_filter ON u.id = ug_filter.user_id
-                JOIN games g_filter ON ug_filter.game_id = g_filter.id AND g_filter.name LIKE %s
-            """
-            params.insert(0, f"%{game}%")  # Add at beginning for join
-
-        query = f"""
-            SELECT DISTINCT
-                u.id,
-                u.username,
-                p.avatar_url,
-                p.bio,
-                p.skill_level,
-                p.looking_for,
-                p.region,
-                p.timezone,
-                GROUP_CONCAT(DISTINCT g.name ORDER BY g.name SEPARATOR ', ') as games,
-                COUNT(DISTINCT ug.game_id) as game_count
-            FROM users u
-            LEFT JOIN user_profiles p ON u.id = p.user_id
-            LEFT JOIN user_games ug ON u.id = ug.user_id
-            LEFT JOIN games g ON ug.game_id = g.id
-            {game_join}
-            WHERE {where_clause}
-            GROUP BY u.id, u.username, p.avatar_url, p.bio, p.skill_level,
-                     p.looking_for, p.region, p.timezone
-            ORDER BY
-                CASE WHEN u.username LIKE %s THEN 0 ELSE 1 END,
-                game_count DESC,
-                u.username ASC
-            LIMIT %s OFFSET %s
-        """
-
-        # Priority sort for exact username match
-        params.append(f"{q}%")
-        params.extend([limit, offset])
+    engine = engine or settings.PLAYER_SEARCH_ENGINE
+    if engine == "fuzzy" and not player_suggestions.built_at:
+        engine = "like"
+    query = _ngram_query(q) if engine == "fulltext" else ""
+    if engine == "fulltext" and not query:
+        engine = "like"
+    conditions, params = _profile_filters(skill_level, region, looking_for, game_id)
+
+    candidates = []
+    if engine == "fuzzy":
+        distance = min(max_distance, len(q.strip()) // FUZZY_CHARS_PER_EDIT)
+        candidates = player_suggestions.fuzzy(q.strip(), distance, limit=FUZZY_MAX_CANDIDATES)
 
-        db.execute(query, params)
-        players = db.fetchall()
-
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(DISTINCT u.id) as total
-            FROM users u
-            LEFT JOIN user_profiles p ON u.id = p.user_id
-            {game_join}
-            WHERE {where_clause}
-        """
-        # Remove limit/offset params for count
-        count_params = params[:-3] if not game else params[:-3]
-        count_params = count_params[:-1]  # Remove priority sort param
-        db.execute(count_query, count_params)
-        total = db.fetchone()["total"]
-
-        return {
-            "players": players,
-            "total": total,
-            "limit": limit,
-            "offset": offset,
-        }
+    with DatabaseSession(dict_cursor=True) as db:
+        if engine == "fuzzy":
+            players, total = _search_players_fuzzy(db, candidates, game, conditions, params, limit, offset)
+        elif engine == "fulltext":
+            try:
+                players, total = _search_players_fulltext(db, query, game, conditions, params, limit, offset)
+            except MySQLdb.Error as e:
+                if not e.args or e.args[0] != ER_FT_MATCHING_KEY_NOT_FOUND:
+                    raise
+                engine = "like"
+
+        if engine == "like":
+            players, total = _search_players_like(db, q, game, conditions, params, limit, offset)
+
+        matching_ids = None
+        if facets and player_facets.built_at:
+            matching_ids = _matching_player_ids(db, engine, q, query, candidates, game)
+
+    facet_counts = None
+    if matching_ids is not None:
+        _, _, facet_counts = player_facets.search(
+            {"region": region, "skill_level": skill_level, "looking_for": looking_for},
+            game_id=game_id, limit=0, user_ids=matching_ids[:FACETS_MAX_MATCHES],
+        )
+
+    # Personalized ranking of the current page
+    if sort == "compatibility" and user_id and players:
+        scores = get_compatibility_scores(user_id, players, id_key="id")
+        for player in players:
+            player["compatibility_score"] = scores.get(player["id"])
+        players = sorted(
+            players,
+            key=lambda p: -1 if p["compatibility_score"] is None else p["compatibility_score"],
+            reverse=True,
+        )
+
+    result = {
+        "players": players,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "engine": engine,
+    }
+    if facets:
+        result["facets"] = facet_counts
+        result["facets_partial"] = matching_ids is not None and len(matching_ids) > FACETS_MAX_MATCHES
+    return result
 
 
 @router.get("/search/games")
@@ -197,8 +534,15 @@ def get_search_suggestions(
     """
     Get search suggestions for autocomplete.
 
-    Returns player usernames and game names matching query.
+    Returns player usernames and game names matching query, from the
+    in-memory suggestion indexes (from the database until they are built).
     """
+    if player_suggestions.built_at and game_suggestions.built_at:
+        return {
+            "players": player_suggestions.search(q, limit=5),
+            "games": game_suggestions.search(q, limit=5),
+        }
+
     with DatabaseSession(dict_cursor=True) as db:
         suggestions = {"players": [], "games": []}
 
@@ -31,9 +31,13 @@ def get_platform_stats():
         db.execute("SELECT COUNT(*) as count FROM matches WHERE status = 'accepted'")
         total_matches = db.fetchone()["count"]
 
-        # Get total messages
-        db.execute("SELECT COUNT(*) as count FROM messages")
-        total_messages = db.fetchone()["count"]
+        # Get total messages (hot table + archived counts)
+        db.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM messages)
+                + (SELECT COALESCE(SUM(message_count), 0) FROM messages_archive_counts) as count
+        """)
+        total_messages = int(db.fetchone()["count"])
 
         # Get active users (logged in last 7 days)
         db.execute("""
@@ -235,13 +239,14 @@ def get_user_public_stats(user_id: int):
         """, (user_id,))
         game_count = db.fetchone()["game_count"]
 
-        # Get message count
+        # Get message count (hot table + archived count)
         db.execute("""
-            SELECT COUNT(*) as message_count
-            FROM messages
-            WHERE sender_id = %s
-        """, (user_id,))
-        message_count = db.fetchone()["message_count"]
+            SELECT
+                (SELECT COUNT(*) FROM messages WHERE sender_id = %s)
+                + COALESCE((SELECT message_count FROM messages_archive_counts
+                            WHERE sender_id = %s), 0) as message_count
+        """, (user_id, user_id))
+        message_count = int(db.fetchone()["message_count"])
 
         return {
             "stats": {
@@ -0,0 +1,63 @@
+"""
+Sync routes.
+Incremental long-poll endpoint replacing per-resource polling.
+"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+
+from ..services.auth import get_current_user_id
+from ..services.realtime import realtime_hub
+from ..services.sync import decode_token, fetch_changes, has_changes, resync_changes
+
+router = APIRouter()
+
+
+@router.get("/sync")
+async def sync(
+    since: Optional[str] = Query(None, description="Token returned by the previous sync"),
+    timeout: int = Query(default=25, ge=0, le=60, description="Seconds to wait for a change"),
+    user_id: int = Depends(get_current_user_id),
+):
+    """
+    Get everything that changed for the current user since a token.
+
+    Returns new messages, read-state changes, new notifications and match
+    status changes, plus the token for the next call. When nothing changed,
+    the request waits up to `timeout` seconds for a change (long-poll).
+    Without `since`, returns only a token pointing at the current state.
+    With `resync` true, the token could not be advanced: the client must
+    reload its data, then sync from the new token.
+
+    Args:
+        since: Opaque token from the previous response
+        timeout: Long-poll timeout in seconds (0 returns immediately)
+    """
+    if since is None:
+        return await run_in_threadpool(resync_changes, user_id)
+
+    watermark = decode_token(since)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # Subscribe before the first query so no change is missed in between
+    queue = realtime_hub.subscribe(user_id)
+    try:
+        changes = await run_in_threadpool(fetch_changes, user_id, watermark)
+
+        while not has_changes(changes):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            changes = await run_in_threadpool(fetch_changes, user_id, watermark)
+    finally:
+        realtime_hub.unsubscribe(user_id, queue)
+
+    return changes
@@ -8,6 +8,7 @@ from .auth import (
     hash_password,
     verify_password,
     get_current_user_id,
+    get_optional_user_id,
 )
 from .activity_monitor import ActivityMonitor, check_inactive_accounts_task
 
@@ -17,6 +18,7 @@ __all__ = [
     "hash_password",
     "verify_password",
     "get_current_user_id",
+    "get_optional_user_id",
     "ActivityMonitor",
     "check_inactive_accounts_task",
 ]
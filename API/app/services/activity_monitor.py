@@ -12,6 +12,7 @@ import MySQLdb
 from MySQLdb.cursors import DictCursor
 
 from ..config import settings
+from . import outbox
 
 
 class AccountStatus(Enum):
@@ -103,7 +104,8 @@ class ActivityMonitor:
             inactive_date = datetime.now() - timedelta(days=self.__inactive_threshold_days)
             warning_date = datetime.now() - timedelta(days=self.__warning_threshold_days)
 
-            # Find accounts that need warning
+            # Find accounts that need warning, skipping those already warned
+            # since their last activity
             cursor.execute(
                 """
                 SELECT
@@ -116,6 +118,10 @@ class ActivityMonitor:
                     u.last_activity_at IS NULL AND u.created_at < %s
                     OR u.last_activity_at < %s
                 )
+                AND (
+                    u.inactivity_warned_at IS NULL
+                    OR u.inactivity_warned_at < COALESCE(u.last_activity_at, u.created_at)
+                )
                 ORDER BY days_inactive DESC
                 """,
                 (warning_date, warning_date),
@@ -137,6 +143,28 @@ class ActivityMonitor:
                 (inactive_date, inactive_date),
             )
 
+            # Warnings are delivered by the outbox, with the status change
+            warned = [
+                account for account in accounts_to_warn
+                if account["days_inactive"] < self.__inactive_threshold_days
+            ]
+            outbox.enqueue(cursor, "account.inactivity_warning", (
+                {
+                    "user_id": account["id"],
+                    "days_inactive": account["days_inactive"],
+                    "days_left": self.__inactive_threshold_days - account["days_inactive"],
+                }
+                for account in warned
+            ))
+            if warned:
+                cursor.execute(
+                    f"""
+                    UPDATE users SET inactivity_warned_at = NOW()
+                    WHERE id IN ({", ".join(["%s"] * len(warned))})
+                    """,
+                    [account["id"] for account in warned],
+                )
+
             self.__db.commit()
 
             return accounts_to_warn
@@ -220,7 +248,7 @@ async def check_inactive_accounts_task():
 
             if inactive_accounts:
                 print(f"Found {len(inactive_accounts)} inactive accounts")
-                # Here we could send reactivation emails
+                # Warnings are delivered to the users by the outbox dispatcher
                 for account in inactive_accounts:
                     print(f"- {account['username']}: {account['days_inactive']} days inactive")
 
@@ -13,10 +13,14 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from ..config import SECRET_KEY, settings
+from .presence import presence_registry
 
 # Security scheme for protected endpoints
 security = HTTPBearer()
 
+# Security scheme for endpoints where authentication is optional
+optional_security = HTTPBearer(auto_error=False)
+
 
 def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None) -> str:
     """
@@ -78,6 +82,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
 def get_current_user_id(payload: dict = Depends(verify_token)) -> int:
     """
     Extract user ID from verified token payload.
+    Also refreshes the user's presence heartbeat if they are online.
 
     Args:
         payload: The verified token payload
@@ -85,7 +90,33 @@ def get_current_user_id(payload: dict = Depends(verify_token)) -> int:
     Returns:
         int: The user's ID
     """
-    return payload.get("user_id")
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        presence_registry.touch(user_id)
+    return user_id
+
+
+def get_optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+) -> Optional[int]:
+    """
+    Extract user ID from the token if one is provided.
+
+    Args:
+        credentials: The optional HTTP Bearer credentials
+
+    Returns:
+        Optional[int]: The user's ID, or None for anonymous or invalid tokens
+    """
+    if credentials is None:
+        return None
+
+    try:
+        payload = verify_token(credentials)
+    except HTTPException:
+        return None
+
+    return get_current_user_id(payload)
 
 
 def hash_password(password: str) -> str:
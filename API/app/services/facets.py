@@ -0,0 +1,496 @@
+"""
+Facets service.
+In-memory facet index over players: filtered result sets and facet counts
+for region, skill level, looking_for and games.
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..database import DatabaseSession
+
+# Single-valued profile facets
+PROFILE_FACETS = ("region", "skill_level", "looking_for")
+
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    """Normalize a facet value (the database compares them case-insensitively)."""
+    if value is None:
+        return None
+    value = value.strip().casefold()
+    return value or None
+
+
+class FacetIndex:
+    """
+    Facet index over players, one position per player.
+
+    Single-valued facets (region, skill level, looking_for) are stored as
+    one array of value codes per facet: the bitmap of a value is
+    `codes == code` and all the counts of a facet come from one bincount,
+    whatever the number of distinct values (regions are free text). Games
+    are multi-valued and stored as one bool bitmap per game_id. A visibility
+    bitmap excludes private profiles.
+
+    Counts are disjunctive: the counts of a facet apply the filters of the
+    other facets only, so the UI can show the alternatives to the selected
+    value.
+
+    Searches only hold the lock to take views of the arrays and compute on
+    them unlocked, so they neither serialize nor block updates. Updates
+    write single elements in place; a search running meanwhile may see some
+    of a player's new values and not others. Growing the arrays replaces
+    them, and searches in progress keep the old ones.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize an empty index.
+
+        Args:
+            capacity: Initial number of player positions
+        """
+        self.__lock = threading.Lock()
+        self.__built_at: Optional[datetime] = None
+        # Changes made while a rebuild loads its snapshot, replayed after the swap
+        self.__changes: Optional[List[Tuple[str, tuple]]] = None
+        self.__reset(capacity)
+
+    @property
+    def built_at(self) -> Optional[datetime]:
+        """Get the time of the last full build (None until built)."""
+        return self.__built_at
+
+    @property
+    def size(self) -> int:
+        """Get the number of indexed players (including private ones)."""
+        return self.__size
+
+    def rebuild(self, load: Callable[[], tuple]) -> int:
+        """
+        Replace the content of the index with a fresh snapshot.
+        Changes made while the snapshot is loaded and built are recorded and
+        replayed once it is swapped in.
+
+        Args:
+            load: Function returning the arguments of replace_all
+
+        Returns:
+            Number of players indexed
+        """
+        with self.__lock:
+            self.__changes = []
+        try:
+            snapshot = load()
+        except BaseException:
+            with self.__lock:
+                self.__changes = None
+            raise
+        return self.replace_all(*snapshot)
+
+    def replace_all(
+        self,
+        user_ids: np.ndarray,
+        visible: np.ndarray,
+        values: Dict[str, List[Optional[str]]],
+        game_user_ids: np.ndarray,
+        game_ids: np.ndarray,
+    ) -> int:
+        """
+        Replace the content of the index.
+
+        Args:
+            user_ids: Every player ID, sorted
+            visible: Whether each player appears in searches
+            values: Values of each profile facet, aligned with user_ids
+            game_user_ids: Player of each (player, game) pair
+            game_ids: Game of each (player, game) pair
+
+        Returns:
+            Number of players indexed
+        """
+        size = len(user_ids)
+        capacity = max(1024, size * 2)
+
+        codes = {}
+        dictionaries = {}
+        labels = {}
+        for facet in PROFILE_FACETS:
+            dictionaries[facet], labels[facet] = {}, [None]
+            facet_codes = np.zeros(capacity, dtype=np.int32)
+            facet_codes[:size] = [
+                self.__code(dictionaries[facet], labels[facet], value) for value in values[facet]
+            ]
+            codes[facet] = facet_codes
+
+        games = {}
+        positions = np.searchsorted(user_ids, game_user_ids)
+        known = (positions < size) & (user_ids[np.minimum(positions, size - 1)] == game_user_ids) \
+            if size else np.zeros(len(game_user_ids), dtype=bool)
+        positions, game_ids = positions[known], game_ids[known]
+        for game_id in np.unique(game_ids):
+            bitmap = np.zeros(capacity, dtype=bool)
+            bitmap[positions[game_ids == game_id]] = True
+            games[int(game_id)] = bitmap
+
+        padded_ids = np.zeros(capacity, dtype=np.int64)
+        padded_ids[:size] = user_ids
+        padded_visible = np.zeros(capacity, dtype=bool)
+        padded_visible[:size] = visible
+
+        with self.__lock:
+            self.__positions = {int(user_id): position for position, user_id in enumerate(user_ids)}
+            self.__user_ids = padded_ids
+            self.__visible = padded_visible
+            self.__codes = codes
+            self.__dictionaries = dictionaries
+            self.__labels = labels
+            self.__games = games
+            self.__size = size
+            self.__built_at = datetime.now()
+
+            changes, self.__changes = self.__changes, None
+            apply = {"player": self.__set_player, "game": self.__set_game}
+            for change, args in changes or ():
+                apply[change](*args)
+
+            return self.__size
+
+    def set_player(self, user_id: int, visible: bool, **values: Optional[str]) -> None:
+        """
+        Add or update a player's profile facets.
+
+        Args:
+            user_id: The player's ID
+            visible: Whether the player appears in searches
+            **values: Value of each profile facet
+        """
+        values = tuple(values.get(facet) for facet in PROFILE_FACETS)
+        with self.__lock:
+            self.__record("player", user_id, visible, values)
+            self.__set_player(user_id, visible, values)
+
+    def set_game(self, user_id: int, game_id: int, has_game: bool) -> None:
+        """
+        Add or remove a game of an indexed player.
+        Players not indexed yet (registered on another worker) are left to the
+        next rebuild rather than added without their profile.
+
+        Args:
+            user_id: The player's ID
+            game_id: The game's ID
+            has_game: True if the game was added, False if removed
+        """
+        with self.__lock:
+            self.__record("game", user_id, game_id, has_game)
+            self.__set_game(user_id, game_id, has_game)
+
+    def search(
+        self,
+        filters: Dict[str, Optional[str]],
+        game_id: Optional[int] = None,
+        limit: int = 20,
+        offset: int = 0,
+        user_ids: Optional[Iterable[int]] = None,
+    ) -> Tuple[List[int], int, Dict[str, Dict[Any, int]]]:
+        """
+        Filter players and count the values of every facet.
+
+        Args:
+            filters: Selected value of profile facets (None for no filter)
+            game_id: Selected game, or None
+            limit: Maximum player IDs returned
+            offset: Pagination offset
+            user_ids: Only consider these players (e.g. the matches of a
+                text search), or None for every player
+
+        Returns:
+            Tuple (player IDs of the page, newest first, total matching
+            players, counts per facet and value)
+        """
+        # Views of the current arrays and the filter codes, taken under the lock
+        with self.__lock:
+            size = self.__size
+            ids = self.__user_ids
+            visible = self.__visible[:size]
+            codes = {facet: self.__codes[facet][:size] for facet in PROFILE_FACETS}
+            labels = {facet: list(self.__labels[facet]) for facet in PROFILE_FACETS}
+            games = {game: bitmap[:size] for game, bitmap in self.__games.items()}
+            # Rebuilds replace the dict rather than clear it, and lookups
+            # need no lock
+            positions = self.__positions
+
+            # Bitmap of each active filter (None when the value is unknown)
+            filter_codes = {}
+            for facet in PROFILE_FACETS:
+                value = _normalize(filters.get(facet))
+                if value is not None:
+                    filter_codes[facet] = self.__dictionaries[facet].get(value)
+
+        if user_ids is not None:
+            selected = np.fromiter(
+                (positions.get(user_id, size) for user_id in user_ids), dtype=np.int64
+            )
+            # Unknown players, and those appended after the views were taken
+            selected = selected[selected < size]
+            restricted = np.zeros(size, dtype=bool)
+            restricted[selected] = True
+            visible = visible & restricted
+
+        masks = {
+            facet: None if code is None else codes[facet] == code
+            for facet, code in filter_codes.items()
+        }
+        if game_id is not None:
+            masks["game_id"] = games.get(game_id)
+
+        def matching(excluded: Optional[str] = None) -> np.ndarray:
+            result = visible.copy()
+            for facet, mask in masks.items():
+                if facet == excluded:
+                    continue
+                if mask is None:
+                    result[:] = False
+                    break
+                result &= mask
+            return result
+
+        result = matching()
+        total = int(np.count_nonzero(result))
+        page = ids[self.__last_positions(result, offset + limit)[offset:]].tolist()
+
+        counts = {}
+        for facet in PROFILE_FACETS:
+            facet_labels = labels[facet]
+            per_code = np.bincount(codes[facet], weights=matching(facet), minlength=len(facet_labels))
+            # Codes assigned after the views were taken have no label here
+            counts[facet] = {
+                facet_labels[code]: int(count)
+                for code, count in enumerate(per_code[:len(facet_labels)])
+                if code and count
+            }
+
+        selected = matching("game_id")
+        counts["game_id"] = {}
+        for game, bitmap in games.items():
+            count = int(np.count_nonzero(bitmap & selected))
+            if count:
+                counts["game_id"][game] = count
+
+        return page, total, counts
+
+    @staticmethod
+    def __last_positions(bitmap: np.ndarray, count: int, chunk_size: int = 65536) -> np.ndarray:
+        """Get the last `count` set positions of a bitmap, in descending order."""
+        found = []
+        remaining = count
+        end = len(bitmap)
+        while end > 0 and remaining > 0:
+            start = max(end - chunk_size, 0)
+            positions = np.flatnonzero(bitmap[start:end])[::-1][:remaining] + start
+            found.append(positions)
+            remaining -= len(positions)
+            end = start
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def __record(self, change: str, *args) -> None:
+        """Log a change if a rebuild is loading. The lock must be held."""
+        if self.__changes is not None:
+            self.__changes.append((change, args))
+
+    def __set_player(self, user_id: int, visible: bool, values: Tuple[Optional[str], ...]) -> None:
+        """Add or update a player's profile facets. The lock must be held."""
+        position = self.__position(user_id)
+        self.__visible[position] = visible
+        for facet, value in zip(PROFILE_FACETS, values):
+            self.__codes[facet][position] = self.__code(
+                self.__dictionaries[facet], self.__labels[facet], value
+            )
+
+    def __set_game(self, user_id: int, game_id: int, has_game: bool) -> None:
+        """Add or remove a game of an indexed player. The lock must be held."""
+        position = self.__positions.get(user_id)
+        if position is None:
+            return
+
+        bitmap = self.__games.get(game_id)
+        if bitmap is None:
+            if not has_game:
+                return
+            bitmap = self.__games[game_id] = np.zeros(len(self.__visible), dtype=bool)
+        bitmap[position] = has_game
+
+    def __position(self, user_id: int) -> int:
+        """Get a player's position, appending the player if new. The lock must be held."""
+        position = self.__positions.get(user_id)
+        if position is not None:
+            return position
+
+        if self.__size == len(self.__visible):
+            self.__grow(self.__size * 2)
+
+        position = self.__size
+        self.__positions[user_id] = position
+        self.__user_ids[position] = user_id
+        self.__size += 1
+        return position
+
+    def __grow(self, capacity: int) -> None:
+        """Enlarge every array to a new capacity. The lock must be held."""
+        def grown(array: np.ndarray) -> np.ndarray:
+            result = np.zeros(capacity, dtype=array.dtype)
+            result[:len(array)] = array
+            return result
+
+        self.__user_ids = grown(self.__user_ids)
+        self.__visible = grown(self.__visible)
+        self.__codes = {facet: grown(codes) for facet, codes in self.__codes.items()}
+        self.__games = {game: grown(bitmap) for game, bitmap in self.__games.items()}
+
+    def __reset(self, capacity: int) -> None:
+        """Allocate empty arrays."""
+        self.__positions: Dict[int, int] = {}
+        self.__user_ids = np.zeros(capacity, dtype=np.int64)
+        self.__visible = np.zeros(capacity, dtype=bool)
+        self.__codes = {facet: np.zeros(capacity, dtype=np.int32) for facet in PROFILE_FACETS}
+        self.__dictionaries: Dict[str, Dict[str, int]] = {facet: {} for facet in PROFILE_FACETS}
+        self.__labels: Dict[str, List[Optional[str]]] = {facet: [None] for facet in PROFILE_FACETS}
+        self.__games: Dict[int, np.ndarray] = {}
+        self.__size = 0
+
+    @staticmethod
+    def __code(dictionary: Dict[str, int], labels: List[Optional[str]], value: Optional[str]) -> int:
+        """Get the code of a facet value, assigning one if new (0 for no value)."""
+        key = _normalize(value)
+        if key is None:
+            return 0
+        code = dictionary.get(key)
+        if code is None:
+            code = dictionary[key] = len(labels)
+            labels.append(value.strip())
+        return code
+
+
+# Global index instance (per worker process)
+player_facets = FacetIndex()
+
+
+def update_player_facets(
+    user_id: int,
+    visibility: Optional[str],
+    region: Optional[str],
+    skill_level: Optional[str],
+    looking_for: Optional[str],
+) -> None:
+    """
+    Update the facet index after a registration or profile update.
+
+    Args:
+        user_id: The user's ID
+        visibility: The profile visibility (private profiles are not counted)
+        region: The user's region
+        skill_level: The user's skill level
+        looking_for: What the user is looking for
+    """
+    player_facets.set_player(
+        user_id, visibility != "private",
+        region=region, skill_level=skill_level, looking_for=looking_for,
+    )
+
+
+def _load_players(chunk_size: int = 50000) -> Tuple[np.ndarray, np.ndarray, Dict[str, list]]:
+    """Stream every player's facets in keyset-paginated chunks."""
+    user_ids = []
+    visible = []
+    values = {facet: [] for facet in PROFILE_FACETS}
+    last_id = 0
+
+    with DatabaseSession() as db:
+        while True:
+            db.execute("""
+                SELECT u.id, p.profile_visibility, p.region, p.skill_level, p.looking_for
+                FROM users u
+                LEFT JOIN user_profiles p ON u.id = p.user_id
+                WHERE u.id > %s
+                ORDER BY u.id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = db.fetchall()
+
+            for row in rows:
+                user_ids.append(row[0])
+                visible.append(row[1] != "private")
+                for facet, value in zip(PROFILE_FACETS, row[2:]):
+                    values[facet].append(value)
+
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1][0]
+
+    return np.asarray(user_ids, dtype=np.int64), np.asarray(visible, dtype=bool), values
+
+
+def _load_games(chunk_size: int = 100000) -> Tuple[np.ndarray, np.ndarray]:
+    """Stream every (player, game) pair in keyset-paginated chunks."""
+    chunks = []
+    last_id = 0
+
+    with DatabaseSession() as db:
+        while True:
+            db.execute("""
+                SELECT id, user_id, game_id FROM user_games
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = db.fetchall()
+
+            if rows:
+                chunk = np.asarray(rows, dtype=np.int64)
+                chunks.append(chunk[:, 1:])
+                last_id = int(chunk[-1, 0])
+
+            if len(rows) < chunk_size:
+                break
+
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    pairs = np.concatenate(chunks)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def rebuild_player_facets() -> int:
+    """
+    Rebuild the facet index from the database.
+
+    Returns:
+        Number of players indexed
+    """
+    def load():
+        user_ids, visible, values = _load_players()
+        game_user_ids, game_ids = _load_games()
+        return user_ids, visible, values, game_user_ids, game_ids
+
+    return player_facets.rebuild(load)
+
+
+async def refresh_player_facets_task():
+    """
+    Background task rebuilding the facet index periodically.
+    Changes made on this worker are applied incrementally in between; the
+    rebuild picks up the ones made on other workers.
+    """
+    while True:
+        try:
+            count = await asyncio.to_thread(rebuild_player_facets)
+            print(f"Player facets index rebuilt: {count} players")
+        except Exception as e:
+            print(f"Error rebuilding player facets index: {e}")
+
+        await asyncio.sleep(settings.FACETS_REFRESH_SECONDS)
@@ -3,8 +3,18 @@ Matching service.
 Provides advanced matching algorithm with weighted scoring.
 """
 
-from typing import List, Dict, Any
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
 from ..database import DatabaseSession
+from .presence import presence_registry
+from .recommendations import similar_players
 
 
 # Scoring weights for matching algorithm
@@ -156,17 +166,306 @@ def calculate_match_score(
     }
 
 
-def find_matches_advanced(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+# Dense lookup tables for batch scoring (last row/column = unknown value)
+_SKILL_LEVELS = ["beginner", "intermediate", "advanced", "expert"]
+_SKILL_INDEX = {level: i for i, level in enumerate(_SKILL_LEVELS)}
+_SKILL_TABLE = np.full((len(_SKILL_LEVELS) + 1, len(_SKILL_LEVELS) + 1), 0.5)
+for (_a, _b), _value in SKILL_COMPATIBILITY.items():
+    _SKILL_TABLE[_SKILL_INDEX[_a], _SKILL_INDEX[_b]] = _value
+
+_LOOKING_VALUES = ["casual", "competitive", "both"]
+_LOOKING_INDEX = {value: i for i, value in enumerate(_LOOKING_VALUES)}
+_LOOKING_TABLE = np.full((len(_LOOKING_VALUES) + 1, len(_LOOKING_VALUES) + 1), 0.5)
+for (_a, _b), _value in LOOKING_FOR_COMPATIBILITY.items():
+    _LOOKING_TABLE[_LOOKING_INDEX[_a], _LOOKING_INDEX[_b]] = _value
+
+
+def _skill_code(value: Optional[str]) -> int:
+    """Map a skill level to its lookup table index."""
+    return _SKILL_INDEX.get((value or "intermediate").lower(), len(_SKILL_LEVELS))
+
+
+def _looking_code(value: Optional[str]) -> int:
+    """Map a looking_for value to its lookup table index."""
+    return _LOOKING_INDEX.get((value or "both").lower(), len(_LOOKING_VALUES))
+
+
+def _timezone_score(user_tz: Optional[str], candidate_tz: Optional[str]) -> float:
+    """Timezone component of calculate_match_score."""
+    if not user_tz or not candidate_tz:
+        return 0
+    if user_tz == candidate_tz:
+        return WEIGHTS["timezone_match"]
+    try:
+        user_offset = int(user_tz.replace("UTC", "").replace("+", "") or 0)
+        candidate_offset = int(candidate_tz.replace("UTC", "").replace("+", "") or 0)
+    except (ValueError, AttributeError):
+        return 0
+    tz_diff = abs(user_offset - candidate_offset)
+    if tz_diff <= 2:
+        return WEIGHTS["timezone_match"] * (1 - tz_diff * 0.3)
+    return 0
+
+
+def calculate_match_scores_batch(
+    user_profile: Dict[str, Any],
+    user_games: List[Dict[str, Any]],
+    candidate_profiles: List[Dict[str, Any]],
+    candidate_games: List[List[Dict[str, Any]]],
+) -> np.ndarray:
+    """
+    Calculate total match scores for many candidates in one vectorized pass.
+
+    Produces the same total_score as calculate_match_score, without the
+    breakdown.
+
+    Args:
+        user_profile: Current user's profile data
+        user_games: Current user's games with skill levels
+        candidate_profiles: Profiles of the candidates
+        candidate_games: Games of each candidate, aligned with candidate_profiles
+
+    Returns:
+        Array of total scores (0-100), aligned with candidate_profiles
+    """
+    n = len(candidate_profiles)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Candidate skill per user game (-1 when the game is not shared)
+    game_columns = {g["game_id"]: j for j, g in enumerate(user_games)}
+    user_game_skills = np.array([_skill_code(g.get("skill_level")) for g in user_games], dtype=np.int64)
+    shared_skills = np.full((n, len(user_games)), -1, dtype=np.int64)
+    for i, games in enumerate(candidate_games):
+        for game in games:
+            j = game_columns.get(game["game_id"])
+            if j is not None:
+                shared_skills[i, j] = _skill_code(game.get("skill_level"))
+
+    common = shared_skills >= 0
+    common_count = common.sum(axis=1)
+
+    # 1. Common games / 2. Game skill level matching
+    common_game_score = np.minimum(common_count * WEIGHTS["common_games"], 60)
+    game_compat = _SKILL_TABLE[user_game_skills[np.newaxis, :], np.maximum(shared_skills, 0)]
+    game_skill_score = np.minimum(
+        np.where(common, WEIGHTS["game_skill_match"] * game_compat, 0.0).sum(axis=1), 30
+    )
+
+    # 3. Overall skill level / 6. Looking for compatibility
+    skill_codes = np.array([_skill_code(c.get("skill_level")) for c in candidate_profiles])
+    skill_score = WEIGHTS["skill_match"] * _SKILL_TABLE[_skill_code(user_profile.get("skill_level")), skill_codes]
+    looking_codes = np.array([_looking_code(c.get("looking_for")) for c in candidate_profiles])
+    looking_score = WEIGHTS["looking_for_match"] * _LOOKING_TABLE[_looking_code(user_profile.get("looking_for")), looking_codes]
+
+    # 4. Region / 5. Timezone
+    user_region = (user_profile.get("region") or "").lower()
+    region_score = np.array([
+        WEIGHTS["region_match"] if user_region and user_region == (c.get("region") or "").lower() else 0
+        for c in candidate_profiles
+    ])
+    timezone_score = np.array([
+        _timezone_score(user_profile.get("timezone"), c.get("timezone")) for c in candidate_profiles
+    ], dtype=np.float64)
+
+    # Same summation order as calculate_match_score
+    score = common_game_score + game_skill_score
+    score = score + skill_score
+    score = score + region_score
+    score = score + timezone_score
+    score = score + looking_score
+
+    return np.minimum(100, np.round(score)).astype(np.int64)
+
+
+class PairScoreCache:
+    """
+    Bounded LRU cache of compatibility scores between two users.
+
+    Entries expire after a TTL so profile and game changes are picked up.
+    """
+
+    def __init__(self, max_size: int = 100000, ttl_seconds: int = 600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of cached pairs
+            ttl_seconds: Seconds before a cached score is recomputed
+        """
+        self.__max_size = max_size
+        self.__ttl = ttl_seconds
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[Tuple[int, int], Tuple[int, float]]" = OrderedDict()
+
+    def get_many(self, user_id: int, candidate_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Get cached scores between a user and candidates.
+
+        Args:
+            user_id: The user's ID
+            candidate_ids: Candidate IDs
+
+        Returns:
+            Dict of candidate ID to score, for cache hits only
+        """
+        now = time.monotonic()
+        found = {}
+        with self.__lock:
+            for candidate_id in candidate_ids:
+                key = (user_id, candidate_id)
+                entry = self.__entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] < now:
+                    del self.__entries[key]
+                    continue
+                self.__entries.move_to_end(key)
+                found[candidate_id] = entry[0]
+        return found
+
+    def set_many(self, user_id: int, scores: Dict[int, int]) -> None:
+        """
+        Store scores between a user and candidates.
+
+        Args:
+            user_id: The user's ID
+            scores: Dict of candidate ID to score
+        """
+        expires_at = time.monotonic() + self.__ttl
+        with self.__lock:
+            for candidate_id, score in scores.items():
+                key = (user_id, candidate_id)
+                self.__entries[key] = (int(score), expires_at)
+                self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every cached score."""
+        with self.__lock:
+            self.__entries.clear()
+
+
+# Global cache instance (per worker process)
+pair_score_cache = PairScoreCache(
+    max_size=settings.SCORE_CACHE_SIZE,
+    ttl_seconds=settings.SCORE_CACHE_TTL_SECONDS,
+)
+
+
+def get_compatibility_scores(
+    user_id: int,
+    candidates: List[Dict[str, Any]],
+    id_key: str = "user_id",
+) -> Dict[int, int]:
+    """
+    Get compatibility scores between a user and a page of candidates.
+
+    Cached pair scores are reused; the remaining candidates are scored
+    together with calculate_match_scores_batch. Candidate rows must carry
+    skill_level, looking_for, region and timezone.
+
+    Args:
+        user_id: The user's ID
+        candidates: Candidate rows
+        id_key: Key holding the candidate ID in each row
+
+    Returns:
+        Dict of candidate ID to score (0-100)
+    """
+    candidate_ids = [c[id_key] for c in candidates if c[id_key] != user_id]
+    scores = pair_score_cache.get_many(user_id, candidate_ids)
+
+    missing = [c for c in candidates if c[id_key] != user_id and c[id_key] not in scores]
+    if not missing:
+        return scores
+
+    missing_ids = [c[id_key] for c in missing]
+    with DatabaseSession(dict_cursor=True) as db:
+        db.execute("""
+            SELECT skill_level, region, timezone, looking_for
+            FROM user_profiles WHERE user_id = %s
+        """, (user_id,))
+        user_profile = db.fetchone() or {}
+
+        db.execute(f"""
+            SELECT user_id, game_id, skill_level
+            FROM user_games
+            WHERE user_id IN ({",".join(["%s"] * (len(missing_ids) + 1))})
+        """, [user_id] + missing_ids)
+        games_by_user = {uid: [] for uid in missing_ids + [user_id]}
+        for row in db.fetchall():
+            games_by_user[row["user_id"]].append(row)
+
+    computed = calculate_match_scores_batch(
+        user_profile,
+        games_by_user[user_id],
+        missing,
+        [games_by_user[uid] for uid in missing_ids],
+    )
+    new_scores = dict(zip(missing_ids, computed.tolist()))
+    pair_score_cache.set_many(user_id, new_scores)
+
+    scores.update(new_scores)
+    return scores
+
+
+# Candidates with common games scored per deck
+MATCH_CANDIDATE_LIMIT = 50
+
+
+def find_matches_advanced(
+    user_id: int,
+    limit: int = 10,
+    online_only: bool = False,
+    boost_online: bool = False,
+) -> List[Dict[str, Any]]:
     """
     Find potential matches using advanced scoring algorithm.
 
     Args:
         user_id: Current user's ID
         limit: Maximum number of matches to return
+        online_only: Only consider players currently online for a common game
+        boost_online: Add a score bonus to players currently online
 
     Returns:
         List of potential matches with scores
     """
+    deck = []
+    for deck in iter_match_deck(
+        user_id, limit, online_only, boost_online, batch_size=MATCH_CANDIDATE_LIMIT
+    ):
+        pass
+    return deck
+
+
+def iter_match_deck(
+    user_id: int,
+    limit: int = 10,
+    online_only: bool = False,
+    boost_online: bool = False,
+    batch_size: int = 10,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Find potential matches batch by batch.
+
+    Players similar to the user's accepted matches are scored first, then
+    players with common games in batches of `batch_size` (in ID order, up
+    to MATCH_CANDIDATE_LIMIT). After each batch the best `limit` matches
+    so far are yielded, best first; the last list yielded is the final deck.
+
+    Args:
+        user_id: Current user's ID
+        limit: Maximum number of matches per deck
+        online_only: Only consider players currently online for a common game
+        boost_online: Add a score bonus to players currently online
+        batch_size: Common-game candidates fetched and scored per batch
+
+    Yields:
+        The current best matches with scores, best first
+    """
     with DatabaseSession(dict_cursor=True) as db:
         # Get user's profile
         db.execute("""
@@ -183,12 +482,39 @@ def find_matches_advanced(user_id: int, limit: int = 10) -> List[Dict[str, Any]]
         user_games = db.fetchall()
 
         if not user_games:
-            return []
+            return
 
         game_ids = [g["game_id"] for g in user_games]
         placeholders = ",".join(["%s"] * len(game_ids))
 
-        # Find candidates with common games
+        # Presence lookups are served from memory
+        online_ids = set()
+        if online_only or boost_online:
+            online_ids = presence_registry.online_for_games(game_ids)
+            online_ids.discard(user_id)
+
+        online_filter = ""
+        online_params = []
+        if online_only:
+            if not online_ids:
+                return
+            online_params = list(online_ids)
+            online_filter = f"AND u.id IN ({','.join(['%s'] * len(online_params))})"
+
+        # Players similar to the user's accepted matches (collaborative filtering)
+        similar_scores = {}
+        if similar_players.size:
+            db.execute("""
+                SELECT CASE WHEN user1_id = %s THEN user2_id ELSE user1_id END as partner_id
+                FROM matches
+                WHERE (user1_id = %s OR user2_id = %s) AND status = 'accepted'
+            """, (user_id, user_id, user_id))
+            partner_ids = [row["partner_id"] for row in db.fetchall()]
+            similar_scores = similar_players.recommend(partner_ids, exclude=[user_id])
+        max_similarity = max(similar_scores.values(), default=0)
+
+        # Similar players, then common-game candidates, with the same columns:
+        # `games` lists the games in common with the user in both cases
         query = f"""
             SELECT DISTINCT
                 u.id as user_id,
@@ -202,11 +528,12 @@ def find_matches_advanced(user_id: int, limit: int = 10) -> List[Dict[str, Any]]
                 GROUP_CONCAT(DISTINCT g.name ORDER BY g.name SEPARATOR ', ') as games
             FROM users u
             JOIN user_profiles p ON u.id = p.user_id
-            JOIN user_games ug ON u.id = ug.user_id
-            JOIN games g ON ug.game_id = g.id
+            {{join}} user_games ug ON u.id = ug.user_id AND ug.game_id IN ({placeholders})
+            {{join}} games g ON ug.game_id = g.id
             WHERE u.id != %s
                 AND (p.profile_visibility != 'private' OR p.profile_visibility IS NULL)
-                AND ug.game_id IN ({placeholders})
+                {{source_filter}}
+                {online_filter}
                 AND u.id NOT IN (
                     SELECT CASE
                         WHEN user1_id = %s THEN user2_id
@@ -218,69 +545,154 @@ def find_matches_advanced(user_id: int, limit: int = 10) -> List[Dict[str, Any]]
                 )
             GROUP BY u.id, u.username, p.avatar_url, p.bio, p.skill_level,
                      p.looking_for, p.timezone, p.region
-            LIMIT 50
+            ORDER BY u.id
+            LIMIT %s
         """
 
-        params = [user_id] + game_ids + [user_id, user_id, user_id]
-        db.execute(query, params)
-        candidates = db.fetchall()
-
-        # Calculate scores for each candidate
-        scored_matches = []
-        for candidate in candidates:
-            # Get candidate's games
-            db.execute("""
-                SELECT game_id, skill_level
-                FROM user_games WHERE user_id = %s
-            """, (candidate["user_id"],))
-            candidate_games = db.fetchall()
-
-            # Calculate score
-            score_result = calculate_match_score(
-                user_profile,
-                user_games,
-                candidate,
-                candidate_games,
+        def fetch_candidates(join: str, source_filter: str, source_params: list, count: int) -> list:
+            db.execute(
+                query.format(join=join, source_filter=source_filter),
+                game_ids + [user_id] + source_params + online_params
+                + [user_id, user_id, user_id, count],
             )
+            return list(db.fetchall())
+
+        top_matches = []
+        scored = set()
+
+        def score_batch(candidates: list) -> None:
+            """Score a batch of candidates into the bounded top_matches heap."""
+            candidates = [c for c in candidates if c["user_id"] not in scored]
+            if not candidates:
+                return
+
+            # Get the batch's games in a single query
+            candidate_games = {candidate["user_id"]: [] for candidate in candidates}
+            db.execute(f"""
+                SELECT user_id, game_id, skill_level
+                FROM user_games
+                WHERE user_id IN ({",".join(["%s"] * len(candidate_games))})
+            """, list(candidate_games))
+            for row in db.fetchall():
+                candidate_games[row["user_id"]].append(row)
+
+            base_scores = {}
+            for candidate in candidates:
+                # Ties keep the candidate order (earlier position ranks higher)
+                position = len(scored)
+                scored.add(candidate["user_id"])
+
+                score_result = calculate_match_score(
+                    user_profile,
+                    user_games,
+                    candidate,
+                    candidate_games[candidate["user_id"]],
+                )
 
-            candidate["match_score"] = score_result["total_score"]
-            candidate["score_breakdown"] = score_result["breakdown"]
-            candidate["common_games_count"] = score_result["common_games_count"]
-            scored_matches.append(candidate)
+                base_scores[candidate["user_id"]] = score_result["total_score"]
+                candidate["match_score"] = score_result["total_score"]
+                candidate["score_breakdown"] = score_result["breakdown"]
+                candidate["common_games_count"] = score_result["common_games_count"]
+                candidate["is_online"] = candidate["user_id"] in online_ids
+
+                similarity = similar_scores.get(candidate["user_id"])
+                if similarity:
+                    bonus = round(settings.RECOMMENDATIONS_MATCH_WEIGHT * similarity / max_similarity)
+                    candidate["score_breakdown"]["similar_matches"] = bonus
+                    candidate["match_score"] = min(100, candidate["match_score"] + bonus)
+
+                if boost_online and candidate["is_online"]:
+                    boost = settings.PRESENCE_MATCH_BOOST
+                    candidate["score_breakdown"]["online_boost"] = boost
+                    candidate["match_score"] = min(100, candidate["match_score"] + boost)
+
+                entry = (candidate["match_score"], -position, candidate)
+                if len(top_matches) < limit:
+                    heapq.heappush(top_matches, entry)
+                elif entry[:2] > top_matches[0][:2]:
+                    heapq.heapreplace(top_matches, entry)
+
+            # Pure compatibility scores can be reused by personalized search
+            pair_score_cache.set_many(user_id, base_scores)
+
+        def deck() -> List[Dict[str, Any]]:
+            return [candidate for _, _, candidate in sorted(top_matches, key=lambda e: e[:2], reverse=True)]
+
+        # Similar players are fetched by ID so none is cut by the candidate limit
+        similar_ids = list(similar_scores)
+        if similar_ids:
+            score_batch(fetch_candidates(
+                "LEFT JOIN",
+                f"AND u.id IN ({','.join(['%s'] * len(similar_ids))})",
+                similar_ids,
+                len(similar_ids),
+            ))
+            if top_matches:
+                yield deck()
+
+        # Common-game candidates, keyset-paginated on the user ID
+        last_id = 0
+        fetched = 0
+        while fetched < MATCH_CANDIDATE_LIMIT:
+            batch = fetch_candidates(
+                "JOIN", "AND u.id > %s", [last_id], min(batch_size, MATCH_CANDIDATE_LIMIT - fetched)
+            )
+            if not batch:
+                break
+            fetched += len(batch)
+            last_id = batch[-1]["user_id"]
 
-        # Sort by score descending
-        scored_matches.sort(key=lambda x: x["match_score"], reverse=True)
+            score_batch(batch)
+            if top_matches:
+                yield deck()
 
-        return scored_matches[:limit]
+            if len(batch) < batch_size:
+                break
 
 
-def create_match_record(user_id: int, candidate_id: int, score: int) -> int:
+def create_match_records(user_id: int, scored: Iterable[Tuple[int, int]]) -> Dict[int, int]:
     """
-    Create or update a match record.
+    Create or update several match records in one round trip.
 
     Args:
         user_id: Current user's ID
-        candidate_id: Candidate's ID
-        score: Match score
+        scored: Iterable of (candidate_id, score)
 
     Returns:
-        The match ID
+        Dict mapping candidate ID to match ID
     """
+    scored = list(scored)
+    if not scored:
+        return {}
+
+    candidate_ids = [candidate_id for candidate_id, _ in scored]
+    placeholders = ",".join(["%s"] * len(candidate_ids))
+    values = ", ".join(["(%s, %s, %s, 'pending')"] * len(scored))
+    params = []
+    for candidate_id, score in scored:
+        params.extend([user_id, candidate_id, score])
+
     with DatabaseSession() as db:
-        db.execute("""
+        db.execute(f"""
             INSERT INTO matches (user1_id, user2_id, match_score, status)
-            VALUES (%s, %s, %s, 'pending')
+            VALUES {values}
             ON DUPLICATE KEY UPDATE
                 match_score = VALUES(match_score),
-                updated_at = NOW()
-        """, (user_id, candidate_id, score))
-
-        # Get the match ID
-        db.execute("""
-            SELECT id FROM matches
-            WHERE (user1_id = %s AND user2_id = %s)
-               OR (user1_id = %s AND user2_id = %s)
-        """, (user_id, candidate_id, candidate_id, user_id))
-        result = db.fetchone()
-
-        return result[0] if result else db.lastrowid
+                updated_at = NOW(6)
+        """, params)
+
+        # Get the match IDs, preferring the row just written
+        db.execute(f"""
+            SELECT id, user1_id, user2_id FROM matches
+            WHERE (user1_id = %s AND user2_id IN ({placeholders}))
+               OR (user2_id = %s AND user1_id IN ({placeholders}))
+        """, [user_id] + candidate_ids + [user_id] + candidate_ids)
+
+        match_ids = {}
+        for match_id, user1_id, user2_id in db.fetchall():
+            if user1_id == user_id:
+                match_ids[user2_id] = match_id
+            else:
+                match_ids.setdefault(user1_id, match_id)
+
+        return match_ids
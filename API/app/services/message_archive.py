@@ -0,0 +1,99 @@
+"""
+Message archive service.
+Moves old messages from the hot `messages` table to `messages_archive`.
+"""
+
+import asyncio
+from typing import Optional
+
+from ..config import settings
+from ..database import DatabaseSession
+
+# Columns copied from messages to messages_archive
+ARCHIVE_COLUMNS = "id, sender_id, receiver_id, content, content_zip, is_compressed, is_read, created_at"
+
+
+def archive_messages(hot_days: int, batch_size: int = 1000, max_batches: Optional[int] = None) -> int:
+    """
+    Move messages older than the hot window to the archive.
+
+    Each batch is one short transaction: copy the oldest rows, add them to
+    the per-sender archived counts, then delete them from messages.
+
+    Args:
+        hot_days: Age in days after which a message is archived
+        batch_size: Messages moved per transaction
+        max_batches: Optional limit on the number of batches for one run
+
+    Returns:
+        Number of messages archived
+    """
+    archived = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        with DatabaseSession(dict_cursor=True) as db:
+            db.execute(
+                """
+                SELECT id FROM messages
+                WHERE created_at < DATE_SUB(NOW(), INTERVAL %s DAY)
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE
+                """,
+                (hot_days, batch_size),
+            )
+            ids = [row["id"] for row in db.fetchall()]
+
+            if not ids:
+                break
+
+            placeholders = ",".join(["%s"] * len(ids))
+
+            db.execute(
+                f"""
+                INSERT IGNORE INTO messages_archive ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM messages WHERE id IN ({placeholders})
+                """,
+                ids,
+            )
+            db.execute(
+                f"""
+                INSERT INTO messages_archive_counts (sender_id, message_count)
+                SELECT sender_id, COUNT(*) FROM messages
+                WHERE id IN ({placeholders})
+                GROUP BY sender_id
+                ON DUPLICATE KEY UPDATE
+                    message_count = message_count + VALUES(message_count)
+                """,
+                ids,
+            )
+            db.execute(f"DELETE FROM messages WHERE id IN ({placeholders})", ids)
+
+        archived += len(ids)
+        batches += 1
+
+        if len(ids) < batch_size:
+            break
+
+    return archived
+
+
+async def archive_messages_task():
+    """
+    Background task archiving old messages periodically.
+    Keeps the hot table at a constant window of MESSAGE_HOT_DAYS days.
+    """
+    while True:
+        try:
+            count = await asyncio.to_thread(
+                archive_messages,
+                settings.MESSAGE_HOT_DAYS,
+                settings.MESSAGE_ARCHIVE_BATCH_SIZE,
+            )
+            if count:
+                print(f"Archived {count} messages")
+        except Exception as e:
+            print(f"Error archiving messages: {e}")
+
+        await asyncio.sleep(settings.MESSAGE_ARCHIVE_INTERVAL_SECONDS)
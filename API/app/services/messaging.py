@@ -0,0 +1,636 @@
+"""
+Messaging service.
+Handles message sending and the conversations summary table used by the inbox.
+"""
+
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from ..config import settings
+from ..database import DatabaseSession
+from . import outbox
+
+# Maximum length of the last message snippet stored in conversations
+SNIPPET_LENGTH = 255
+
+
+def conversation_key(user_a: int, user_b: int) -> Tuple[int, int]:
+    """
+    Get the canonical (low, high) key of a conversation.
+
+    Args:
+        user_a: One participant's ID
+        user_b: The other participant's ID
+
+    Returns:
+        Tuple (user_low_id, user_high_id)
+    """
+    return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+
+def record_message(
+    db: DatabaseSession,
+    message_id: int,
+    sender_id: int,
+    receiver_id: int,
+    content: str,
+) -> None:
+    """
+    Update the conversation summary for a newly inserted message.
+    Must run in the same session (transaction) as the message INSERT.
+
+    Args:
+        db: Open database session
+        message_id: ID of the inserted message
+        sender_id: Sender's ID
+        receiver_id: Receiver's ID
+        content: Message content
+    """
+    low, high = conversation_key(sender_id, receiver_id)
+    unread_low = 1 if receiver_id == low else 0
+    unread_high = 1 - unread_low
+
+    # Last message fields only move forward; last_message_id is assigned last
+    # because MySQL evaluates the assignments from left to right
+    db.execute(
+        """
+        INSERT INTO conversations (
+            user_low_id, user_high_id, last_message_id, last_sender_id,
+            last_message, last_message_time, unread_low, unread_high
+        ) VALUES (%s, %s, %s, %s, %s, NOW(), %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_sender_id = IF(VALUES(last_message_id) > last_message_id,
+                                VALUES(last_sender_id), last_sender_id),
+            last_message = IF(VALUES(last_message_id) > last_message_id,
+                              VALUES(last_message), last_message),
+            last_message_time = IF(VALUES(last_message_id) > last_message_id,
+                                   VALUES(last_message_time), last_message_time),
+            unread_low = unread_low + VALUES(unread_low),
+            unread_high = unread_high + VALUES(unread_high),
+            last_message_id = GREATEST(last_message_id, VALUES(last_message_id))
+        """,
+        (low, high, message_id, sender_id, content[:SNIPPET_LENGTH], unread_low, unread_high),
+    )
+
+
+def get_read_watermarks(db: DatabaseSession, user_id: int, peer_id: int) -> Tuple[int, int]:
+    """
+    Get the read watermarks of both participants of a conversation.
+
+    Args:
+        db: Open database session (dict cursor)
+        user_id: Current user's ID
+        peer_id: The other participant's ID
+
+    Returns:
+        Tuple (last message read by the user, last message read by the peer)
+    """
+    db.execute(
+        """
+        SELECT reader_id, last_read_message_id FROM conversation_reads
+        WHERE (reader_id = %s AND peer_id = %s) OR (reader_id = %s AND peer_id = %s)
+        """,
+        (user_id, peer_id, peer_id, user_id),
+    )
+    watermarks = {row["reader_id"]: row["last_read_message_id"] for row in db.fetchall()}
+
+    return watermarks.get(user_id, 0), watermarks.get(peer_id, 0)
+
+
+def mark_read(db: DatabaseSession, reader_id: int, peer_id: int, message_id: int) -> bool:
+    """
+    Move the reader's watermark forward to a message.
+
+    The watermark never moves backwards. When it moves, the reader's unread
+    counter in conversations is recomputed from it.
+
+    Args:
+        db: Open database session
+        reader_id: ID of the user who read the messages
+        peer_id: ID of the other participant
+        message_id: ID of the last message read
+
+    Returns:
+        True if the watermark moved
+    """
+    db.execute(
+        """
+        INSERT INTO conversation_reads (reader_id, peer_id, last_read_message_id)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_read_message_id = GREATEST(last_read_message_id, VALUES(last_read_message_id))
+        """,
+        (reader_id, peer_id, message_id),
+    )
+    if db.rowcount == 0:
+        return False
+
+    low, high = conversation_key(reader_id, peer_id)
+    column = "unread_low" if reader_id == low else "unread_high"
+
+    db.execute(
+        f"""
+        UPDATE conversations SET {column} = (
+            SELECT COUNT(*) FROM messages
+            WHERE sender_id = %s AND receiver_id = %s AND id > %s
+        )
+        WHERE user_low_id = %s AND user_high_id = %s
+        """,
+        (peer_id, reader_id, message_id, low, high),
+    )
+    return True
+
+
+class AcceptedPairCache:
+    """
+    Bounded LRU cache of each user's accepted match partners.
+
+    Used to authorize reading conversations without querying matches on
+    every request. Match decisions update the cached sets of the users
+    involved. A partner missing from a cached set is re-checked in the
+    database, so only rejections taken on other workers can be served stale
+    (until the TTL); message inserts are conditional on the match, so a
+    stale entry never lets a message through.
+    """
+
+    def __init__(self, max_users: int = 50000, ttl_seconds: int = 300):
+        """
+        Initialize the cache.
+
+        Args:
+            max_users: Maximum number of users whose partners are cached
+            ttl_seconds: Seconds before a user's partners are reloaded
+        """
+        self.__max_users = max_users
+        self.__ttl = ttl_seconds
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[int, Tuple[Set[int], float]]" = OrderedDict()
+        # Bumped by every decision so loads racing with one are not cached
+        self.__version = 0
+
+    def partners(
+        self,
+        db: Optional[DatabaseSession],
+        user_id: int,
+        refresh: bool = False,
+    ) -> Set[int]:
+        """
+        Get the users a user has an accepted match with.
+
+        Args:
+            db: Open database session (dict cursor) used on cache misses,
+                or None to open one
+            user_id: The user's ID
+            refresh: Reload from the database even if cached
+
+        Returns:
+            Set of partner IDs
+        """
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(user_id)
+            if not refresh and entry is not None and entry[1] >= now:
+                self.__entries.move_to_end(user_id)
+                return entry[0]
+            version = self.__version
+
+        if db is None:
+            with DatabaseSession(dict_cursor=True) as own_db:
+                partners = self.__load(own_db, user_id)
+        else:
+            partners = self.__load(db, user_id)
+
+        with self.__lock:
+            if version != self.__version:
+                return partners
+            self.__entries[user_id] = (partners, now + self.__ttl)
+            self.__entries.move_to_end(user_id)
+            while len(self.__entries) > self.__max_users:
+                self.__entries.popitem(last=False)
+
+        return partners
+
+    def add(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """
+        Record newly accepted matches in the cached sets.
+
+        Args:
+            pairs: (user1_id, user2_id) of each accepted match
+        """
+        with self.__lock:
+            self.__version += 1
+            for user_a, user_b in pairs:
+                for user_id, partner_id in ((user_a, user_b), (user_b, user_a)):
+                    entry = self.__entries.get(user_id)
+                    if entry is not None:
+                        entry[0].add(partner_id)
+
+    def remove(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """
+        Remove rejected matches from the cached sets.
+
+        Args:
+            pairs: (user1_id, user2_id) of each rejected match
+        """
+        with self.__lock:
+            self.__version += 1
+            for user_a, user_b in pairs:
+                for user_id, partner_id in ((user_a, user_b), (user_b, user_a)):
+                    entry = self.__entries.get(user_id)
+                    if entry is not None:
+                        entry[0].discard(partner_id)
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self.__lock:
+            self.__entries.clear()
+
+    def __load(self, db: DatabaseSession, user_id: int) -> Set[int]:
+        """Load a user's accepted partners from the database."""
+        db.execute(
+            """
+            SELECT user2_id as partner_id FROM matches WHERE user1_id = %s AND status = 'accepted'
+            UNION
+            SELECT user1_id FROM matches WHERE user2_id = %s AND status = 'accepted'
+            """,
+            (user_id, user_id),
+        )
+        return {row["partner_id"] for row in db.fetchall()}
+
+
+# Global cache instance (per worker process)
+accepted_pairs = AcceptedPairCache(
+    max_users=settings.MATCH_AUTH_CACHE_SIZE,
+    ttl_seconds=settings.MATCH_AUTH_CACHE_TTL_SECONDS,
+)
+
+
+def ensure_matched(
+    db: Optional[DatabaseSession],
+    user_id: int,
+    other_user_id: int,
+) -> None:
+    """
+    Check that two users have an accepted match.
+    Served from the accepted pair cache; a miss is confirmed in the database.
+
+    Args:
+        db: Open database session (dict cursor), or None to open one only if needed
+        user_id: Current user's ID
+        other_user_id: The other user's ID
+
+    Raises:
+        HTTPException: 403 if the users are not matched
+    """
+    if other_user_id in accepted_pairs.partners(db, user_id):
+        return
+
+    if other_user_id not in accepted_pairs.partners(db, user_id, refresh=True):
+        raise HTTPException(status_code=403, detail="You can only message matched users")
+
+
+def compress_content(content: str) -> Tuple[str, Optional[bytes]]:
+    """
+    Compress a message body if it is above the compression threshold.
+
+    Args:
+        content: Message content
+
+    Returns:
+        Tuple (value stored in content, compressed body or None). For a
+        compressed message the stored content is a short preview.
+    """
+    threshold = settings.MESSAGE_COMPRESSION_THRESHOLD
+    raw = content.encode("utf-8")
+    if threshold <= 0 or len(raw) < threshold:
+        return content, None
+
+    compressed = zlib.compress(raw, settings.MESSAGE_COMPRESSION_LEVEL)
+    if len(compressed) >= len(raw):
+        return content, None
+
+    return content[:SNIPPET_LENGTH], compressed
+
+
+def inflate_messages(rows: Iterable[Dict[str, Any]]) -> None:
+    """
+    Restore the full content of compressed messages, in place.
+    Call only on rows that are returned to the client.
+
+    Args:
+        rows: Message rows selected with content_zip and is_compressed
+    """
+    for row in rows:
+        compressed = row.pop("content_zip", None)
+        if row.pop("is_compressed", False) and compressed:
+            row["content"] = zlib.decompress(compressed).decode("utf-8")
+
+
+def _message_dict(message_id: Optional[int], sender_id: int, receiver_id: int, content: str) -> Dict[str, Any]:
+    """Build the message returned to senders and pushed to receivers."""
+    return {
+        "id": message_id,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "content": content,
+        "is_read": False,
+        "created_at": datetime.now().replace(microsecond=0).isoformat(),
+    }
+
+
+def _insert_messages(
+    db: DatabaseSession,
+    rows: List[Tuple[int, int, str]],
+    consecutive_ids: bool,
+) -> List[Optional[int]]:
+    """
+    Insert messages between matched users, update their conversation
+    summaries and record their outbox events.
+
+    Each row is inserted only if its users have an accepted match, checked
+    by the INSERT itself: its SELECT reads the latest committed match, so a
+    rejection made on another worker is never bypassed, whatever the
+    accepted pair cache says.
+
+    Args:
+        db: Open database session (dict cursor)
+        rows: (sender_id, receiver_id, content) of each message
+        consecutive_ids: True if a multi-row INSERT gets consecutive IDs
+
+    Returns:
+        IDs of the inserted messages, in order, None for each message whose
+        users are not matched
+    """
+    values = []
+    for position, (sender_id, receiver_id, content) in enumerate(rows):
+        stored, compressed = compress_content(content)
+        values.append((position, sender_id, receiver_id, stored, compressed, compressed is not None))
+
+    def insert_matched(chunk: List[tuple]) -> int:
+        # Rows are inserted in position order, so consecutive IDs follow it
+        db.execute(
+            f"""
+            INSERT INTO messages (sender_id, receiver_id, content, content_zip, is_compressed, is_read)
+            SELECT v.sender_id, v.receiver_id, v.content, v.content_zip, v.is_compressed, FALSE
+            FROM (
+                {" UNION ALL ".join([
+                    "SELECT %s AS position, %s AS sender_id, %s AS receiver_id, "
+                    "%s AS content, %s AS content_zip, %s AS is_compressed"
+                ] * len(chunk))}
+            ) v
+            WHERE EXISTS (
+                SELECT 1 FROM matches m
+                WHERE m.status = 'accepted'
+                AND ((m.user1_id = v.sender_id AND m.user2_id = v.receiver_id)
+                     OR (m.user1_id = v.receiver_id AND m.user2_id = v.sender_id))
+            )
+            ORDER BY v.position
+            """,
+            [value for row in chunk for value in row],
+        )
+        return db.rowcount
+
+    message_ids: List[Optional[int]] = [None] * len(rows)
+    if consecutive_ids and len(rows) > 1:
+        inserted = insert_matched(values)
+        if inserted:
+            # LAST_INSERT_ID() is the ID of the first row of the statement
+            first_id = db.lastrowid
+            if inserted == len(rows):
+                matched = None
+            else:
+                # Whole pairs are skipped: find which ones made it
+                db.execute(
+                    """
+                    SELECT DISTINCT sender_id, receiver_id FROM messages
+                    WHERE id BETWEEN %s AND %s
+                    """,
+                    (first_id, first_id + inserted - 1),
+                )
+                matched = {(row["sender_id"], row["receiver_id"]) for row in db.fetchall()}
+            next_id = first_id
+            for position, (sender_id, receiver_id, _) in enumerate(rows):
+                if matched is None or (sender_id, receiver_id) in matched:
+                    message_ids[position] = next_id
+                    next_id += 1
+    else:
+        for position, row in enumerate(values):
+            if insert_matched([row]):
+                message_ids[position] = db.lastrowid
+
+    inserted_rows = [
+        (message_id, row) for message_id, row in zip(message_ids, rows) if message_id is not None
+    ]
+    for message_id, (sender_id, receiver_id, content) in inserted_rows:
+        record_message(db, message_id, sender_id, receiver_id, content)
+
+    # Receiver notifications, created in the background
+    outbox.enqueue(db, "message.sent", (
+        {"message_id": message_id, "sender_id": sender_id, "receiver_id": receiver_id}
+        for message_id, (sender_id, receiver_id, _) in inserted_rows
+    ))
+
+    return message_ids
+
+
+class GroupCommitWriter:
+    """
+    Batches message inserts into group commits.
+
+    Senders put validated messages on a queue. A flusher thread writes them
+    in one transaction every `flush_interval_ms` or `batch_size` messages,
+    then resolves each sender's future with its message ID.
+
+    Multi-row INSERTs are used when InnoDB assigns consecutive auto-increment
+    IDs to them (innodb_autoinc_lock_mode 0 or 1). With the interleaved mode
+    (2, default on MySQL 8) rows are inserted one by one, still sharing a
+    single commit.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval_ms: int = 5):
+        """
+        Initialize the writer.
+
+        Args:
+            batch_size: Maximum messages per transaction
+            flush_interval_ms: Maximum wait before flushing a partial batch
+        """
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval_ms / 1000
+        self.__queue: "queue.Queue[Optional[Tuple[int, int, str, Future]]]" = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__thread: Optional[threading.Thread] = None
+        self.__consecutive_ids: Optional[bool] = None
+
+    @property
+    def pending(self) -> int:
+        """Get the number of messages waiting to be written."""
+        return self.__queue.qsize()
+
+    def start(self) -> None:
+        """Start the flusher thread if it is not running."""
+        with self.__lock:
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(
+                    target=self.__run, name="message-group-commit", daemon=True
+                )
+                self.__thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush the queued messages and stop the flusher thread."""
+        with self.__lock:
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join(timeout)
+
+    def submit(self, sender_id: int, receiver_id: int, content: str) -> Future:
+        """
+        Queue a validated message.
+
+        Args:
+            sender_id: Sender's ID
+            receiver_id: Receiver's ID
+            content: Message content
+
+        Returns:
+            Future resolved with the message ID once its batch is committed
+        """
+        self.start()
+        future = Future()
+        self.__queue.put((sender_id, receiver_id, content, future))
+        return future
+
+    def __run(self) -> None:
+        """Flusher loop."""
+        stopping = False
+        while not stopping:
+            item = self.__queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.__flush_interval
+            while len(batch) < self.__batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.__queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self.__flush(batch)
+
+        # Drain what was queued before the stop request
+        leftover = []
+        while True:
+            try:
+                item = self.__queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.__batch_size):
+            self.__flush(leftover[start:start + self.__batch_size])
+
+    def __flush(self, batch: List[Tuple[int, int, str, Future]]) -> None:
+        """
+        Write a batch in one transaction and resolve its futures.
+        Senders were authorized from the cache; messages whose match was
+        rejected meanwhile are not inserted and fail with a 403.
+        """
+        try:
+            with DatabaseSession(dict_cursor=True) as db:
+                if self.__consecutive_ids is None:
+                    db.execute("SELECT @@innodb_autoinc_lock_mode AS autoinc_lock_mode")
+                    self.__consecutive_ids = int(db.fetchone()["autoinc_lock_mode"]) < 2
+                message_ids = _insert_messages(db, [item[:3] for item in batch], self.__consecutive_ids)
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one by one so a single bad row does not fail the batch
+                for item in batch:
+                    self.__flush([item])
+                return
+            print(f"Error writing message: {e}")
+            batch[0][3].set_exception(e)
+            return
+
+        for item, message_id in zip(batch, message_ids):
+            if message_id is None:
+                accepted_pairs.remove([item[:2]])
+                item[3].set_exception(HTTPException(status_code=403, detail="You can only message matched users"))
+            else:
+                item[3].set_result(message_id)
+
+
+# Global writer instance (per worker process), used when MESSAGE_WRITE_MODE
+# is "group" or "async"
+message_writer = GroupCommitWriter(
+    batch_size=settings.MESSAGE_BATCH_SIZE,
+    flush_interval_ms=settings.MESSAGE_FLUSH_INTERVAL_MS,
+)
+
+
+def send_message(sender_id: int, receiver_id: int, content: str) -> Dict[str, Any]:
+    """
+    Validate and store a message.
+    Shared by the REST endpoint and the WebSocket.
+
+    The write path depends on MESSAGE_WRITE_MODE:
+    - "direct": one transaction per message
+    - "group": group commit, returns once the message's batch is committed
+      (without an ID, like "async", if that takes more than
+      MESSAGE_COMMIT_TIMEOUT_SECONDS)
+    - "async": group commit, returns as soon as the message is queued. The
+      message has no ID yet and is lost if the worker stops abruptly, its
+      batch fails or the match was rejected on another worker meanwhile.
+
+    Args:
+        sender_id: Sender's ID
+        receiver_id: Receiver's ID
+        content: Message content
+
+    Returns:
+        The stored message, with a None ID if it is queued but not committed yet
+
+    Raises:
+        HTTPException: 403 if the users are not matched
+    """
+    mode = settings.MESSAGE_WRITE_MODE
+
+    if mode == "direct":
+        with DatabaseSession(dict_cursor=True) as db:
+            ensure_matched(db, sender_id, receiver_id)
+            message_id = _insert_messages(db, [(sender_id, receiver_id, content)], False)[0]
+        if message_id is None:
+            # Rejected on another worker since the cache entry was loaded
+            accepted_pairs.remove([(sender_id, receiver_id)])
+            raise HTTPException(status_code=403, detail="You can only message matched users")
+        return _message_dict(message_id, sender_id, receiver_id, content)
+
+    ensure_matched(None, sender_id, receiver_id)
+    future = message_writer.submit(sender_id, receiver_id, content)
+
+    if mode == "async":
+        return _message_dict(None, sender_id, receiver_id, content)
+
+    try:
+        message_id = future.result(timeout=settings.MESSAGE_COMMIT_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        # Still queued and may commit later: answer like "async" rather than
+        # fail, so that the client does not send it again
+        message_id = None
+    return _message_dict(message_id, sender_id, receiver_id, content)
@@ -0,0 +1,620 @@
+"""
+Notifications service.
+Unread counters, creation (including from outbox events), bulk creation and
+retention of notifications.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from ..database import DatabaseSession
+from . import outbox
+from .realtime import realtime_hub
+
+
+class UnreadCounters:
+    """
+    Per-user unread notification counters.
+
+    The source of truth is the notification_counters table, adjusted in the
+    same transaction as the notification change. A bounded in-memory cache
+    serves reads; entries expire after a TTL so changes made on other
+    workers are picked up.
+    """
+
+    def __init__(self, max_size: int = 100000, ttl_seconds: int = 30):
+        """
+        Initialize the counters.
+
+        Args:
+            max_size: Maximum number of cached users
+            ttl_seconds: Seconds before a cached count is re-read
+        """
+        self.__max_size = max_size
+        self.__ttl = ttl_seconds
+        self.__lock = threading.Lock()
+        self.__cache: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+
+    def get(self, user_id: int, db: Optional[DatabaseSession] = None) -> int:
+        """
+        Get a user's unread count.
+
+        Args:
+            user_id: The user's ID
+            db: Open database session (dict cursor) used on cache misses,
+                or None to open one
+
+        Returns:
+            Number of unread notifications
+        """
+        with self.__lock:
+            entry = self.__cache.get(user_id)
+            if entry is not None and entry[1] >= time.monotonic():
+                self.__cache.move_to_end(user_id)
+                return entry[0]
+
+        if db is None:
+            with DatabaseSession(dict_cursor=True) as own_db:
+                count = self.__read(own_db, user_id)
+        else:
+            count = self.__read(db, user_id)
+
+        self.__store(user_id, count)
+        return count
+
+    def adjust(self, db: DatabaseSession, user_id: int, delta: int) -> int:
+        """
+        Add a delta to a user's unread count.
+        Must run in the transaction that changed the notifications.
+
+        Args:
+            db: Open database session (dict cursor)
+            user_id: The user's ID
+            delta: Change of the unread count
+
+        Returns:
+            The new unread count
+        """
+        db.execute(
+            """
+            INSERT INTO notification_counters (user_id, unread_count)
+            VALUES (%s, GREATEST(%s, 0))
+            ON DUPLICATE KEY UPDATE unread_count = GREATEST(unread_count + %s, 0)
+            """,
+            (user_id, delta, delta),
+        )
+        # The row stays locked by this transaction, so this reads our update
+        count = self.__read(db, user_id)
+        self.__store(user_id, count)
+        return count
+
+    def reset(self, db: DatabaseSession, user_id: int) -> int:
+        """
+        Set a user's unread count to zero.
+
+        Args:
+            db: Open database session
+            user_id: The user's ID
+
+        Returns:
+            The new unread count (0)
+        """
+        db.execute(
+            """
+            INSERT INTO notification_counters (user_id, unread_count) VALUES (%s, 0)
+            ON DUPLICATE KEY UPDATE unread_count = 0
+            """,
+            (user_id,),
+        )
+        self.__store(user_id, 0)
+        return 0
+
+    def reconcile(self, chunk_size: int = 1000) -> int:
+        """
+        Recompute every counter from the notifications table.
+        Walks users in keyset-paginated chunks, one short transaction each.
+
+        Each chunk recounts and writes in a single INSERT ... SELECT run in
+        REPEATABLE READ, where InnoDB reads the notifications with shared
+        next-key locks: a concurrent notification change and its adjust()
+        either commit before the count or wait for the chunk to commit, so
+        no delta is lost. Cached counts of the chunk are dropped once it is
+        committed.
+
+        Args:
+            chunk_size: Users recomputed per transaction
+
+        Returns:
+            Number of users reconciled
+        """
+        last_id = 0
+        reconciled = 0
+
+        while True:
+            with DatabaseSession(dict_cursor=True) as db:
+                # Applies to this session's transaction, which the next statement starts
+                db.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                db.execute(
+                    "SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                    (last_id, chunk_size),
+                )
+                user_ids = [row["id"] for row in db.fetchall()]
+                if not user_ids:
+                    break
+
+                db.execute(
+                    """
+                    INSERT INTO notification_counters (user_id, unread_count)
+                    SELECT u.id, (
+                        SELECT COUNT(*) FROM notifications n
+                        WHERE n.user_id = u.id AND n.is_read = FALSE
+                    )
+                    FROM users u
+                    WHERE u.id BETWEEN %s AND %s
+                    ON DUPLICATE KEY UPDATE unread_count = VALUES(unread_count)
+                    """,
+                    (user_ids[0], user_ids[-1]),
+                )
+
+            self.forget(user_ids)
+            reconciled += len(user_ids)
+            last_id = user_ids[-1]
+            if len(user_ids) < chunk_size:
+                break
+
+        return reconciled
+
+    def forget(self, user_ids: Iterable[int]) -> None:
+        """Drop the cached counts of some users."""
+        with self.__lock:
+            for user_id in user_ids:
+                self.__cache.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Remove every cached count."""
+        with self.__lock:
+            self.__cache.clear()
+
+    def __read(self, db: DatabaseSession, user_id: int) -> int:
+        """Read a counter, creating it from the notifications if missing."""
+        db.execute(
+            "SELECT unread_count FROM notification_counters WHERE user_id = %s",
+            (user_id,),
+        )
+        row = db.fetchone()
+        if row:
+            return row["unread_count"]
+
+        db.execute(
+            """
+            INSERT INTO notification_counters (user_id, unread_count)
+            SELECT %s, COUNT(*) FROM notifications WHERE user_id = %s AND is_read = FALSE
+            ON DUPLICATE KEY UPDATE unread_count = unread_count
+            """,
+            (user_id, user_id),
+        )
+        db.execute(
+            "SELECT unread_count FROM notification_counters WHERE user_id = %s",
+            (user_id,),
+        )
+        return db.fetchone()["unread_count"]
+
+    def __store(self, user_id: int, count: int) -> None:
+        """Cache a user's count."""
+        with self.__lock:
+            self.__cache[user_id] = (count, time.monotonic() + self.__ttl)
+            self.__cache.move_to_end(user_id)
+            while len(self.__cache) > self.__max_size:
+                self.__cache.popitem(last=False)
+
+
+# Global counters instance (per worker process)
+unread_counters = UnreadCounters(
+    max_size=settings.NOTIFICATION_COUNT_CACHE_SIZE,
+    ttl_seconds=settings.NOTIFICATION_COUNT_CACHE_TTL_SECONDS,
+)
+
+
+async def reconcile_unread_counters_task():
+    """
+    Background task correcting drift of the unread counters periodically.
+    """
+    while True:
+        await asyncio.sleep(settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS)
+
+        try:
+            count = await asyncio.to_thread(unread_counters.reconcile)
+            print(f"Unread notification counters reconciled: {count} users")
+        except Exception as e:
+            print(f"Error reconciling unread notification counters: {e}")
+
+
+def iter_user_ids(chunk_size: int = 1000) -> Iterator[List[int]]:
+    """
+    Stream every user ID in keyset-paginated chunks.
+
+    Args:
+        chunk_size: IDs per chunk
+
+    Yields:
+        Lists of user IDs, in ascending order
+    """
+    last_id = 0
+    while True:
+        with DatabaseSession(dict_cursor=True) as db:
+            db.execute(
+                "SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, chunk_size),
+            )
+            user_ids = [row["id"] for row in db.fetchall()]
+
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+
+def _chunks(user_ids: Iterable[int], chunk_size: int) -> Iterator[List[int]]:
+    """Group a stream of IDs into lists of chunk_size."""
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def create_notifications_bulk(
+    notification_type: str,
+    title: str,
+    message: str,
+    recipients: Optional[Iterable[int]] = None,
+    from_user_id: Optional[int] = None,
+    data: Optional[dict] = None,
+    chunk_size: int = 1000,
+    max_rows_per_second: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Create the same notification for many users.
+
+    Recipients are consumed as a stream and written in chunks: one
+    transaction per chunk with a multi-row INSERT of the shared payload
+    and a multi-row upsert of the unread counters. Throughput is capped at
+    max_rows_per_second to avoid saturating the primary. Bulk notifications
+    are not pushed to open streams; they show up on the next fetch.
+
+    Args:
+        notification_type: Type of notification
+        title: Notification title
+        message: Notification message
+        recipients: User IDs to notify (all users if None)
+        from_user_id: Optional user who triggered the notification
+        data: Optional JSON data
+        chunk_size: Rows per transaction
+        max_rows_per_second: Throttle (NOTIFICATION_BULK_ROWS_PER_SECOND if None, 0 disables)
+        progress: Optional callback called with the number of notifications created so far
+
+    Returns:
+        Number of notifications created
+    """
+    if max_rows_per_second is None:
+        max_rows_per_second = settings.NOTIFICATION_BULK_ROWS_PER_SECOND
+
+    data_json = json.dumps(data) if data else None
+    if recipients is None:
+        chunks = iter_user_ids(chunk_size)
+    else:
+        chunks = _chunks(recipients, chunk_size)
+
+    created = 0
+    for chunk in chunks:
+        started = time.monotonic()
+
+        with DatabaseSession() as db:
+            db.execute(
+                f"""
+                INSERT INTO notifications (user_id, from_user_id, type, title, message, data)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))}
+                """,
+                [value for user_id in chunk
+                 for value in (user_id, from_user_id, notification_type, title, message, data_json)],
+            )
+            db.execute(
+                f"""
+                INSERT INTO notification_counters (user_id, unread_count)
+                VALUES {", ".join(["(%s, 1)"] * len(chunk))}
+                ON DUPLICATE KEY UPDATE unread_count = unread_count + 1
+                """,
+                chunk,
+            )
+
+        unread_counters.forget(chunk)
+        created += len(chunk)
+        if progress:
+            progress(created)
+
+        # Throttle: each chunk takes at least len(chunk) / rate seconds
+        if max_rows_per_second:
+            remaining = len(chunk) / max_rows_per_second - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    return created
+
+
+def _store_notification(
+    db: DatabaseSession,
+    user_id: int,
+    notification_type: str,
+    title: str,
+    message: str,
+    from_user_id: Optional[int] = None,
+    data: Optional[dict] = None,
+) -> dict:
+    """
+    Insert or coalesce a notification in an open transaction.
+
+    Args:
+        db: Open database session (dict cursor)
+        (other arguments: see create_notification)
+
+    Returns:
+        The event to push to the user's streams once committed
+    """
+    window = settings.NOTIFICATION_COALESCE_WINDOW_SECONDS
+    existing = None
+    if from_user_id is not None and window > 0:
+        db.execute("""
+            SELECT id, data, created_at, NOW() as now FROM notifications
+            WHERE user_id = %s AND is_read = FALSE AND type = %s AND from_user_id = %s
+                AND created_at >= NOW() - INTERVAL %s SECOND
+            ORDER BY id DESC
+            LIMIT 1
+            FOR UPDATE
+        """, (user_id, notification_type, from_user_id, window))
+        existing = db.fetchone()
+
+    previous = {}
+    if existing:
+        try:
+            previous = json.loads(existing["data"]) if existing["data"] else {}
+        except (json.JSONDecodeError, TypeError):
+            previous = {}
+
+        # The window runs from the first notification of the group, so a
+        # steady stream of activity cannot extend it forever
+        try:
+            first_at = datetime.fromisoformat(previous["first_at"])
+        except (KeyError, TypeError, ValueError):
+            first_at = existing["created_at"]
+        if (existing["now"] - first_at).total_seconds() > window:
+            existing = None
+
+    if existing:
+        # The merged notification is a new row (new ID, current time) so that
+        # ID watermarks (sync, SSE replay) and the (created_at, id) keyset see
+        # it; data["replaces"] tells clients which notification it supersedes
+        data = {
+            **(data or {}),
+            "count": previous.get("count", 1) + 1,
+            "first_at": first_at.isoformat(),
+            "replaces": existing["id"],
+        }
+
+        db.execute("DELETE FROM notifications WHERE id = %s", (existing["id"],))
+        db.execute("""
+            INSERT INTO notifications (user_id, from_user_id, type, title, message, data)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (user_id, from_user_id, notification_type, title, message, json.dumps(data)))
+        notification_id = db.lastrowid
+
+        # One unread notification replaces another
+        unread_count = unread_counters.get(user_id, db)
+    else:
+        data_json = json.dumps(data) if data else None
+
+        db.execute("""
+            INSERT INTO notifications (user_id, from_user_id, type, title, message, data)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (user_id, from_user_id, notification_type, title, message, data_json))
+        notification_id = db.lastrowid
+
+        unread_count = unread_counters.adjust(db, user_id, 1)
+
+    return {
+        "coalesced": bool(existing),
+        "type": "notification",
+        "notification": {
+            "id": notification_id,
+            "from_user_id": from_user_id,
+            "type": notification_type,
+            "title": title,
+            "message": message,
+            "data": data,
+            "is_read": False,
+            "created_at": datetime.now().replace(microsecond=0).isoformat(),
+        },
+        "unread_count": unread_count,
+    }
+
+
+def create_notification(
+    user_id: int,
+    notification_type: str,
+    title: str,
+    message: str,
+    from_user_id: Optional[int] = None,
+    data: Optional[dict] = None,
+) -> int:
+    """
+    Create a new notification.
+    Pushes it, with the new unread count, to the user's open streams.
+
+    If the user has an unread notification of the same type from the same
+    user, in a group started less than NOTIFICATION_COALESCE_WINDOW_SECONDS
+    ago, that one is replaced by the new notification: data["count"] counts
+    the occurrences and data["replaces"] holds the ID of the replaced one.
+
+    Request handlers should not call this inline: they record an outbox
+    event in their own transaction (services/outbox.py) and the handlers
+    below create the notification in the background. They are registered
+    when this module is imported, which the application does at startup.
+
+    Args:
+        user_id: User to notify
+        notification_type: Type of notification (match, message, system, etc.)
+        title: Notification title
+        message: Notification message
+        from_user_id: Optional user who triggered the notification
+        data: Optional JSON data
+
+    Returns:
+        The notification ID
+    """
+    with DatabaseSession(dict_cursor=True) as db:
+        event = _store_notification(
+            db, user_id, notification_type, title, message, from_user_id, data
+        )
+
+    realtime_hub.publish_threadsafe(user_id, event)
+    return event["notification"]["id"]
+
+
+def _notify(db: DatabaseSession, preference: str, user_id: int, *args, **kwargs):
+    """
+    Store a notification from an outbox handler, if the user wants it.
+
+    Args:
+        db: Open database session (dict cursor) of the handler
+        preference: user_profiles column enabling this kind of notification
+        user_id: User to notify
+        *args, **kwargs: Passed to _store_notification
+
+    Returns:
+        Callable pushing the notification once committed, or None
+    """
+    db.execute(f"SELECT {preference} AS enabled FROM user_profiles WHERE user_id = %s", (user_id,))
+    row = db.fetchone()
+    if row is not None and not row["enabled"]:
+        return None
+
+    event = _store_notification(db, user_id, *args, **kwargs)
+    return lambda: realtime_hub.publish_threadsafe(user_id, event)
+
+
+def _username(db: DatabaseSession, user_id: int) -> str:
+    """Get a user's username."""
+    db.execute("SELECT username FROM users WHERE id = %s", (user_id,))
+    row = db.fetchone()
+    return row["username"] if row else "?"
+
+
+@outbox.handler("match.accepted")
+def _on_match_accepted(db: DatabaseSession, payload: dict):
+    """Notify the other player that a match was accepted."""
+    accepted_by = payload["accepted_by"]
+    user_id = payload["user_ids"][0] if payload["user_ids"][1] == accepted_by else payload["user_ids"][1]
+
+    return _notify(
+        db, "notify_matches", user_id, "match_accepted",
+        "Match accepté", f"{_username(db, accepted_by)} a accepté votre match",
+        from_user_id=accepted_by, data={"match_id": payload["match_id"]},
+    )
+
+
+@outbox.handler("message.sent")
+def _on_message_sent(db: DatabaseSession, payload: dict):
+    """Notify the receiver of a new message (coalesced per sender)."""
+    sender_id = payload["sender_id"]
+
+    return _notify(
+        db, "notify_messages", payload["receiver_id"], "message_new",
+        "Nouveau message", f"{_username(db, sender_id)} vous a envoyé un message",
+        from_user_id=sender_id, data={"message_id": payload["message_id"]},
+    )
+
+
+@outbox.handler("account.inactivity_warning")
+def _on_inactivity_warning(db: DatabaseSession, payload: dict):
+    """Warn a user that their account will be deactivated (once per inactivity period)."""
+    user_id = payload["user_id"]
+
+    db.execute("""
+        SELECT 1 FROM notifications n
+        JOIN users u ON u.id = n.user_id
+        WHERE n.user_id = %s AND n.type = 'account_inactivity'
+            AND n.created_at >= COALESCE(u.last_activity_at, u.created_at)
+        LIMIT 1
+    """, (user_id,))
+    if db.fetchone():
+        return None
+
+    return _notify(
+        db, "notify_system", user_id, "account_inactivity",
+        "Compte inactif",
+        f"Sans connexion d'ici {payload['days_left']} jours, votre compte sera désactivé.",
+        data={"days_inactive": payload["days_inactive"]},
+    )
+
+
+def purge_read_notifications(max_age_days: int, batch_size: int = 500, pause_seconds: float = 0.1) -> int:
+    """
+    Delete read notifications older than an age limit.
+
+    Deletes in small batches along the (is_read, read_at) index, one short
+    transaction each, pausing between batches to limit the load.
+
+    Args:
+        max_age_days: Age (since being read) after which a notification is deleted
+        batch_size: Rows deleted per transaction
+        pause_seconds: Pause between batches
+
+    Returns:
+        Number of notifications deleted
+    """
+    deleted = 0
+    while True:
+        with DatabaseSession() as db:
+            db.execute(
+                """
+                DELETE FROM notifications
+                WHERE is_read = TRUE AND read_at < NOW() - INTERVAL %s DAY
+                ORDER BY read_at
+                LIMIT %s
+                """,
+                (max_age_days, batch_size),
+            )
+            count = db.rowcount
+
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause_seconds)
+
+
+async def purge_read_notifications_task():
+    """
+    Background task applying the notifications retention policy daily.
+    """
+    while True:
+        try:
+            count = await asyncio.to_thread(
+                purge_read_notifications,
+                settings.NOTIFICATION_RETENTION_DAYS,
+                settings.NOTIFICATION_PURGE_BATCH_SIZE,
+            )
+            if count:
+                print(f"Deleted {count} old read notifications")
+        except Exception as e:
+            print(f"Error deleting old notifications: {e}")
+
+        await asyncio.sleep(86400)
@@ -0,0 +1,254 @@
+"""
+Outbox service.
+Side effects of domain changes (notifications, pushes) recorded in the same
+transaction as the change and dispatched in the background.
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..config import settings
+from ..database import DatabaseSession
+
+# Handler of an event type: runs in the transaction marking the event as
+# dispatched and may return a callable to run once it is committed
+Handler = Callable[[DatabaseSession, Dict[str, Any]], Optional[Callable[[], None]]]
+
+_handlers: Dict[str, Handler] = {}
+
+
+def handler(event_type: str) -> Callable[[Handler], Handler]:
+    """
+    Register the handler of an event type.
+
+    Args:
+        event_type: Event type, e.g. "match.accepted"
+
+    Returns:
+        Decorator registering the function
+    """
+    def register(func: Handler) -> Handler:
+        _handlers[event_type] = func
+        return func
+    return register
+
+
+def enqueue(db, event_type: str, payloads: Iterable[Dict[str, Any]]) -> int:
+    """
+    Record events in the outbox.
+    Must run in the transaction of the domain change, so that events exist
+    if and only if the change is committed.
+
+    Args:
+        db: Open database session or cursor
+        event_type: Type of the events
+        payloads: JSON-serializable payload of each event
+
+    Returns:
+        Number of events recorded
+    """
+    values = [json.dumps(payload, default=str) for payload in payloads]
+    if not values:
+        return 0
+
+    db.execute(
+        f"""
+        INSERT INTO outbox (event_type, payload)
+        VALUES {", ".join(["(%s, %s)"] * len(values))}
+        """,
+        [value for payload in values for value in (event_type, payload)],
+    )
+    return len(values)
+
+
+class OutboxDispatcher:
+    """
+    Drains the outbox in batches with at-least-once delivery.
+
+    A batch is claimed with a lease (SKIP LOCKED, so several workers can
+    dispatch concurrently). Each event then runs in its own transaction,
+    which also marks it dispatched: database effects of a handler are
+    applied exactly once, and an event whose lease expired while another
+    worker handled it is skipped. Callables returned by handlers (pushes to
+    open connections) run after commit and are best effort; clients catch
+    up from the database on reconnection.
+
+    Failed events are retried with an exponential backoff, up to
+    `max_attempts`; abandoned events are purged like dispatched ones.
+    """
+
+    def __init__(self, batch_size: int = 100, lease_seconds: int = 60, max_attempts: int = 10):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            batch_size: Events claimed per batch
+            lease_seconds: Seconds before a claimed event may be claimed again
+            max_attempts: Attempts before an event is left undispatched
+        """
+        self.__batch_size = batch_size
+        self.__lease_seconds = lease_seconds
+        self.__max_attempts = max_attempts
+
+    @property
+    def batch_size(self) -> int:
+        """Get the number of events claimed per batch."""
+        return self.__batch_size
+
+    def dispatch_batch(self) -> int:
+        """
+        Claim and dispatch one batch of events.
+
+        Returns:
+            Number of events claimed
+        """
+        events = self.__claim()
+
+        for event in events:
+            try:
+                after_commit = self.__dispatch(event)
+            except Exception as e:
+                self.__fail(event, e)
+                continue
+
+            if after_commit:
+                try:
+                    after_commit()
+                except Exception as e:
+                    print(f"Error after dispatching outbox event {event['id']}: {e}")
+
+        return len(events)
+
+    def purge(self, max_age_hours: int, batch_size: int = 1000) -> int:
+        """
+        Delete dispatched events older than an age limit, and events that
+        exhausted their attempts longer than that ago.
+
+        Args:
+            max_age_hours: Age (since dispatch or last attempt) after which
+                an event is deleted
+            batch_size: Maximum rows deleted of each kind
+
+        Returns:
+            Number of events deleted
+        """
+        with DatabaseSession() as db:
+            db.execute(
+                """
+                DELETE FROM outbox
+                WHERE dispatched_at < NOW(6) - INTERVAL %s HOUR
+                ORDER BY dispatched_at
+                LIMIT %s
+                """,
+                (max_age_hours, batch_size),
+            )
+            deleted = db.rowcount
+
+            # Abandoned events (last_error tells why) are kept as long as
+            # dispatched ones, then dropped
+            db.execute(
+                """
+                DELETE FROM outbox
+                WHERE dispatched_at IS NULL AND attempts >= %s
+                AND available_at < NOW(6) - INTERVAL %s HOUR
+                ORDER BY available_at
+                LIMIT %s
+                """,
+                (self.__max_attempts, max_age_hours, batch_size),
+            )
+            if db.rowcount:
+                print(f"Deleted {db.rowcount} outbox events abandoned after {self.__max_attempts} attempts")
+
+            return deleted + db.rowcount
+
+    def __claim(self) -> List[Dict[str, Any]]:
+        """Lease the next batch of pending events."""
+        with DatabaseSession(dict_cursor=True) as db:
+            db.execute(
+                """
+                SELECT id, event_type, payload, attempts FROM outbox
+                WHERE dispatched_at IS NULL AND available_at <= NOW(6) AND attempts < %s
+                ORDER BY available_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (self.__max_attempts, self.__batch_size),
+            )
+            events = list(db.fetchall())
+
+            if events:
+                db.execute(
+                    f"""
+                    UPDATE outbox
+                    SET attempts = attempts + 1, available_at = NOW(6) + INTERVAL %s SECOND
+                    WHERE id IN ({",".join(["%s"] * len(events))})
+                    """,
+                    [self.__lease_seconds] + [event["id"] for event in events],
+                )
+
+        return events
+
+    def __dispatch(self, event: Dict[str, Any]) -> Optional[Callable[[], None]]:
+        """Run an event's handler in the transaction marking it dispatched."""
+        func = _handlers.get(event["event_type"])
+        if func is None:
+            raise LookupError(f"No handler for outbox event type {event['event_type']!r}")
+
+        with DatabaseSession(dict_cursor=True) as db:
+            db.execute(
+                "UPDATE outbox SET dispatched_at = NOW(6) WHERE id = %s AND dispatched_at IS NULL",
+                (event["id"],),
+            )
+            if db.rowcount == 0:
+                # Already dispatched by another worker
+                return None
+            return func(db, json.loads(event["payload"]))
+
+    def __fail(self, event: Dict[str, Any], error: Exception) -> None:
+        """Schedule a failed event for retry."""
+        delay = min(2 ** (event["attempts"] + 1), 3600)
+        print(f"Error dispatching outbox event {event['id']} ({event['event_type']}): {error}")
+
+        with DatabaseSession() as db:
+            db.execute(
+                """
+                UPDATE outbox
+                SET available_at = NOW(6) + INTERVAL %s SECOND, last_error = %s
+                WHERE id = %s AND dispatched_at IS NULL
+                """,
+                (delay, str(error)[:500], event["id"]),
+            )
+
+
+# Global dispatcher instance (per worker process)
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+)
+
+
+async def dispatch_outbox_task():
+    """
+    Background task draining the outbox.
+    Dispatches batches back to back while the outbox is full, otherwise
+    polls every OUTBOX_POLL_INTERVAL_MS. Dispatched and abandoned events
+    are deleted after OUTBOX_RETENTION_HOURS.
+    """
+    idle_polls = 0
+    while True:
+        claimed = 0
+        try:
+            claimed = await asyncio.to_thread(outbox_dispatcher.dispatch_batch)
+
+            # Purge about once a minute of idle polling
+            idle_polls = idle_polls + 1 if claimed == 0 else idle_polls
+            if idle_polls * settings.OUTBOX_POLL_INTERVAL_MS >= 60000:
+                idle_polls = 0
+                await asyncio.to_thread(outbox_dispatcher.purge, settings.OUTBOX_RETENTION_HOURS)
+        except Exception as e:
+            print(f"Error dispatching outbox: {e}")
+
+        if claimed < outbox_dispatcher.batch_size:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_MS / 1000)
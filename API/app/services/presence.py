@@ -0,0 +1,187 @@
+"""
+Presence service.
+Keeps an in-memory registry of players currently online, indexed by game.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from ..config import settings
+
+
+class PresenceRegistry:
+    """
+    In-memory "looking to play now" registry.
+
+    Each online user holds an entry with the games they play, their region
+    and an expiry time. Entries are refreshed by heartbeats and silently
+    dropped once their TTL has elapsed. Lookups never touch the database.
+    """
+
+    def __init__(self, ttl_seconds: int = 120):
+        """
+        Initialize the registry.
+
+        Args:
+            ttl_seconds: Seconds an entry stays online without a heartbeat
+        """
+        self.__ttl = ttl_seconds
+        self.__lock = threading.Lock()
+        self.__entries: Dict[int, Dict] = {}
+        self.__by_game: Dict[int, Set[int]] = {}
+
+    @property
+    def ttl_seconds(self) -> int:
+        """Get heartbeat TTL in seconds."""
+        return self.__ttl
+
+    def heartbeat(
+        self,
+        user_id: int,
+        game_ids: Iterable[int],
+        region: Optional[str] = None,
+    ) -> None:
+        """
+        Register or refresh a user with their games and region.
+
+        Args:
+            user_id: The user's ID
+            game_ids: Games the user is available to play
+            region: The user's region
+        """
+        game_ids = set(game_ids)
+        with self.__lock:
+            previous = self.__entries.get(user_id)
+            if previous:
+                for game_id in previous["game_ids"] - game_ids:
+                    self.__discard_from_game(game_id, user_id)
+
+            self.__entries[user_id] = {
+                "game_ids": game_ids,
+                "region": region.lower() if region else None,
+                "expires_at": time.monotonic() + self.__ttl,
+            }
+            for game_id in game_ids:
+                self.__by_game.setdefault(game_id, set()).add(user_id)
+
+    def touch(self, user_id: int) -> bool:
+        """
+        Extend the TTL of an already registered user.
+
+        Args:
+            user_id: The user's ID
+
+        Returns:
+            True if the user was online and has been refreshed
+        """
+        with self.__lock:
+            entry = self.__entries.get(user_id)
+            if not entry:
+                return False
+            now = time.monotonic()
+            if entry["expires_at"] < now:
+                self.__remove(user_id)
+                return False
+            entry["expires_at"] = now + self.__ttl
+            return True
+
+    def leave(self, user_id: int) -> None:
+        """Remove a user from the registry."""
+        with self.__lock:
+            self.__remove(user_id)
+
+    def is_online(self, user_id: int) -> bool:
+        """Check whether a user currently has a live heartbeat."""
+        with self.__lock:
+            entry = self.__entries.get(user_id)
+            return bool(entry) and entry["expires_at"] >= time.monotonic()
+
+    def online_players(
+        self,
+        game_id: int,
+        region: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Get users currently online for a game.
+
+        Args:
+            game_id: The game to look up
+            region: Optional region filter (case-insensitive)
+            limit: Optional maximum number of users to return
+
+        Returns:
+            List of online user IDs
+        """
+        region = region.lower() if region else None
+        now = time.monotonic()
+        result = []
+        with self.__lock:
+            for user_id in list(self.__by_game.get(game_id, ())):
+                entry = self.__entries[user_id]
+                if entry["expires_at"] < now:
+                    self.__remove(user_id)
+                    continue
+                if region and entry["region"] != region:
+                    continue
+                result.append(user_id)
+                if limit and len(result) >= limit:
+                    break
+        return result
+
+    def online_for_games(self, game_ids: Iterable[int]) -> Set[int]:
+        """
+        Get users online for any of the given games.
+
+        Args:
+            game_ids: Games to look up
+
+        Returns:
+            Set of online user IDs
+        """
+        online = set()
+        for game_id in game_ids:
+            online.update(self.online_players(game_id))
+        return online
+
+    def count(self, game_id: Optional[int] = None) -> int:
+        """Count online users, optionally for a single game."""
+        if game_id is not None:
+            return len(self.online_players(game_id))
+        self.prune()
+        with self.__lock:
+            return len(self.__entries)
+
+    def prune(self) -> int:
+        """
+        Drop every expired entry.
+
+        Returns:
+            Number of entries removed
+        """
+        now = time.monotonic()
+        with self.__lock:
+            expired = [uid for uid, e in self.__entries.items() if e["expires_at"] < now]
+            for user_id in expired:
+                self.__remove(user_id)
+        return len(expired)
+
+    def __remove(self, user_id: int) -> None:
+        """Remove an entry and its game index references. Caller holds the lock."""
+        entry = self.__entries.pop(user_id, None)
+        if entry:
+            for game_id in entry["game_ids"]:
+                self.__discard_from_game(game_id, user_id)
+
+    def __discard_from_game(self, game_id: int, user_id: int) -> None:
+        """Remove a user from a game bucket. Caller holds the lock."""
+        users = self.__by_game.get(game_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.__by_game[game_id]
+
+
+# Global registry instance (per worker process)
+presence_registry = PresenceRegistry(ttl_seconds=settings.PRESENCE_TTL_SECONDS)
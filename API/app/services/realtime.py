@@ -0,0 +1,238 @@
+"""
+Realtime service.
+In-process pub/sub hub pushing events to users' open connections.
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, Dict, Optional, Set
+
+from ..config import settings
+
+# Callback used by backends to hand an event to the local hub
+Deliver = Callable[[int, Dict[str, Any]], None]
+
+
+class LocalBackend:
+    """
+    Single-process backend.
+    Events are delivered directly to this worker's hub. Used in development,
+    in tests, and when the API runs with a single worker.
+    """
+
+    def __init__(self):
+        self.__deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        """Attach the backend to the hub."""
+        self.__deliver = deliver
+
+    async def stop(self) -> None:
+        """Detach the backend."""
+        self.__deliver = None
+
+    async def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """Deliver an event to the local hub."""
+        if self.__deliver:
+            self.__deliver(user_id, event)
+
+
+class RedisBackend:
+    """
+    Cross-worker backend based on Redis pub/sub.
+    Every worker publishes to one channel and delivers the events it
+    receives to its own connections. Requires the `redis` package.
+    """
+
+    def __init__(self, url: str, channel: str = "gameconnect:realtime"):
+        """
+        Initialize the backend.
+
+        Args:
+            url: Redis connection URL
+            channel: Pub/sub channel shared by all workers
+        """
+        self.__url = url
+        self.__channel = channel
+        self.__redis = None
+        self.__listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        """Connect to Redis and start listening for events."""
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("REALTIME_BACKEND=redis requires the 'redis' package") from e
+
+        self.__redis = aioredis.from_url(self.__url)
+        # Subscribe before returning so that startup fails on a bad URL
+        pubsub = self.__redis.pubsub()
+        await pubsub.subscribe(self.__channel)
+        self.__listener = asyncio.create_task(self.__listen(pubsub, deliver))
+
+    async def __listen(self, pubsub, deliver: Deliver) -> None:
+        """
+        Deliver received events, resubscribing with an exponential backoff
+        when the connection drops. Events published while disconnected are
+        lost; clients catch up from the database on reconnection.
+        """
+        delay = 1
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self.__redis.pubsub()
+                    await pubsub.subscribe(self.__channel)
+                    print("Realtime backend resubscribed to Redis")
+                    delay = 1
+
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        payload = json.loads(item["data"])
+                        deliver(payload["user_id"], payload["event"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                raise ConnectionError("subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Realtime backend lost its Redis subscription, retrying in {delay}s: {e}")
+
+            if pubsub is not None:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+                pubsub = None
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def stop(self) -> None:
+        """Stop listening and close the connection."""
+        if self.__listener:
+            self.__listener.cancel()
+            try:
+                await self.__listener
+            except asyncio.CancelledError:
+                pass
+        if self.__redis:
+            await self.__redis.close()
+
+    async def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """Publish an event to every worker."""
+        await self.__redis.publish(
+            self.__channel,
+            json.dumps({"user_id": user_id, "event": event}, default=str),
+        )
+
+
+class RealtimeHub:
+    """
+    Fan-out hub between publishers and users' open connections.
+
+    Each connection (WebSocket, SSE stream...) subscribes with a bounded
+    queue. When a queue is full the oldest event is dropped, so a slow
+    client can never block publishers.
+    """
+
+    def __init__(self, backend, queue_size: int = 100):
+        """
+        Initialize the hub.
+
+        Args:
+            backend: Pub/sub backend (LocalBackend or RedisBackend)
+            queue_size: Maximum pending events per connection
+        """
+        self.__backend = backend
+        self.__queue_size = queue_size
+        self.__subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def connection_count(self) -> int:
+        """Get the number of open subscriptions on this worker."""
+        return sum(len(queues) for queues in self.__subscribers.values())
+
+    async def start(self) -> None:
+        """Start the hub on the running event loop."""
+        self.__loop = asyncio.get_running_loop()
+        await self.__backend.start(self.__deliver)
+
+    async def stop(self) -> None:
+        """Stop the hub."""
+        await self.__backend.stop()
+        self.__loop = None
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """
+        Open a subscription for a user.
+
+        Args:
+            user_id: The user's ID
+
+        Returns:
+            Queue receiving the user's events
+        """
+        queue = asyncio.Queue(maxsize=self.__queue_size)
+        self.__subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        """Close a subscription."""
+        queues = self.__subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.__subscribers[user_id]
+
+    def is_connected(self, user_id: int) -> bool:
+        """Check whether a user has an open connection on this worker."""
+        return user_id in self.__subscribers
+
+    async def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """
+        Publish an event to a user's connections (on every worker).
+
+        Args:
+            user_id: Recipient's ID
+            event: JSON-serializable event
+        """
+        await self.__backend.publish(user_id, event)
+
+    def publish_threadsafe(self, user_id: int, event: Dict[str, Any]) -> None:
+        """
+        Publish an event from a synchronous route (worker thread).
+        Does nothing if the hub is not running.
+        """
+        loop = self.__loop
+        if loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.publish(user_id, event), loop)
+
+    def __deliver(self, user_id: int, event: Dict[str, Any]) -> None:
+        """Push an event to the local queues of a user. Runs on the event loop."""
+        for queue in self.__subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+def create_backend(name: str):
+    """
+    Create the configured pub/sub backend.
+
+    Args:
+        name: "local" or "redis"
+
+    Returns:
+        Backend instance
+    """
+    if name == "redis":
+        return RedisBackend(settings.REDIS_URL)
+    return LocalBackend()
+
+
+# Global hub instance (per worker process)
+realtime_hub = RealtimeHub(create_backend(settings.REALTIME_BACKEND))
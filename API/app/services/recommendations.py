@@ -0,0 +1,259 @@
+"""
+Recommendations service.
+Collaborative filtering on accepted matches ("players like your matches").
+"""
+
+import asyncio
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from ..config import settings
+from ..database import DatabaseSession
+
+
+class SimilarPlayersIndex:
+    """
+    Item-item similar-player lists built from the co-acceptance matrix.
+
+    Two players are similar when they have accepted matches with the same
+    people. Similarity is the cosine between rows of the user x user
+    adjacency matrix of accepted matches. Only the top K neighbours of each
+    player are kept, stored in flat arrays (CSR layout) to keep memory low.
+    """
+
+    def __init__(self, top_k: int = 20, block_rows: int = 2048, chunk_size: int = 50000):
+        """
+        Initialize an empty index.
+
+        Args:
+            top_k: Number of similar players kept per player
+            block_rows: Rows multiplied at once (bounds peak memory)
+            chunk_size: Rows fetched per query when loading matches
+        """
+        self.__top_k = top_k
+        self.__block_rows = block_rows
+        self.__chunk_size = chunk_size
+        self.__lock = threading.Lock()
+        self.__user_ids = np.empty(0, dtype=np.int64)
+        self.__offsets = np.zeros(1, dtype=np.int64)
+        self.__neighbors = np.empty(0, dtype=np.int64)
+        self.__scores = np.empty(0, dtype=np.float32)
+        self.__built_at: Optional[datetime] = None
+
+    @property
+    def built_at(self) -> Optional[datetime]:
+        """Get the time of the last successful build."""
+        return self.__built_at
+
+    @property
+    def size(self) -> int:
+        """Get the number of players in the index."""
+        return len(self.__user_ids)
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the index from accepted matches.
+
+        Returns:
+            Number of players indexed
+        """
+        user1, user2 = self.__load_accepted_pairs()
+        user_ids, offsets, neighbors, scores = self.compute(user1, user2)
+
+        with self.__lock:
+            self.__user_ids = user_ids
+            self.__offsets = offsets
+            self.__neighbors = neighbors
+            self.__scores = scores
+            self.__built_at = datetime.now()
+
+        return len(user_ids)
+
+    def compute(
+        self,
+        user1: np.ndarray,
+        user2: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compute top-K similar players from accepted match pairs.
+
+        Args:
+            user1: First user of each accepted match
+            user2: Second user of each accepted match
+
+        Returns:
+            Tuple (user_ids, offsets, neighbors, scores) where the similar
+            players of user_ids[i] are neighbors[offsets[i]:offsets[i + 1]]
+        """
+        if len(user1) == 0:
+            return (
+                np.empty(0, dtype=np.int64),
+                np.zeros(1, dtype=np.int64),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float32),
+            )
+
+        # Map user IDs to dense indices
+        user_ids, inverse = np.unique(np.concatenate([user1, user2]), return_inverse=True)
+        n = len(user_ids)
+        rows = inverse[:len(user1)]
+        cols = inverse[len(user1):]
+
+        # Symmetric binary adjacency matrix of accepted matches
+        adjacency = sp.coo_matrix(
+            (np.ones(2 * len(rows), dtype=np.float32),
+             (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+            shape=(n, n),
+        ).tocsr()
+        adjacency.sum_duplicates()
+        adjacency.data[:] = 1.0
+
+        # Row-normalize so that the product gives cosine similarities
+        degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+        inv_norm = 1.0 / np.sqrt(np.maximum(degrees, 1.0))
+        normalized = sp.diags(inv_norm.astype(np.float32)) @ adjacency
+        normalized_t = normalized.T.tocsr()
+
+        k = self.__top_k
+        counts = np.zeros(n, dtype=np.int64)
+        neighbor_blocks = []
+        score_blocks = []
+
+        # Multiply one block of rows at a time to bound peak memory
+        for start in range(0, n, self.__block_rows):
+            end = min(start + self.__block_rows, n)
+            block = (normalized[start:end] @ normalized_t).tocsr()
+
+            for r in range(end - start):
+                lo, hi = block.indptr[r], block.indptr[r + 1]
+                cols_r = block.indices[lo:hi]
+                vals_r = block.data[lo:hi]
+
+                keep = cols_r != start + r
+                cols_r, vals_r = cols_r[keep], vals_r[keep]
+
+                if len(vals_r) > k:
+                    top = np.argpartition(-vals_r, k)[:k]
+                    cols_r, vals_r = cols_r[top], vals_r[top]
+
+                order = np.argsort(-vals_r, kind="stable")
+                neighbor_blocks.append(user_ids[cols_r[order]])
+                score_blocks.append(vals_r[order].astype(np.float32))
+                counts[start + r] = len(order)
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return (
+            user_ids,
+            offsets,
+            np.concatenate(neighbor_blocks) if neighbor_blocks else np.empty(0, dtype=np.int64),
+            np.concatenate(score_blocks) if score_blocks else np.empty(0, dtype=np.float32),
+        )
+
+    def similar_to(self, user_id: int) -> List[Tuple[int, float]]:
+        """
+        Get the players most similar to a user.
+
+        Args:
+            user_id: The user's ID
+
+        Returns:
+            List of (user_id, similarity) sorted by similarity
+        """
+        with self.__lock:
+            user_ids, offsets = self.__user_ids, self.__offsets
+            neighbors, scores = self.__neighbors, self.__scores
+
+        pos = np.searchsorted(user_ids, user_id)
+        if pos >= len(user_ids) or user_ids[pos] != user_id:
+            return []
+
+        lo, hi = offsets[pos], offsets[pos + 1]
+        return list(zip(neighbors[lo:hi].tolist(), scores[lo:hi].tolist()))
+
+    def recommend(
+        self,
+        partner_ids: Iterable[int],
+        exclude: Iterable[int] = (),
+        limit: int = 20,
+    ) -> Dict[int, float]:
+        """
+        Recommend players similar to a user's accepted matches.
+
+        Args:
+            partner_ids: Players the user has accepted matches with
+            exclude: Players that must not be recommended
+            limit: Maximum number of recommendations
+
+        Returns:
+            Dict mapping recommended user ID to aggregated similarity
+        """
+        partner_ids = set(partner_ids)
+        excluded = partner_ids | set(exclude)
+
+        scores = defaultdict(float)
+        for partner_id in partner_ids:
+            for similar_id, similarity in self.similar_to(partner_id):
+                if similar_id not in excluded:
+                    scores[similar_id] += similarity
+
+        return dict(heapq.nlargest(limit, scores.items(), key=lambda item: item[1]))
+
+    def __load_accepted_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Stream accepted matches in keyset-paginated chunks."""
+        user1_chunks = []
+        user2_chunks = []
+        last_id = 0
+
+        with DatabaseSession() as db:
+            while True:
+                db.execute("""
+                    SELECT id, user1_id, user2_id
+                    FROM matches
+                    WHERE status = 'accepted' AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                """, (last_id, self.__chunk_size))
+                rows = db.fetchall()
+
+                if not rows:
+                    break
+
+                chunk = np.asarray(rows, dtype=np.int64)
+                user1_chunks.append(chunk[:, 1])
+                user2_chunks.append(chunk[:, 2])
+                last_id = int(chunk[-1, 0])
+
+                if len(rows) < self.__chunk_size:
+                    break
+
+        if not user1_chunks:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        return np.concatenate(user1_chunks), np.concatenate(user2_chunks)
+
+
+# Global index instance (per worker process)
+similar_players = SimilarPlayersIndex(top_k=settings.RECOMMENDATIONS_TOP_K)
+
+
+async def refresh_similar_players_task():
+    """
+    Background task rebuilding the similar-players index periodically.
+    The computation runs in a worker thread to keep the event loop free.
+    """
+    while True:
+        try:
+            count = await asyncio.to_thread(similar_players.rebuild)
+            print(f"Similar players index rebuilt: {count} players")
+        except Exception as e:
+            print(f"Error rebuilding similar players index: {e}")
+
+        await asyncio.sleep(settings.RECOMMENDATIONS_REFRESH_SECONDS)
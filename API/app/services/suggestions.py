@@ -0,0 +1,455 @@
+"""
+Search suggestions service.
+In-memory autocomplete indexes over public usernames and game names.
+"""
+
+import asyncio
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config import settings
+from ..database import DatabaseSession
+
+
+def _trigrams(name: str) -> Set[str]:
+    """Get the trigrams of a normalized name."""
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+class SuggestionIndex:
+    """
+    Autocomplete index over item names.
+
+    Prefix matches come from a sorted array of normalized names (a flattened
+    prefix trie: the names sharing a prefix are one contiguous range, found
+    by binary search). Infix matches come from a trigram index: the items
+    containing every trigram of the query are candidates, then checked
+    with a substring test. Queries shorter than 3 characters only match
+    prefixes. Infix matches are only looked up when there are not enough
+    prefix matches.
+
+    Items are tuples of fields, the first one being the name. Prefix
+    matches rank before infix matches; within each group items are sorted
+    by `rank` (alphabetically if None).
+
+    Fuzzy lookups take the sorted array under the lock and traverse it
+    without holding it; the next change then copies the array instead of
+    modifying the one being traversed.
+    """
+
+    def __init__(
+        self,
+        fields: Tuple[str, ...],
+        rank: Optional[Callable[[tuple], Any]] = None,
+        max_candidates: int = 200,
+        max_fuzzy_nodes: int = 20000,
+    ):
+        """
+        Initialize an empty index.
+
+        Args:
+            fields: Names of the item fields, the first one being the name
+            rank: Sort key of an item within a match group, or None for
+                alphabetical order
+            max_candidates: Infix matches ranked per query at most (bounds
+                the latency of very common substrings)
+            max_fuzzy_nodes: Trie nodes a fuzzy lookup visits at most
+                (bounds the latency of short or high-entropy queries)
+        """
+        self.__fields = fields
+        self.__rank = rank
+        self.__lock = threading.Lock()
+        self.__max_candidates = max_candidates
+        self.__max_fuzzy_nodes = max_fuzzy_nodes
+        self.__items: Dict[int, tuple] = {}
+        self.__names: Dict[int, str] = {}
+        self.__keys: List[Tuple[str, int]] = []
+        # True while fuzzy lookups may be traversing __keys
+        self.__keys_shared = False
+        self.__trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self.__built_at: Optional[datetime] = None
+        # Changes made while a rebuild loads its snapshot, replayed after the swap
+        self.__changes: Optional[List[Tuple[str, tuple]]] = None
+
+    @property
+    def built_at(self) -> Optional[datetime]:
+        """Get the time of the last full build (None until built)."""
+        return self.__built_at
+
+    @property
+    def size(self) -> int:
+        """Get the number of indexed items."""
+        return len(self.__items)
+
+    def rebuild(self, load: Callable[[], Iterable[Tuple[int, tuple]]]) -> int:
+        """
+        Replace the content of the index with a fresh snapshot.
+
+        Changes made while the snapshot is loaded and built are recorded and
+        replayed once it is swapped in, so they are not lost until the next
+        rebuild. A replayed `adjust` may count twice a change the snapshot
+        already includes; counts only rank items and the next rebuild
+        corrects them.
+
+        Args:
+            load: Function returning (item_id, fields) of every item
+
+        Returns:
+            Number of items indexed
+        """
+        with self.__lock:
+            self.__changes = []
+        try:
+            items = load()
+        except BaseException:
+            with self.__lock:
+                self.__changes = None
+            raise
+        return self.replace_all(items)
+
+    def replace_all(self, items: Iterable[Tuple[int, tuple]]) -> int:
+        """
+        Replace the content of the index.
+
+        Args:
+            items: (item_id, fields) of every item
+
+        Returns:
+            Number of items indexed
+        """
+        new_items = dict(items)
+        names = {item_id: values[0].casefold() for item_id, values in new_items.items()}
+        keys = sorted((name, item_id) for item_id, name in names.items())
+        trigrams = defaultdict(set)
+        for name, item_id in keys:
+            for trigram in _trigrams(name):
+                trigrams[trigram].add(item_id)
+
+        with self.__lock:
+            self.__items = new_items
+            self.__names = names
+            self.__keys = keys
+            self.__keys_shared = False
+            self.__trigrams = trigrams
+            self.__built_at = datetime.now()
+
+            changes, self.__changes = self.__changes, None
+            apply = {"upsert": self.__upsert, "adjust": self.__adjust, "remove": self.__remove}
+            for change, args in changes or ():
+                apply[change](*args)
+
+            return len(self.__items)
+
+    def upsert(self, item_id: int, values: tuple) -> None:
+        """
+        Add or replace an item.
+
+        Args:
+            item_id: The item's ID
+            values: The item's fields
+        """
+        with self.__lock:
+            self.__record("upsert", item_id, values)
+            self.__upsert(item_id, values)
+
+    def adjust(self, item_id: int, field: str, delta: int) -> None:
+        """
+        Add a delta to a numeric field of an indexed item.
+
+        Args:
+            item_id: The item's ID
+            field: Name of the field
+            delta: Change of the value
+        """
+        with self.__lock:
+            self.__record("adjust", item_id, field, delta)
+            self.__adjust(item_id, field, delta)
+
+    def remove(self, item_id: int) -> None:
+        """Remove an item if indexed."""
+        with self.__lock:
+            self.__record("remove", item_id)
+            self.__remove(item_id)
+
+    def search(self, q: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Get the items matching a query.
+
+        Args:
+            q: Query (prefix or substring of the name)
+            limit: Maximum number of items
+
+        Returns:
+            Items as dicts with an "id" key, prefix matches first
+        """
+        q = q.casefold()
+        rank = self.__rank
+
+        with self.__lock:
+            keys, items = self.__keys, self.__items
+
+            start = bisect.bisect_left(keys, (q,))
+            end = bisect.bisect_left(keys, (q + "\U0010ffff",), start)
+
+            if rank is None:
+                matches = [item_id for _, item_id in keys[start:min(end, start + limit)]]
+            else:
+                matches = heapq.nsmallest(
+                    limit, (item_id for _, item_id in keys[start:end]),
+                    key=lambda item_id: rank(items[item_id]),
+                )
+
+            if len(matches) < limit and len(q) >= 3:
+                matches += self.__infix_matches(q, limit - len(matches))
+
+            return [
+                {"id": item_id, **dict(zip(self.__fields, items[item_id]))}
+                for item_id in matches
+            ]
+
+    def fuzzy(self, q: str, max_distance: int = 2, limit: int = 20) -> List[Tuple[int, int]]:
+        """
+        Get the items whose name is within an edit distance of a query.
+
+        Runs a Levenshtein automaton over the implicit prefix trie of the
+        sorted names: one row of the edit distance table is computed per
+        trie node, and a branch is abandoned as soon as every cell of its
+        row exceeds max_distance. Adjacent transpositions count as one
+        edit. Branches are explored closest first and the lookup stops
+        after `max_fuzzy_nodes` nodes, returning the matches found so far.
+
+        Args:
+            q: Query (full name, possibly misspelled)
+            max_distance: Maximum number of edits
+            limit: Maximum number of items
+
+        Returns:
+            List of (item_id, distance), closest first
+        """
+        q = q.casefold()
+        size = len(q)
+        too_far = max_distance + 1
+        matches = []
+        budget = self.__max_fuzzy_nodes
+
+        with self.__lock:
+            keys = self.__keys
+            self.__keys_shared = True
+
+        # (lowest distance in the branch, sequence, prefix, first key, end key,
+        # distance row, parent row)
+        heap = [(0, 0, "", 0, len(keys), [min(j, too_far) for j in range(size + 1)], None)]
+        sequence = 0
+
+        while heap and budget > 0:
+            _, _, prefix, lo, hi, row, parent = heapq.heappop(heap)
+            depth = len(prefix)
+
+            # Names equal to the prefix sort first in their range
+            while lo < hi and len(keys[lo][0]) == depth:
+                if depth and row[size] <= max_distance:
+                    matches.append((row[size], keys[lo][0], keys[lo][1]))
+                lo += 1
+
+            # Only cells within max_distance of the diagonal can stay in bounds
+            first = max(1, depth + 1 - max_distance)
+            last = min(size, depth + 1 + max_distance)
+
+            while lo < hi and budget > 0:
+                budget -= 1
+                char = keys[lo][0][depth]
+                child = prefix + char
+                end = bisect.bisect_left(keys, (child + "\U0010ffff",), lo, hi)
+
+                next_row = [too_far] * (size + 1)
+                next_row[0] = best = depth + 1 if depth < max_distance else too_far
+                for j in range(first, last + 1):
+                    cost = next_row[j - 1] + 1
+                    if row[j] < cost:
+                        cost = row[j] + 1
+                    if row[j - 1] + (q[j - 1] != char) < cost:
+                        cost = row[j - 1] + (q[j - 1] != char)
+                    if parent is not None and j > 1 and q[j - 1] == prefix[-1] and q[j - 2] == char \
+                            and parent[j - 2] + 1 < cost:
+                        cost = parent[j - 2] + 1
+                    if cost < too_far:
+                        next_row[j] = cost
+                        if cost < best:
+                            best = cost
+
+                if best <= max_distance:
+                    sequence += 1
+                    heapq.heappush(heap, (best, sequence, child, lo, end, next_row, row))
+                lo = end
+
+        return [(item_id, distance) for distance, _, item_id in heapq.nsmallest(limit, matches)]
+
+    def __infix_matches(self, q: str, limit: int) -> List[int]:
+        """
+        Get the best items containing the query (but not starting with it).
+        Scans the shortest trigram posting list and stops after
+        `max_candidates` matches. The lock must be held.
+        """
+        postings = sorted((self.__trigrams.get(t, ()) for t in _trigrams(q)), key=len)
+        shortest, others = postings[0], postings[1:]
+        names = self.__names
+
+        candidates = []
+        for item_id in shortest:
+            if all(item_id in other for other in others):
+                name = names[item_id]
+                if q in name and not name.startswith(q):
+                    candidates.append(item_id)
+                    if len(candidates) >= self.__max_candidates:
+                        break
+
+        rank = self.__rank
+        items = self.__items
+        return heapq.nsmallest(
+            limit, candidates,
+            key=(lambda item_id: rank(items[item_id])) if rank else names.__getitem__,
+        )
+
+    def __record(self, change: str, *args) -> None:
+        """Log a change if a rebuild is loading. The lock must be held."""
+        if self.__changes is not None:
+            self.__changes.append((change, args))
+
+    def __upsert(self, item_id: int, values: tuple) -> None:
+        """Add or replace an item. The lock must be held."""
+        self.__remove(item_id)
+        name = values[0].casefold()
+        self.__items[item_id] = values
+        self.__names[item_id] = name
+        bisect.insort(self.__writable_keys(), (name, item_id))
+        for trigram in _trigrams(name):
+            self.__trigrams[trigram].add(item_id)
+
+    def __writable_keys(self) -> List[Tuple[str, int]]:
+        """Get the sorted array, copied first if lookups may be traversing it. The lock must be held."""
+        if self.__keys_shared:
+            self.__keys = list(self.__keys)
+            self.__keys_shared = False
+        return self.__keys
+
+    def __adjust(self, item_id: int, field: str, delta: int) -> None:
+        """Add a delta to a numeric field. The lock must be held."""
+        values = self.__items.get(item_id)
+        if values is not None:
+            values = list(values)
+            position = self.__fields.index(field)
+            values[position] = max(values[position] + delta, 0)
+            self.__items[item_id] = tuple(values)
+
+    def __remove(self, item_id: int) -> None:
+        """Remove an item. The lock must be held."""
+        values = self.__items.pop(item_id, None)
+        if values is None:
+            return
+
+        name = self.__names.pop(item_id)
+        position = bisect.bisect_left(self.__keys, (name, item_id))
+        if position < len(self.__keys) and self.__keys[position] == (name, item_id):
+            del self.__writable_keys()[position]
+        for trigram in _trigrams(name):
+            postings = self.__trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(item_id)
+                if not postings:
+                    del self.__trigrams[trigram]
+
+
+# Global indexes (per worker process)
+player_suggestions = SuggestionIndex(
+    ("username", "avatar_url"),
+    max_fuzzy_nodes=settings.SUGGESTIONS_FUZZY_MAX_NODES,
+)
+game_suggestions = SuggestionIndex(
+    ("name", "icon_url", "player_count"),
+    rank=lambda game: (-game[2], game[0].casefold()),
+)
+
+
+def on_profile_changed(user_id: int, username: str, avatar_url: Optional[str], visibility: Optional[str]) -> None:
+    """
+    Update the player suggestions after a registration or profile update.
+
+    Args:
+        user_id: The user's ID
+        username: The user's username
+        avatar_url: The user's avatar
+        visibility: The profile visibility (private profiles are not suggested)
+    """
+    if visibility == "private":
+        player_suggestions.remove(user_id)
+    else:
+        player_suggestions.upsert(user_id, (username, avatar_url))
+
+
+def _load_players(chunk_size: int = 50000) -> List[Tuple[int, tuple]]:
+    """Stream public players in keyset-paginated chunks."""
+    players = []
+    last_id = 0
+
+    with DatabaseSession() as db:
+        while True:
+            db.execute("""
+                SELECT u.id, u.username, p.avatar_url
+                FROM users u
+                LEFT JOIN user_profiles p ON u.id = p.user_id
+                WHERE u.id > %s
+                AND (p.profile_visibility != 'private' OR p.profile_visibility IS NULL)
+                ORDER BY u.id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = db.fetchall()
+
+            players.extend((row[0], (row[1], row[2])) for row in rows)
+            if len(rows) < chunk_size:
+                return players
+            last_id = rows[-1][0]
+
+
+def _load_games() -> List[Tuple[int, tuple]]:
+    """Load every game with its player count."""
+    with DatabaseSession() as db:
+        db.execute("""
+            SELECT g.id, g.name, g.icon_url, COUNT(ug.user_id)
+            FROM games g
+            LEFT JOIN user_games ug ON g.id = ug.game_id
+            GROUP BY g.id, g.name, g.icon_url
+        """)
+        return [(row[0], (row[1], row[2], row[3])) for row in db.fetchall()]
+
+
+def rebuild_suggestions() -> Tuple[int, int]:
+    """
+    Rebuild both suggestion indexes from the database.
+
+    Returns:
+        Tuple (players indexed, games indexed)
+    """
+    return (
+        player_suggestions.rebuild(_load_players),
+        game_suggestions.rebuild(_load_games),
+    )
+
+
+async def refresh_suggestions_task():
+    """
+    Background task rebuilding the suggestion indexes periodically.
+    Changes made on this worker are applied incrementally in between; the
+    rebuild picks up the ones made on other workers.
+    """
+    while True:
+        try:
+            players, games = await asyncio.to_thread(rebuild_suggestions)
+            print(f"Suggestion indexes rebuilt: {players} players, {games} games")
+        except Exception as e:
+            print(f"Error rebuilding suggestion indexes: {e}")
+
+        await asyncio.sleep(settings.SUGGESTIONS_REFRESH_SECONDS)
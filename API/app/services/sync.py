@@ -0,0 +1,409 @@
+"""
+Sync service.
+Incremental changes for a user since an opaque watermark token.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..config import settings
+from ..database import DatabaseSession
+from .messaging import inflate_messages
+
+# Maximum rows returned per change stream in one sync
+SYNC_PAGE_SIZE = 500
+
+
+def encode_token(watermark: Dict[str, Any]) -> str:
+    """
+    Encode a watermark into an opaque token.
+
+    Args:
+        watermark: Dict with the message and notification ID floors ("m",
+            "n"), the IDs already returned above each floor ("sm", "sn"),
+            the update time floor of reads and matches ("t") and the
+            states already returned above it ("sr", "sx")
+
+    Returns:
+        URL-safe token
+    """
+    raw = json.dumps(watermark, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Decode a token produced by encode_token.
+
+    Args:
+        token: Opaque sync token
+
+    Returns:
+        The watermark
+
+    Raises:
+        HTTPException: 400 if the token is invalid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        watermark = json.loads(raw)
+        return {
+            "m": int(watermark["m"]),
+            "n": int(watermark["n"]),
+            "sm": [int(i) for i in watermark.get("sm", [])],
+            "sn": [int(i) for i in watermark.get("sn", [])],
+            "sr": [[int(i) for i in key] for key in watermark.get("sr", [])],
+            "sx": [
+                [int(match_id), datetime.fromisoformat(updated_at).isoformat()]
+                for match_id, updated_at in watermark.get("sx", [])
+            ],
+            "t": datetime.fromisoformat(watermark["t"]).isoformat(sep=" "),
+        }
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+
+def _advance(
+    rows: List[Dict[str, Any]],
+    floor: int,
+    seen: List[int],
+    cutoff: datetime,
+    complete: bool,
+) -> Tuple[List[Dict[str, Any]], int, List[int]]:
+    """
+    Split the rows scanned above an ID floor into new ones and move the floor.
+
+    AUTO_INCREMENT IDs follow insert order, not commit order: a row with a
+    lower ID may become visible after a higher one. The floor therefore only
+    moves up to the last row created before `cutoff` (older than any open
+    transaction); rows above it are scanned again on the next sync and
+    their IDs kept in the token so they are returned once.
+
+    Args:
+        rows: Rows with an ID above the floor, in ID order
+        floor: Current ID floor
+        seen: IDs above the floor already returned
+        cutoff: Creation time before which rows are stable
+        complete: False if the scan stopped at the page size
+
+    Returns:
+        Tuple (new rows, next floor, next seen IDs)
+    """
+    already = set(seen)
+    new_rows = [row for row in rows if row["id"] not in already]
+
+    next_floor = floor
+    for row in rows:
+        if row["created_at"] < cutoff:
+            next_floor = row["id"]
+
+    # Seen IDs beyond an incomplete page were not scanned this time
+    last_id = rows[-1]["id"] if rows else floor
+    scanned = {row["id"] for row in rows}
+    next_seen = sorted(
+        scanned | {i for i in already if not complete and i > last_id}
+    )
+    return new_rows, next_floor, [i for i in next_seen if i > next_floor]
+
+
+def _advance_states(
+    rows: List[Dict[str, Any]],
+    keys: List[list],
+    seen: List[list],
+    floor: datetime,
+) -> Tuple[List[Dict[str, Any]], List[list]]:
+    """
+    Split the state rows updated since the time floor into new ones and
+    keep the keys of those above the next floor.
+
+    Like IDs, update times do not follow commit order, so the time floor
+    trails the sync by the safety window and rows above it are read again;
+    their keys (which change with the state) are kept in the token so each
+    state is returned once.
+
+    Args:
+        rows: Rows updated after the current floor
+        keys: Key of each row's state
+        seen: Keys already returned
+        floor: Next time floor
+
+    Returns:
+        Tuple (new rows, next seen keys)
+    """
+    already = {tuple(key) for key in seen}
+    new_rows = [row for row, key in zip(rows, keys) if tuple(key) not in already]
+    next_seen = sorted(key for row, key in zip(rows, keys) if row["updated_at"] > floor)
+    return new_rows, next_seen
+
+
+def _stable_cutoff(now: datetime) -> datetime:
+    """Get the creation time before which rows can no longer appear late."""
+    # created_at has a one-second precision
+    return now - timedelta(seconds=settings.SYNC_SAFETY_WINDOW_SECONDS + 1)
+
+
+def _state_floor(now: datetime) -> datetime:
+    """Get the update time before which states can no longer appear late."""
+    # updated_at has a microsecond precision
+    return now - timedelta(seconds=settings.SYNC_SAFETY_WINDOW_SECONDS)
+
+
+def _fetch_reads(db: DatabaseSession, user_id: int, since: Any) -> Tuple[List[Dict[str, Any]], List[list]]:
+    """Get the read watermarks moved by the user or their peers since a time, with their keys."""
+    db.execute(
+        """
+        (SELECT reader_id, peer_id, last_read_message_id, updated_at
+         FROM conversation_reads WHERE reader_id = %s AND updated_at > %s)
+        UNION ALL
+        (SELECT reader_id, peer_id, last_read_message_id, updated_at
+         FROM conversation_reads WHERE peer_id = %s AND updated_at > %s)
+        """,
+        (user_id, since, user_id, since),
+    )
+    reads = list(db.fetchall())
+    return reads, [[r["reader_id"], r["peer_id"], r["last_read_message_id"]] for r in reads]
+
+
+def _fetch_matches(db: DatabaseSession, user_id: int, since: Any) -> Tuple[List[Dict[str, Any]], List[list]]:
+    """Get the user's matches updated since a time, with their keys."""
+    db.execute(
+        """
+        (SELECT id, user1_id, user2_id, status, match_score, updated_at
+         FROM matches WHERE user1_id = %s AND updated_at > %s)
+        UNION ALL
+        (SELECT id, user1_id, user2_id, status, match_score, updated_at
+         FROM matches WHERE user2_id = %s AND updated_at > %s)
+        """,
+        (user_id, since, user_id, since),
+    )
+    matches = list(db.fetchall())
+    return matches, [[m["id"], m["updated_at"].isoformat()] for m in matches]
+
+
+def _too_many_seen(*seen_lists: List[Any]) -> bool:
+    """Check whether a token would list more returned rows than allowed."""
+    return any(len(seen) > settings.SYNC_MAX_SEEN_IDS for seen in seen_lists)
+
+
+def current_token(user_id: int) -> str:
+    """
+    Build a token pointing at the current state, without any change.
+
+    Args:
+        user_id: The user's ID
+
+    Returns:
+        Sync token
+    """
+    with DatabaseSession(dict_cursor=True) as db:
+        db.execute("SELECT NOW(6) as now")
+        now = db.fetchone()["now"]
+        cutoff = _stable_cutoff(now)
+
+        # Floors: the last rows created before the safety window
+        db.execute(
+            """
+            SELECT
+                GREATEST(
+                    COALESCE((SELECT MAX(id) FROM messages
+                              WHERE sender_id = %s AND created_at < %s), 0),
+                    COALESCE((SELECT MAX(id) FROM messages
+                              WHERE receiver_id = %s AND created_at < %s), 0)
+                ) as message_floor,
+                COALESCE((SELECT MAX(id) FROM notifications
+                          WHERE user_id = %s AND created_at < %s), 0)
+                    as notification_floor
+            """,
+            (user_id, cutoff, user_id, cutoff, user_id, cutoff),
+        )
+        floors = db.fetchone()
+
+        # Rows already visible above the floors count as known to the client
+        db.execute(
+            """
+            (SELECT id FROM messages WHERE sender_id = %s AND id > %s)
+            UNION ALL
+            (SELECT id FROM messages WHERE receiver_id = %s AND id > %s)
+            ORDER BY id
+            """,
+            (user_id, floors["message_floor"], user_id, floors["message_floor"]),
+        )
+        seen_messages = [r["id"] for r in db.fetchall()]
+
+        db.execute(
+            "SELECT id FROM notifications WHERE user_id = %s AND id > %s ORDER BY id",
+            (user_id, floors["notification_floor"]),
+        )
+        seen_notifications = [r["id"] for r in db.fetchall()]
+
+        state_floor = _state_floor(now)
+        _, seen_reads = _fetch_reads(db, user_id, state_floor)
+        _, seen_matches = _fetch_matches(db, user_id, state_floor)
+
+    message_floor = floors["message_floor"]
+    notification_floor = floors["notification_floor"]
+    # Too many recent rows to list in a token: start above them, at the risk
+    # of missing one still uncommitted
+    if _too_many_seen(seen_messages):
+        message_floor, seen_messages = seen_messages[-1], []
+    if _too_many_seen(seen_notifications):
+        notification_floor, seen_notifications = seen_notifications[-1], []
+    if _too_many_seen(seen_reads, seen_matches):
+        state_floor, seen_reads, seen_matches = now, [], []
+
+    return encode_token({
+        "m": message_floor,
+        "n": notification_floor,
+        "sm": seen_messages,
+        "sn": seen_notifications,
+        "sr": sorted(seen_reads),
+        "sx": sorted(seen_matches),
+        "t": state_floor.isoformat(),
+    })
+
+
+def resync_changes(user_id: int, resync: bool = False) -> Dict[str, Any]:
+    """
+    Build an empty sync result pointing at the current state.
+
+    Args:
+        user_id: The user's ID
+        resync: True if the client must reload its data before syncing
+            again, because its token could not be advanced
+
+    Returns:
+        Dict shaped like fetch_changes
+    """
+    return {
+        "messages": [],
+        "reads": [],
+        "notifications": [],
+        "matches": [],
+        "has_more": False,
+        "resync": resync,
+        "next": current_token(user_id),
+    }
+
+
+def fetch_changes(user_id: int, watermark: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch the changes visible to a user since a watermark.
+
+    Messages and notifications are tracked by ID, read-state and match
+    changes by update time, with a safety window for rows committed out of
+    order (see _advance and _advance_states). If the token would list more
+    than SYNC_MAX_SEEN_IDS rows of one stream, the result is empty with
+    `resync` set and a token pointing at the current state.
+
+    Args:
+        user_id: The user's ID
+        watermark: Decoded sync token
+
+    Returns:
+        Dict with messages, reads, notifications, matches, has_more, resync
+        and the next token
+    """
+    if _too_many_seen(watermark["sm"], watermark["sn"], watermark["sr"], watermark["sx"]):
+        return resync_changes(user_id, resync=True)
+
+    with DatabaseSession(dict_cursor=True) as db:
+        db.execute("SELECT NOW(6) as now")
+        now = db.fetchone()["now"]
+        message_limit = SYNC_PAGE_SIZE + len(watermark["sm"])
+        notification_limit = SYNC_PAGE_SIZE + len(watermark["sn"])
+
+        # Messages above the floor, read from the (sender_id, id) and (receiver_id, id) ranges
+        db.execute(
+            """
+            (SELECT id, sender_id, receiver_id, content, content_zip, is_compressed, created_at
+             FROM messages WHERE sender_id = %s AND id > %s ORDER BY id LIMIT %s)
+            UNION ALL
+            (SELECT id, sender_id, receiver_id, content, content_zip, is_compressed, created_at
+             FROM messages WHERE receiver_id = %s AND id > %s ORDER BY id LIMIT %s)
+            ORDER BY id
+            LIMIT %s
+            """,
+            (user_id, watermark["m"], message_limit,
+             user_id, watermark["m"], message_limit, message_limit),
+        )
+        scanned_messages = list(db.fetchall())
+
+        scanned_reads, read_keys = _fetch_reads(db, user_id, watermark["t"])
+
+        db.execute(
+            """
+            SELECT id, type, title, message, data, from_user_id, is_read, created_at
+            FROM notifications
+            WHERE user_id = %s AND id > %s
+            ORDER BY id
+            LIMIT %s
+            """,
+            (user_id, watermark["n"], notification_limit),
+        )
+        scanned_notifications = list(db.fetchall())
+
+        scanned_matches, match_keys = _fetch_matches(db, user_id, watermark["t"])
+
+    cutoff = _stable_cutoff(now)
+    messages, message_floor, seen_messages = _advance(
+        scanned_messages, watermark["m"], watermark["sm"], cutoff,
+        complete=len(scanned_messages) < message_limit,
+    )
+    notifications, notification_floor, seen_notifications = _advance(
+        scanned_notifications, watermark["n"], watermark["sn"], cutoff,
+        complete=len(scanned_notifications) < notification_limit,
+    )
+    inflate_messages(messages)
+
+    for notif in notifications:
+        if notif.get("data"):
+            try:
+                notif["data"] = json.loads(notif["data"])
+            except (json.JSONDecodeError, TypeError):
+                pass
+
+    has_more = (
+        len(scanned_messages) == message_limit
+        or len(scanned_notifications) == notification_limit
+    )
+
+    # Time-based streams only move forward once the ID streams are complete
+    state_floor = datetime.fromisoformat(watermark["t"]) if has_more else _state_floor(now)
+    reads, seen_reads = _advance_states(scanned_reads, read_keys, watermark["sr"], state_floor)
+    matches, seen_matches = _advance_states(scanned_matches, match_keys, watermark["sx"], state_floor)
+    for read in reads:
+        del read["updated_at"]
+
+    if _too_many_seen(seen_messages, seen_notifications, seen_reads, seen_matches):
+        return resync_changes(user_id, resync=True)
+
+    next_watermark = {
+        "m": message_floor,
+        "n": notification_floor,
+        "sm": seen_messages,
+        "sn": seen_notifications,
+        "sr": seen_reads,
+        "sx": seen_matches,
+        "t": state_floor.isoformat(),
+    }
+
+    return {
+        "messages": messages,
+        "reads": reads,
+        "notifications": notifications,
+        "matches": matches,
+        "has_more": has_more,
+        "resync": False,
+        "next": encode_token(next_watermark),
+    }
+
+
+def has_changes(changes: Optional[Dict[str, Any]]) -> bool:
+    """Check whether a fetch_changes result contains anything."""
+    return bool(changes) and (changes["resync"] or any(
+        changes[key] for key in ("messages", "reads", "notifications", "matches")
+    ))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the player facets index.
+Indexes N synthetic players (profile facets and 0-3 games each) and
+measures the latency of filtered searches with all facet counts, and of
+incremental updates.
+
+Usage: python benchmarks/facets.py [players] [games] [queries]
+"""
+
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.facets import FacetIndex  # noqa: E402
+
+REGIONS = ["Europe", "NA", "Asie", "OCE", "SA", "Afrique", None]
+SKILL_LEVELS = ["beginner", "intermediate", "advanced", "expert"]
+LOOKING_FOR = ["teammates", "mentor", "casual_friends", "competitive_team"]
+
+
+def percentiles(samples) -> str:
+    samples = sorted(samples)
+    return (f"p50 {samples[len(samples) // 2] * 1000:.2f} ms, "
+            f"p99 {samples[int(len(samples) * 0.99)] * 1000:.2f} ms")
+
+
+def run(players: int, games: int, queries: int) -> None:
+    user_ids = np.arange(1, players + 1, dtype=np.int64)
+    values = {
+        "region": random.choices(REGIONS, k=players),
+        "skill_level": random.choices(SKILL_LEVELS, k=players),
+        "looking_for": random.choices(LOOKING_FOR, k=players),
+    }
+    game_counts = np.random.randint(0, 4, size=players)
+    game_user_ids = np.repeat(user_ids, game_counts)
+    game_ids = np.random.randint(1, games + 1, size=len(game_user_ids))
+
+    index = FacetIndex()
+    start = time.perf_counter()
+    index.replace_all(user_ids, np.random.rand(players) < 0.9, values, game_user_ids, game_ids)
+    print(f"Players:  {index.size} indexed in {time.perf_counter() - start:.1f}s")
+
+    latencies = []
+    for _ in range(queries):
+        filters = {
+            "region": random.choice(REGIONS),
+            "skill_level": random.choice(SKILL_LEVELS + [None]),
+            "looking_for": random.choice(LOOKING_FOR + [None]),
+        }
+        game_id = random.choice([None, random.randint(1, games)])
+        start = time.perf_counter()
+        index.search(filters, game_id=game_id, limit=20, offset=0)
+        latencies.append(time.perf_counter() - start)
+    print(f"Search:   {percentiles(latencies)} (page, total and every facet count, {games} games)")
+
+    # Counts restricted to the matches of a text search (search_players with facets=true)
+    latencies = []
+    for _ in range(queries):
+        matches = np.random.randint(1, players + 1, size=random.choice([100, 10000, 100000])).tolist()
+        start = time.perf_counter()
+        index.search({"region": random.choice(REGIONS)}, limit=0, user_ids=matches)
+        latencies.append(time.perf_counter() - start)
+    print(f"Matches:  {percentiles(latencies)} (counts over 100 to 100000 matching players)")
+
+    latencies = []
+    for user_id in range(players + 1, players + 1 + min(queries, 10000)):
+        start = time.perf_counter()
+        index.set_player(user_id, True, region=random.choice(REGIONS),
+                         skill_level=random.choice(SKILL_LEVELS), looking_for=random.choice(LOOKING_FOR))
+        index.set_game(user_id, random.randint(1, games), True)
+        latencies.append(time.perf_counter() - start)
+    print(f"Update:   {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 200,
+    )
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the realtime hub fan-out, in process.
+Opens N hub subscriptions on one worker and measures publish-to-queue
+throughput and latency. No WebSocket is involved: JSON encoding, socket
+writes and client reads are not measured, so the figures are an upper bound
+for what connected clients will see.
+
+Usage: python benchmarks/hub_fanout.py [connections] [messages]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.realtime import LocalBackend, RealtimeHub  # noqa: E402
+
+
+async def run(connections: int, messages: int) -> None:
+    hub = RealtimeHub(LocalBackend())
+    await hub.start()
+
+    queues = [hub.subscribe(user_id) for user_id in range(connections)]
+    latencies = []
+    received = 0
+
+    async def consume(queue: asyncio.Queue) -> None:
+        nonlocal received
+        while True:
+            event = await queue.get()
+            latencies.append(time.perf_counter() - event["sent_at"])
+            received += 1
+
+    consumers = [asyncio.create_task(consume(queue)) for queue in queues]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        await hub.publish(random.randrange(connections), {"id": i, "sent_at": time.perf_counter()})
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+
+    while received < messages:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    for consumer in consumers:
+        consumer.cancel()
+    await hub.stop()
+
+    latencies.sort()
+    print(f"Connections: {hub.connection_count}")
+    print(f"Messages:    {messages} in {elapsed:.2f}s ({messages / elapsed:,.0f} msg/s)")
+    print(f"Latency:     p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    asyncio.run(run(connections, messages))
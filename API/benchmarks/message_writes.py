@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the message write paths (direct vs group commit).
+Creates two matched throwaway users in the database configured in .env,
+sends messages between them from concurrent threads, then deletes the
+users: their messages, conversation summary, read watermarks and
+notifications go with them (ON DELETE CASCADE), and their outbox events
+are deleted explicitly.
+
+Usage: python benchmarks/message_writes.py [messages] [threads]
+"""
+
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.config import settings  # noqa: E402
+from app.database import DatabaseSession  # noqa: E402
+from app.services.messaging import message_writer, send_message  # noqa: E402
+
+PREFIX = "bench_msg_"
+
+
+def setup() -> List[int]:
+    tag = uuid.uuid4().hex[:8]
+    user_ids = []
+    with DatabaseSession() as db:
+        for n in range(2):
+            db.execute(
+                "INSERT INTO users (email, username, password_hash) VALUES (%s, %s, %s)",
+                (f"{PREFIX}{tag}_{n}@example.invalid", f"{PREFIX}{tag}_{n}", "-"),
+            )
+            user_ids.append(db.lastrowid)
+        db.execute(
+            "INSERT INTO matches (user1_id, user2_id, match_score, status) VALUES (%s, %s, 0, 'accepted')",
+            user_ids,
+        )
+    return user_ids
+
+
+def run(mode: str, sender_id: int, receiver_id: int, messages: int, threads: int) -> None:
+    settings.MESSAGE_WRITE_MODE = mode
+
+    def send(i: int) -> None:
+        send_message(sender_id, receiver_id, f"[benchmark] message write {i}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(messages)))
+    message_writer.stop()
+    elapsed = time.perf_counter() - start
+
+    print(f"{mode:>6}: {messages} messages in {elapsed:.2f}s ({messages / elapsed:,.0f} msg/s)")
+
+
+def cleanup(user_ids: List[int]) -> None:
+    placeholders = ",".join(["%s"] * len(user_ids))
+    with DatabaseSession() as db:
+        # Events are not tied to users by a foreign key
+        db.execute(
+            f"""
+            DELETE FROM outbox
+            WHERE event_type = 'message.sent'
+            AND CAST(JSON_EXTRACT(payload, '$.sender_id') AS UNSIGNED) IN ({placeholders})
+            """,
+            user_ids,
+        )
+        db.execute(f"DELETE FROM users WHERE id IN ({placeholders})", user_ids)
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    sender_id, receiver_id = user_ids = setup()
+    try:
+        for mode in ("direct", "group"):
+            run(mode, sender_id, receiver_id, messages, threads)
+    finally:
+        cleanup(user_ids)
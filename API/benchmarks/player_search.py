@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the player search engines (fulltext vs like).
+Creates N synthetic users with profiles and games in the database
+configured in .env (migration 013 applied), times random searches with
+each engine, then deletes the users.
+
+Usage: python benchmarks/player_search.py [users] [queries]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.database import DatabaseSession  # noqa: E402
+from app.routes.search import search_players  # noqa: E402
+
+PREFIX = "bench_"
+WORDS = ["dark", "wolf", "ninja", "shadow", "zero", "lord", "fox", "sniper", "tank", "healer",
+         "chill", "ranked", "grind", "casual", "team", "duo", "night", "weekend", "fps", "moba"]
+CHUNK = 5000
+
+
+def seed(users: int) -> None:
+    with DatabaseSession() as db:
+        db.execute("SELECT id FROM games")
+        game_ids = [row[0] for row in db.fetchall()]
+
+    start = time.perf_counter()
+    for first in range(0, users, CHUNK):
+        numbers = range(first, min(first + CHUNK, users))
+        with DatabaseSession() as db:
+            db.execute(
+                f"INSERT INTO users (email, username, password_hash) VALUES "
+                f"{', '.join(['(%s, %s, %s)'] * len(numbers))}",
+                [value for n in numbers for value in (
+                    f"{PREFIX}{n}@example.invalid",
+                    f"{PREFIX}{random.choice(WORDS)}{random.choice(WORDS)}{n}",
+                    "-",
+                )],
+            )
+            db.execute(
+                "SELECT id FROM users WHERE id >= %s AND email LIKE %s ORDER BY id LIMIT %s",
+                (db.lastrowid, f"{PREFIX}%", len(numbers)),
+            )
+            user_ids = [row[0] for row in db.fetchall()]
+
+            db.execute(
+                f"INSERT INTO user_profiles (user_id, bio, region) VALUES "
+                f"{', '.join(['(%s, %s, %s)'] * len(user_ids))}",
+                [value for user_id in user_ids for value in (
+                    user_id,
+                    " ".join(random.choices(WORDS, k=random.randint(3, 12))),
+                    random.choice(["EU", "NA", "ASIA"]),
+                )],
+            )
+
+            if game_ids:
+                pairs = [(user_id, game_id) for user_id in user_ids
+                         for game_id in random.sample(game_ids, min(len(game_ids), random.randint(0, 3)))]
+                if pairs:
+                    db.execute(
+                        f"INSERT INTO user_games (user_id, game_id) VALUES {', '.join(['(%s, %s)'] * len(pairs))}",
+                        [value for pair in pairs for value in pair],
+                    )
+
+        print(f"\rSeeded {first + len(numbers)}/{users} users", end="", flush=True)
+    print(f" in {time.perf_counter() - start:.0f}s")
+
+
+def run(engine: str, queries: int) -> None:
+    latencies = []
+    for _ in range(queries):
+        q = random.choice(WORDS)[:random.randint(2, 5)] if random.random() < 0.5 else random.choice(WORDS)
+        start = time.perf_counter()
+        search_players(
+            q=q, game=None, skill_level=None, region=random.choice([None, "EU"]), looking_for=None,
+            limit=20, offset=0, sort="relevance", engine=engine, user_id=None,
+        )
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(f"{engine:>8}: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+
+def cleanup() -> None:
+    while True:
+        with DatabaseSession() as db:
+            db.execute("DELETE FROM users WHERE email LIKE %s LIMIT %s", (f"{PREFIX}%", CHUNK))
+            if db.rowcount < CHUNK:
+                return
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    try:
+        seed(users)
+        for engine in ("fulltext", "like"):
+            run(engine, queries)
+    finally:
+        cleanup()
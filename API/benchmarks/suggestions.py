@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the search suggestions index.
+Indexes N synthetic usernames and measures the latency of autocomplete
+queries (prefixes and infixes of random names), of fuzzy queries (names
+with one or two typos) and of incremental updates.
+
+Names are built from a few gamer syllables ("syllables", a dense trie) or
+mixed with words, separators and random characters ("mixed", closer to
+real usernames, with high-entropy names that make the fuzzy trie bushy).
+
+Usage: python benchmarks/suggestions.py [players] [queries] [syllables|mixed]
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.suggestions import SuggestionIndex  # noqa: E402
+
+SYLLABLES = ["dark", "pro", "xx", "kill", "ninja", "gamer", "wolf", "shadow", "zero", "lord", "ace", "fox"]
+
+
+WORDS = ["alex", "marie", "thomas", "lea", "hugo", "chloe", "lucas", "emma", "nathan", "sarah",
+         "storm", "pixel", "blaze", "frost", "viper", "raven", "titan", "ghost", "nova", "echo"]
+
+
+def username() -> str:
+    name = "".join(random.choice(SYLLABLES) for _ in range(random.randint(1, 3)))
+    return name + "".join(random.choices(string.digits, k=random.randint(0, 4)))
+
+
+def mixed_username() -> str:
+    style = random.random()
+    if style < 0.4:
+        return username()
+    if style < 0.8:
+        name = random.choice(WORDS) + random.choice(["", "_", ".", "-"]) + random.choice(WORDS + [""])
+        return name + "".join(random.choices(string.digits, k=random.randint(0, 4)))
+    # Random handles, e.g. "xk9Qz_3"
+    return "".join(random.choices(string.ascii_letters + string.digits + "_", k=random.randint(4, 14)))
+
+
+def percentiles(samples) -> str:
+    samples = sorted(samples)
+    return (f"p50 {samples[len(samples) // 2] * 1e6:.0f} us, "
+            f"p99 {samples[int(len(samples) * 0.99)] * 1e6:.0f} us")
+
+
+def run(players: int, queries: int, style: str) -> None:
+    generate = mixed_username if style == "mixed" else username
+    index = SuggestionIndex(("username", "avatar_url"))
+    # Usernames are unique in the database (case-insensitively)
+    names = {}
+    while len(names) < players:
+        name = generate()
+        names.setdefault(name.casefold(), name)
+    names = list(names.values())
+
+    start = time.perf_counter()
+    index.replace_all((user_id, (name, None)) for user_id, name in enumerate(names))
+    print(f"Players:  {index.size} indexed in {time.perf_counter() - start:.1f}s")
+
+    for label, cut in (("Prefix", lambda n: n[:random.randint(1, len(n))]),
+                       ("Infix", lambda n: n[len(n) // 2:][:4])):
+        latencies = []
+        for _ in range(queries):
+            q = cut(random.choice(names))
+            start = time.perf_counter()
+            index.search(q, limit=5)
+            latencies.append(time.perf_counter() - start)
+        print(f"{label}:{' ' * (9 - len(label))}{percentiles(latencies)}")
+
+    latencies = []
+    for _ in range(queries):
+        q = list(random.choice(names))
+        for _ in range(random.randint(1, 2)):
+            q[random.randrange(len(q))] = random.choice(string.ascii_lowercase)
+        start = time.perf_counter()
+        index.fuzzy("".join(q), max_distance=2)
+        latencies.append(time.perf_counter() - start)
+    print(f"Fuzzy:    {percentiles(latencies)}, max {max(latencies) * 1e3:.0f} ms")
+
+    latencies = []
+    for user_id in range(players, players + min(queries, 10000)):
+        start = time.perf_counter()
+        index.upsert(user_id, (generate(), None))
+        latencies.append(time.perf_counter() - start)
+    print(f"Upsert:   {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10000,
+        sys.argv[3] if len(sys.argv) > 3 else "mixed",
+    )
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Send a system notification to every user.
+Uses the bulk notification service (chunked, throttled inserts).
+
+Usage: python send_announcement.py "<title>" "<message>"
+"""
+
+import sys
+
+from app.services.notifications import create_notifications_bulk
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    title, message = sys.argv[1], sys.argv[2]
+
+    def report(created: int) -> None:
+        print(f"\r{created} notifications created", end="", flush=True)
+
+    total = create_notifications_bulk("system", title, message, progress=report)
+    print(f"\nDone: {total} users notified")
@@ -0,0 +1,143 @@
+"""
+Tests unitaires de l'index des facettes (sans base de données).
+Usage: python -m pytest tests/test_facets.py
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.services.facets import PROFILE_FACETS, FacetIndex
+
+VALUES = {
+    "region": ["Europe", "NA", "Asia", None],
+    "skill_level": ["beginner", "intermediate", "expert", None],
+    "looking_for": ["duo", "team", None],
+}
+GAMES = [1, 2, 3, 4]
+
+
+@pytest.fixture(scope="module")
+def players():
+    rng = random.Random(7)
+    players = {}
+    for user_id in range(1, 501):
+        players[user_id] = {
+            "visible": rng.random() < 0.8,
+            **{facet: rng.choice(VALUES[facet]) for facet in PROFILE_FACETS},
+            "games": {game for game in GAMES if rng.random() < 0.3},
+        }
+    return players
+
+
+def build(players):
+    index = FacetIndex()
+    user_ids = np.array(sorted(players), dtype=np.int64)
+    pairs = [(user_id, game) for user_id in user_ids for game in sorted(players[user_id]["games"])]
+    index.replace_all(
+        user_ids,
+        np.array([players[user_id]["visible"] for user_id in user_ids]),
+        {facet: [players[user_id][facet] for user_id in user_ids] for facet in PROFILE_FACETS},
+        np.array([user_id for user_id, _ in pairs], dtype=np.int64),
+        np.array([game for _, game in pairs], dtype=np.int64),
+    )
+    return index
+
+
+def brute_force(players, filters, game_id=None, user_ids=None):
+    """Résultats et comptes disjonctifs calculés joueur par joueur."""
+    def matches(player, excluded=None):
+        if not player["visible"]:
+            return False
+        for facet, value in filters.items():
+            if facet != excluded and value is not None and player[facet] != value:
+                return False
+        return excluded == "game_id" or game_id is None or game_id in player["games"]
+
+    candidates = {
+        user_id: player for user_id, player in players.items()
+        if user_ids is None or user_id in user_ids
+    }
+    result = sorted((user_id for user_id, player in candidates.items() if matches(player)), reverse=True)
+
+    counts = {facet: {} for facet in (*PROFILE_FACETS, "game_id")}
+    for player in candidates.values():
+        for facet in PROFILE_FACETS:
+            if player[facet] is not None and matches(player, facet):
+                counts[facet][player[facet]] = counts[facet].get(player[facet], 0) + 1
+        if matches(player, "game_id"):
+            for game in player["games"]:
+                counts["game_id"][game] = counts["game_id"].get(game, 0) + 1
+    return result, counts
+
+
+def random_filters(rng):
+    return {facet: rng.choice(VALUES[facet] + [None, None]) for facet in PROFILE_FACETS}
+
+
+def test_search_matches_brute_force(players):
+    index = build(players)
+    rng = random.Random(3)
+
+    for _ in range(50):
+        filters = random_filters(rng)
+        game_id = rng.choice(GAMES + [None])
+        expected, expected_counts = brute_force(players, filters, game_id)
+
+        page, total, counts = index.search(filters, game_id, limit=10, offset=5)
+        assert total == len(expected)
+        assert page == expected[5:15]
+        assert counts == expected_counts
+
+
+def test_search_restricted_to_user_ids(players):
+    index = build(players)
+    rng = random.Random(4)
+
+    for _ in range(20):
+        user_ids = set(rng.sample(sorted(players), 60))
+        filters = random_filters(rng)
+        expected, expected_counts = brute_force(players, filters, user_ids=user_ids)
+
+        # Les joueurs inconnus sont ignorés
+        page, total, counts = index.search(filters, limit=100, user_ids=list(user_ids) + [10 ** 6])
+        assert (page, total, counts) == (expected, len(expected), expected_counts)
+
+
+def test_filters_are_case_insensitive(players):
+    index = build(players)
+    expected, _ = brute_force(players, {"region": "Europe"})
+
+    _, total, counts = index.search({"region": "  europe "})
+    assert total == len(expected)
+    assert set(counts["region"]) == {"Europe", "NA", "Asia"}
+
+
+def test_unknown_filter_value_matches_nothing(players):
+    index = build(players)
+
+    page, total, counts = index.search({"region": "Mars"})
+    assert (page, total) == ([], 0)
+    assert counts["region"]
+    assert counts["skill_level"] == {}
+
+
+def test_updates_after_build():
+    index = FacetIndex(capacity=2)
+    index.set_player(1, True, region="Europe", skill_level="expert")
+    index.set_player(2, True, region="NA")
+    index.set_player(3, False, region="Europe")
+    index.set_game(1, 5, True)
+    index.set_game(4, 5, True)
+
+    assert index.search({"region": "europe"}) == (
+        [1], 1, {"region": {"Europe": 1, "NA": 1}, "skill_level": {"expert": 1}, "looking_for": {}, "game_id": {5: 1}}
+    )
+
+    index.set_player(2, True, region="Europe")
+    index.set_game(1, 5, False)
+    page, total, counts = index.search({"region": "Europe"}, game_id=5)
+    assert (page, total) == ([], 0)
+    assert counts["game_id"] == {}
+    assert index.search({"region": "Europe"})[:2] == ([2, 1], 2)
@@ -0,0 +1,81 @@
+"""
+Tests unitaires du cache des scores de compatibilité (sans base de données).
+Usage: python -m pytest tests/test_matching.py
+"""
+
+import pytest
+
+from app.services import matching
+from app.services.matching import PairScoreCache
+
+
+class Clock:
+    """Horloge monotone contrôlée par le test."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(matching.time, "monotonic", clock)
+    return clock
+
+
+def test_get_many_returns_hits_only(clock):
+    cache = PairScoreCache(max_size=10, ttl_seconds=60)
+    cache.set_many(1, {2: 40, 3: 75})
+
+    assert cache.get_many(1, [2, 3, 4]) == {2: 40, 3: 75}
+    assert cache.get_many(2, [1]) == {}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PairScoreCache(max_size=10, ttl_seconds=60)
+    cache.set_many(1, {2: 40})
+
+    clock.now += 60
+    assert cache.get_many(1, [2]) == {2: 40}
+
+    clock.now += 1
+    assert cache.get_many(1, [2]) == {}
+
+
+def test_set_many_refreshes_ttl(clock):
+    cache = PairScoreCache(max_size=10, ttl_seconds=60)
+    cache.set_many(1, {2: 40})
+
+    clock.now += 50
+    cache.set_many(1, {2: 55})
+    clock.now += 50
+    assert cache.get_many(1, [2]) == {2: 55}
+
+
+def test_evicts_least_recently_used(clock):
+    cache = PairScoreCache(max_size=3, ttl_seconds=60)
+    cache.set_many(1, {2: 10, 3: 20, 4: 30})
+
+    # La lecture de (1, 2) le rend plus récent que (1, 3)
+    assert cache.get_many(1, [2]) == {2: 10}
+    cache.set_many(1, {5: 50})
+
+    assert cache.get_many(1, [2, 3, 4, 5]) == {2: 10, 4: 30, 5: 50}
+
+
+def test_eviction_within_one_batch(clock):
+    cache = PairScoreCache(max_size=2, ttl_seconds=60)
+    cache.set_many(1, {2: 10, 3: 20, 4: 30})
+
+    assert cache.get_many(1, [2, 3, 4]) == {3: 20, 4: 30}
+
+
+def test_clear(clock):
+    cache = PairScoreCache(max_size=10, ttl_seconds=60)
+    cache.set_many(1, {2: 40})
+    cache.clear()
+
+    assert cache.get_many(1, [2]) == {}
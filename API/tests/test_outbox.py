@@ -0,0 +1,141 @@
+"""
+Tests unitaires du répartiteur de l'outbox (sans base de données).
+Usage: python -m pytest tests/test_outbox.py
+"""
+
+import json
+
+import pytest
+
+from app.services import outbox
+from app.services.outbox import OutboxDispatcher
+
+
+class FakeSession:
+    """Session qui enregistre les requêtes et renvoie les événements en attente."""
+
+    def __init__(self, database, dict_cursor=False):
+        self.database = database
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.database.queries.append((query, params))
+        if query.startswith("UPDATE outbox SET dispatched_at"):
+            self.rowcount = 0 if self.database.dispatched_elsewhere else 1
+
+    def fetchall(self):
+        events, self.database.pending = self.database.pending, []
+        return events
+
+
+class FakeDatabase:
+    def __init__(self, events):
+        self.pending = events
+        self.queries = []
+        self.dispatched_elsewhere = False
+
+    def updates(self, prefix):
+        return [params for query, params in self.queries if query.startswith(prefix)]
+
+
+def event(event_id, event_type="test.event", attempts=0, payload=None):
+    return {
+        "id": event_id,
+        "event_type": event_type,
+        "payload": json.dumps(payload or {}),
+        "attempts": attempts,
+    }
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase([])
+    monkeypatch.setattr(outbox, "DatabaseSession", lambda dict_cursor=False: FakeSession(database, dict_cursor))
+    return database
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    monkeypatch.setattr(outbox, "_handlers", {})
+    return outbox._handlers
+
+
+def failing(db, payload):
+    raise RuntimeError("boom")
+
+
+@pytest.mark.parametrize("attempts, delay", [(0, 2), (1, 4), (4, 32), (10, 2048), (11, 3600), (40, 3600)])
+def test_failed_event_backoff(database, handlers, attempts, delay):
+    outbox.handler("test.event")(failing)
+    database.pending = [event(7, attempts=attempts)]
+
+    assert OutboxDispatcher(max_attempts=50).dispatch_batch() == 1
+    assert database.updates("UPDATE outbox SET available_at") == [(delay, "boom", 7)]
+
+
+def test_unknown_event_type_fails(database, handlers):
+    database.pending = [event(3, event_type="unknown.event")]
+
+    OutboxDispatcher().dispatch_batch()
+
+    assert database.updates("UPDATE outbox SET dispatched_at") == []
+    [(delay, error, event_id)] = database.updates("UPDATE outbox SET available_at")
+    assert (delay, event_id) == (2, 3)
+    assert "unknown.event" in error
+
+
+def test_claim_leases_batch(database, handlers):
+    outbox.handler("test.event")(lambda db, payload: None)
+    database.pending = [event(1), event(2)]
+
+    assert OutboxDispatcher(lease_seconds=30).dispatch_batch() == 2
+    assert database.updates("UPDATE outbox SET attempts") == [[30, 1, 2]]
+    assert database.updates("UPDATE outbox SET dispatched_at") == [(1,), (2,)]
+    assert database.updates("UPDATE outbox SET available_at") == []
+
+
+def test_handler_runs_after_commit_callback(database, handlers):
+    calls = []
+
+    @outbox.handler("test.event")
+    def push(db, payload):
+        calls.append(("handler", payload["user_id"]))
+        return lambda: calls.append(("after_commit", payload["user_id"]))
+
+    database.pending = [event(1, payload={"user_id": 5})]
+    OutboxDispatcher().dispatch_batch()
+
+    assert calls == [("handler", 5), ("after_commit", 5)]
+
+
+def test_after_commit_error_does_not_retry(database, handlers):
+    outbox.handler("test.event")(lambda db, payload: lambda: failing(db, payload))
+    database.pending = [event(1)]
+
+    OutboxDispatcher().dispatch_batch()
+
+    assert database.updates("UPDATE outbox SET available_at") == []
+
+
+def test_event_dispatched_elsewhere_is_skipped(database, handlers):
+    calls = []
+    outbox.handler("test.event")(lambda db, payload: calls.append(payload))
+    database.pending = [event(1)]
+    database.dispatched_elsewhere = True
+
+    OutboxDispatcher().dispatch_batch()
+
+    assert calls == []
+    assert database.updates("UPDATE outbox SET available_at") == []
+
+
+def test_empty_batch(database, handlers):
+    assert OutboxDispatcher().dispatch_batch() == 0
+    assert database.updates("UPDATE") == []
@@ -0,0 +1,93 @@
+"""
+Tests unitaires de l'index des joueurs similaires (sans base de données).
+Usage: python -m pytest tests/test_recommendations.py
+"""
+
+import numpy as np
+import pytest
+
+from app.services.recommendations import SimilarPlayersIndex
+
+
+def build(pairs, top_k=20, block_rows=2048):
+    """Construit un index à partir de paires de matchs acceptés."""
+    index = SimilarPlayersIndex(top_k=top_k, block_rows=block_rows)
+    user1 = np.array([a for a, _ in pairs], dtype=np.int64)
+    user2 = np.array([b for _, b in pairs], dtype=np.int64)
+
+    # rebuild() sans lire les matchs en base
+    index._SimilarPlayersIndex__load_accepted_pairs = lambda: (user1, user2)
+    index.rebuild()
+    return index
+
+
+def brute_force(pairs):
+    """Similarités cosinus entre toutes les lignes de la matrice d'adjacence."""
+    partners = {}
+    for a, b in pairs:
+        partners.setdefault(a, set()).add(b)
+        partners.setdefault(b, set()).add(a)
+
+    similarities = {}
+    for u in partners:
+        for v in partners:
+            common = len(partners[u] & partners[v])
+            if u != v and common:
+                similarities[(u, v)] = common / np.sqrt(len(partners[u]) * len(partners[v]))
+    return similarities
+
+
+def test_empty_index():
+    index = build([])
+    assert index.size == 0
+    assert index.similar_to(1) == []
+
+
+def test_cosine_similarity():
+    # 1 et 2 ont accepté les mêmes joueurs (10 et 11), 3 n'en partage qu'un
+    index = build([(1, 10), (1, 11), (2, 10), (2, 11), (3, 10)])
+
+    similar = dict(index.similar_to(1))
+    assert similar[2] == pytest.approx(1.0)
+    assert similar[3] == pytest.approx(1 / np.sqrt(2))
+    assert 1 not in similar
+
+
+def test_top_k_matches_brute_force():
+    rng = np.random.default_rng(42)
+    pairs = {tuple(sorted(p)) for p in rng.integers(1, 60, size=(400, 2)).tolist() if p[0] != p[1]}
+    pairs = sorted(pairs)
+    expected = brute_force(pairs)
+
+    # Plusieurs blocs de lignes pour couvrir le découpage
+    index = build(pairs, top_k=5, block_rows=7)
+
+    for user_id in {u for pair in pairs for u in pair}:
+        similar = index.similar_to(user_id)
+        scores = [score for _, score in similar]
+        assert scores == sorted(scores, reverse=True)
+
+        candidates = sorted(
+            (score for (u, _), score in expected.items() if u == user_id), reverse=True
+        )
+        assert len(similar) == min(5, len(candidates))
+        # Mêmes scores que les K meilleurs (les ex aequo peuvent changer de voisin)
+        assert scores == pytest.approx(candidates[:5], rel=1e-5)
+        for other_id, score in similar:
+            assert expected[(user_id, other_id)] == pytest.approx(score, rel=1e-5)
+
+
+def test_duplicate_matches_count_once():
+    index = build([(1, 10), (10, 1), (1, 10), (2, 10)])
+    assert index.similar_to(1) == [(2, pytest.approx(1.0))]
+
+
+def test_recommend_excludes_partners():
+    index = build([(1, 10), (1, 11), (2, 10), (2, 11), (3, 10), (3, 12)])
+
+    # Le joueur a accepté 1 : ses voisins 2 et 3 sont recommandés, pas 1
+    recommendations = index.recommend([1], exclude=[3], limit=5)
+    assert set(recommendations) == {2}
+
+    recommendations = index.recommend([1, 2], limit=1)
+    assert list(recommendations) == [3]
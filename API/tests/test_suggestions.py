@@ -0,0 +1,96 @@
+"""
+Tests unitaires de l'index de suggestions (sans base de données).
+Usage: python -m pytest tests/test_suggestions.py
+"""
+
+import random
+
+import pytest
+
+from app.services.suggestions import SuggestionIndex
+
+
+def osa_distance(a, b):
+    """Distance d'édition avec transpositions adjacentes (référence naïve)."""
+    d = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        d[i][0] = i
+    for j in range(len(b) + 1):
+        d[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def build(names, **kwargs):
+    index = SuggestionIndex(("username",), **kwargs)
+    index.replace_all((item_id, (name,)) for item_id, name in enumerate(names))
+    return index
+
+
+@pytest.fixture(scope="module")
+def names():
+    rng = random.Random(1)
+    return sorted({"".join(rng.choices("abcde", k=rng.randint(1, 7))) for _ in range(1000)})
+
+
+@pytest.mark.parametrize("max_distance", [1, 2])
+def test_fuzzy_matches_brute_force(names, max_distance):
+    index = build(names)
+    rng = random.Random(max_distance)
+
+    for _ in range(60):
+        q = "".join(rng.choices("abcde", k=rng.randint(1, 7)))
+        expected = sorted(
+            (item_id, distance)
+            for item_id, distance in ((i, osa_distance(q, name)) for i, name in enumerate(names))
+            if distance <= max_distance
+        )
+        assert sorted(index.fuzzy(q, max_distance, limit=len(names))) == expected, q
+
+
+def test_fuzzy_counts_transposition_as_one_edit():
+    index = build(["gamer", "gmaer", "gaemr"])
+
+    # À distance égale, les noms sont triés alphabétiquement
+    assert index.fuzzy("gamer", max_distance=1) == [(0, 0), (2, 1), (1, 1)]
+
+
+def test_fuzzy_closest_first_and_limit():
+    index = build(["player", "playr", "plyr", "other"])
+
+    assert index.fuzzy("Player", max_distance=2, limit=2) == [(0, 0), (1, 1)]
+
+
+def test_fuzzy_node_budget(names):
+    capped = build(names, max_fuzzy_nodes=20)
+    full = build(names)
+
+    found = capped.fuzzy("abcd", max_distance=2, limit=len(names))
+    assert len(found) < len(full.fuzzy("abcd", max_distance=2, limit=len(names)))
+    assert set(found) <= set(full.fuzzy("abcd", max_distance=2, limit=len(names)))
+
+
+def test_fuzzy_after_changes():
+    index = build(["alice", "bob", "carol"])
+    assert index.fuzzy("alicia", max_distance=2) == [(0, 2)]
+
+    # Les modifications suivant une recherche ne touchent pas le tableau parcouru
+    index.upsert(3, ("alicie",))
+    index.remove(0)
+    index.upsert(1, ("bobby",))
+
+    assert index.fuzzy("alicia", max_distance=2) == [(3, 1)]
+    assert index.fuzzy("bob", max_distance=1) == []
+    assert index.fuzzy("bobb", max_distance=1) == [(1, 1)]
+
+
+def test_search_prefix_before_infix():
+    index = SuggestionIndex(("name", "players"), rank=lambda item: -item[1])
+    index.replace_all([(1, ("Rocket League", 10)), (2, ("Rocket Arena", 50)), (3, ("Pocket Rocket", 90))])
+
+    assert [item["id"] for item in index.search("rocket")] == [2, 1, 3]
+    assert index.search("ro", limit=1) == [{"id": 2, "name": "Rocket Arena", "players": 50}]
@@ -0,0 +1,142 @@
+"""
+Tests unitaires des jetons de synchronisation (sans base de données).
+Usage: python -m pytest tests/test_sync.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.sync import (
+    _advance,
+    _advance_states,
+    _stable_cutoff,
+    _too_many_seen,
+    decode_token,
+    encode_token,
+)
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+OLD = NOW - timedelta(hours=1)
+
+
+def row(row_id, created_at=OLD):
+    return {"id": row_id, "created_at": created_at}
+
+
+def test_token_roundtrip():
+    watermark = {
+        "m": 120,
+        "n": 7,
+        "sm": [121, 125],
+        "sn": [],
+        "sr": [[1, 2, 118]],
+        "sx": [[4, "2026-01-01T11:59:30.250000"]],
+        "t": "2026-01-01 11:59:00",
+    }
+    token = encode_token(watermark)
+
+    assert "=" not in token
+    assert decode_token(token) == watermark
+
+
+def test_token_without_seen_lists():
+    token = encode_token({"m": 1, "n": 2, "t": "2026-01-01 11:59:00"})
+
+    decoded = decode_token(token)
+    assert decoded["sm"] == decoded["sn"] == decoded["sr"] == decoded["sx"] == []
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not a token",
+    encode_token({"m": 1, "n": 2}),
+    encode_token({"m": "x", "n": 2, "t": "2026-01-01 11:59:00"}),
+    encode_token({"m": 1, "n": 2, "t": "yesterday"}),
+])
+def test_invalid_token(token):
+    with pytest.raises(HTTPException) as error:
+        decode_token(token)
+    assert error.value.status_code == 400
+
+
+def test_stable_cutoff_covers_second_precision():
+    cutoff = _stable_cutoff(NOW)
+    assert cutoff == NOW - timedelta(seconds=settings.SYNC_SAFETY_WINDOW_SECONDS + 1)
+
+
+def test_advance_moves_floor_over_stable_rows():
+    rows = [row(11), row(12), row(13)]
+    new_rows, floor, seen = _advance(rows, 10, [], _stable_cutoff(NOW), True)
+
+    assert [r["id"] for r in new_rows] == [11, 12, 13]
+    assert floor == 13
+    assert seen == []
+
+
+def test_advance_keeps_recent_rows_above_floor():
+    cutoff = _stable_cutoff(NOW)
+    rows = [row(11), row(12, NOW), row(14, NOW)]
+    new_rows, floor, seen = _advance(rows, 10, [], cutoff, True)
+
+    assert [r["id"] for r in new_rows] == [11, 12, 14]
+    assert floor == 11
+    assert seen == [12, 14]
+
+    # Le 13 est validé après le 14 : il est renvoyé une seule fois
+    rows = [row(12, NOW), row(13, NOW), row(14, NOW)]
+    new_rows, floor, seen = _advance(rows, floor, seen, cutoff, True)
+
+    assert [r["id"] for r in new_rows] == [13]
+    assert floor == 11
+    assert seen == [12, 13, 14]
+
+    # Une fois la fenêtre passée, le plancher avance et la liste se vide
+    later = _stable_cutoff(NOW + timedelta(hours=1))
+    new_rows, floor, seen = _advance(rows, floor, seen, later, True)
+
+    assert new_rows == []
+    assert floor == 14
+    assert seen == []
+
+
+def test_advance_incomplete_page_keeps_unscanned_seen_ids():
+    cutoff = _stable_cutoff(NOW)
+    rows = [row(12, NOW), row(13, NOW)]
+    new_rows, floor, seen = _advance(rows, 10, [12, 20], cutoff, False)
+
+    assert [r["id"] for r in new_rows] == [13]
+    assert floor == 10
+    assert seen == [12, 13, 20]
+
+
+def test_advance_complete_page_drops_vanished_seen_ids():
+    cutoff = _stable_cutoff(NOW)
+    new_rows, floor, seen = _advance([row(12, NOW)], 10, [12, 20], cutoff, True)
+
+    assert new_rows == []
+    assert seen == [12]
+
+
+def test_advance_states_returns_each_state_once():
+    floor = NOW - timedelta(seconds=settings.SYNC_SAFETY_WINDOW_SECONDS)
+    rows = [
+        {"updated_at": floor - timedelta(seconds=1)},
+        {"updated_at": floor + timedelta(seconds=1)},
+        {"updated_at": floor + timedelta(seconds=2)},
+    ]
+    keys = [[1, 2, 30], [1, 3, 40], [2, 1, 41]]
+
+    new_rows, seen = _advance_states(rows, keys, [[1, 3, 40]], floor)
+
+    assert new_rows == [rows[0], rows[2]]
+    assert seen == [[1, 3, 40], [2, 1, 41]]
+
+
+def test_too_many_seen(monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_MAX_SEEN_IDS", 2)
+
+    assert not _too_many_seen([1, 2], [])
+    assert _too_many_seen([], [1, 2, 3])
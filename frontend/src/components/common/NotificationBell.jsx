@@ -44,12 +44,25 @@ const NotificationBell = () => {
   const [loading, setLoading] = useState(false);
   const dropdownRef = useRef(null);
 
-  // Load unread count on mount
+  // Live unread count and notifications (polling fallback without EventSource)
   useEffect(() => {
-    loadUnreadCount();
-    // Poll for new notifications every 30 seconds
-    const interval = setInterval(loadUnreadCount, 30000);
-    return () => clearInterval(interval);
+    if (!window.EventSource) {
+      loadUnreadCount();
+      const interval = setInterval(loadUnreadCount, 30000);
+      return () => clearInterval(interval);
+    }
+
+    const source = notificationsAPI.stream({
+      onUnreadCount: setUnreadCount,
+      // Coalesced notifications replace an older one (data.replaces)
+      onNotification: (notification) => {
+        const replaced = notification.data?.replaces;
+        setNotifications(prev =>
+          [notification, ...prev.filter(n => n.id !== notification.id && n.id !== replaced)].slice(0, 10)
+        );
+      },
+    });
+    return () => source.close();
   }, []);
 
   // Close dropdown on outside click
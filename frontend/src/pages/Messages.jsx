@@ -24,9 +24,38 @@ export default function Messages() {
   const [sending, setSending] = useState(false);
   const [showSidebar, setShowSidebar] = useState(true);
   const messagesEndRef = useRef(null);
+  const selectedRef = useRef(null);
 
   useEffect(() => { if (user) loadConversations(); }, [user]);
 
+  useEffect(() => { selectedRef.current = selectedConversation; }, [selectedConversation]);
+
+  // Real-time delivery of incoming messages
+  useEffect(() => {
+    if (!user) return undefined;
+    const socket = messagesAPI.connect((event) => {
+      if (event.type !== 'message') return;
+      const incoming = event.message;
+      if (selectedRef.current?.user_id === incoming.sender_id) {
+        setMessages(prev => (prev.some(m => m.id === incoming.id) ? prev : [...prev, incoming]));
+        if (incoming.id) messagesAPI.markRead(incoming.sender_id, incoming.id).catch(() => {});
+      }
+      setConversations(prev => {
+        const idx = prev.findIndex(c => c.user_id === incoming.sender_id);
+        if (idx < 0) { loadConversations(); return prev; }
+        const arr = [...prev];
+        arr[idx] = {
+          ...arr[idx],
+          last_message: incoming.content,
+          last_message_time: incoming.created_at,
+          unread_count: selectedRef.current?.user_id === incoming.sender_id ? 0 : arr[idx].unread_count + 1,
+        };
+        return arr;
+      });
+    });
+    return () => socket.close();
+  }, [user]);
+
   useEffect(() => {
     const params = new URLSearchParams(location.search);
     const userId = params.get('user');
@@ -72,7 +101,13 @@ export default function Messages() {
     setLoadingMessages(true);
     try {
       const response = await messagesAPI.getMessages(userId);
-      setMessages(response.data.messages);
+      const { messages: page, participants = {} } = response.data;
+      // Sender details are sent once per page
+      setMessages(page.map(m => ({
+        ...m,
+        sender_username: participants[m.sender_id]?.username,
+        sender_avatar: participants[m.sender_id]?.avatar_url,
+      })));
     } catch (err) {
       if (err.response?.status === 403) {
         showError('Tu peux seulement envoyer des messages aux joueurs avec qui tu as un match accepté');
@@ -105,7 +140,7 @@ export default function Messages() {
     try {
       const response = await messagesAPI.sendMessage(selectedConversation.user_id, messageText);
       // Replace optimistic message with real one
-      setMessages(prev => prev.map(m => m.id === tempId ? response.data.message : m));
+      setMessages(prev => prev.map(m => m.id === tempId ? { ...m, id: response.data.message_id, pending: false } : m));
 
       setConversations(prev => {
         const idx = prev.findIndex(c => c.user_id === selectedConversation.user_id);
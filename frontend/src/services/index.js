@@ -13,3 +13,4 @@ export { forumAPI } from './forum';
 export { statsAPI } from './stats';
 export { searchAPI } from './search';
 export { notificationsAPI } from './notifications';
+export { syncAPI } from './sync';
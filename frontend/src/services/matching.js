@@ -31,6 +31,13 @@ export const matchingAPI = {
    * @returns {Promise} API response
    */
   rejectMatch: (matchId) => apiClient.post(`/matches/${matchId}/reject`),
+
+  /**
+   * Accept or reject several matches in one request
+   * @param {Array<{match_id: number, action: string}>} decisions - Decisions to apply
+   * @returns {Promise} API response with a result per decision
+   */
+  decideMatches: (decisions) => apiClient.post('/matches/decisions', { decisions }),
 };
 
 export default matchingAPI;
@@ -3,7 +3,7 @@
  * Handles messaging between users
  */
 
-import apiClient from './config';
+import apiClient, { API_BASE_URL } from './config';
 
 export const messagesAPI = {
   /**
@@ -13,11 +13,33 @@ export const messagesAPI = {
   getConversations: () => apiClient.get('/messages'),
 
   /**
-   * Get messages with a specific user
+   * Get a page of messages with a specific user
    * @param {number} userId - ID of the other user
-   * @returns {Promise} API response with messages
+   * @param {Object} params - Optional keyset cursor (before_id or after_id) and limit
+   * @returns {Promise} API response with messages and participants
    */
-  getMessages: (userId) => apiClient.get(`/messages/${userId}`),
+  getMessages: (userId, params = {}) => {
+    const queryParams = new URLSearchParams();
+    if (params.before_id) queryParams.append('before_id', params.before_id);
+    if (params.after_id) queryParams.append('after_id', params.after_id);
+    if (params.limit) queryParams.append('limit', params.limit);
+
+    return apiClient.get(`/messages/${userId}?${queryParams.toString()}`);
+  },
+
+  /**
+   * Search the messages of a conversation
+   * @param {number} userId - ID of the other user
+   * @param {string} q - Search text
+   * @param {number} beforeId - Optional cursor (next_before_id of the previous page)
+   * @returns {Promise} API response with matching messages, newest first
+   */
+  searchMessages: (userId, q, beforeId = null) => {
+    const queryParams = new URLSearchParams({ q });
+    if (beforeId) queryParams.append('before_id', beforeId);
+
+    return apiClient.get(`/messages/${userId}/search?${queryParams.toString()}`);
+  },
 
   /**
    * Send a message to another user
@@ -27,6 +49,29 @@ export const messagesAPI = {
    */
   sendMessage: (receiverId, content) =>
     apiClient.post('/messages', { receiver_id: receiverId, content }),
+
+  /**
+   * Mark a conversation as read up to a message
+   * @param {number} userId - ID of the other user
+   * @param {number} messageId - ID of the last message read
+   * @returns {Promise} API response
+   */
+  markRead: (userId, messageId) =>
+    apiClient.post(`/messages/${userId}/read?message_id=${messageId}`),
+
+  /**
+   * Open the real-time messaging WebSocket
+   * @param {Function} onEvent - Called with each event received from the server
+   * @returns {WebSocket} The open socket (call close() to disconnect)
+   */
+  connect: (onEvent) => {
+    const token = localStorage.getItem('token');
+    const socket = new WebSocket(
+      `${API_BASE_URL.replace(/^http/, 'ws')}/ws/messages?token=${encodeURIComponent(token)}`
+    );
+    socket.onmessage = (event) => onEvent(JSON.parse(event.data));
+    return socket;
+  },
 };
 
 export default messagesAPI;
@@ -3,12 +3,12 @@
  * Handles notification operations
  */
 
-import apiClient from './config';
+import apiClient, { API_BASE_URL } from './config';
 
 export const notificationsAPI = {
   /**
    * Get user's notifications
-   * @param {Object} params - Query parameters
+   * @param {Object} params - Query parameters (before_id: next_before_id of the previous page)
    * @returns {Promise} API response with notifications
    */
   getNotifications: (params = {}) => {
@@ -16,6 +16,8 @@ export const notificationsAPI = {
     if (params.unread_only) queryParams.append('unread_only', 'true');
     if (params.limit) queryParams.append('limit', params.limit);
     if (params.offset) queryParams.append('offset', params.offset);
+    if (params.before_id) queryParams.append('before_id', params.before_id);
+    if (params.batch_users) queryParams.append('batch_users', 'true');
 
     return apiClient.get(`/notifications?${queryParams.toString()}`);
   },
@@ -26,6 +28,22 @@ export const notificationsAPI = {
    */
   getUnreadCount: () => apiClient.get('/notifications/unread-count'),
 
+  /**
+   * Open the notifications event stream (server-sent events)
+   * The browser reconnects automatically and resumes with Last-Event-ID.
+   * @param {Object} handlers - onNotification(notification) and onUnreadCount(count)
+   * @returns {EventSource} The stream (call close() to disconnect)
+   */
+  stream: ({ onNotification, onUnreadCount }) => {
+    const token = localStorage.getItem('token');
+    const source = new EventSource(
+      `${API_BASE_URL}/notifications/stream?token=${encodeURIComponent(token)}`
+    );
+    source.addEventListener('notification', (e) => onNotification?.(JSON.parse(e.data)));
+    source.addEventListener('unread_count', (e) => onUnreadCount?.(JSON.parse(e.data).unread_count));
+    return source;
+  },
+
   /**
    * Mark a notification as read
    * @param {number} notificationId - Notification ID
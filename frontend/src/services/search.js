@@ -8,8 +8,8 @@ import apiClient from './config';
 export const searchAPI = {
   /**
    * Search for players
-   * @param {Object} params - Search parameters
-   * @returns {Promise} API response with players
+   * @param {Object} params - Search parameters (facets: true to get the facet counts)
+   * @returns {Promise} API response with players, and facet counts if requested
    */
   searchPlayers: (params) => {
     const queryParams = new URLSearchParams();
@@ -18,6 +18,8 @@ export const searchAPI = {
     if (params.skill_level) queryParams.append('skill_level', params.skill_level);
     if (params.region) queryParams.append('region', params.region);
     if (params.looking_for) queryParams.append('looking_for', params.looking_for);
+    if (params.game_id) queryParams.append('game_id', params.game_id);
+    if (params.facets) queryParams.append('facets', 'true');
     if (params.limit) queryParams.append('limit', params.limit);
     if (params.offset) queryParams.append('offset', params.offset);
 
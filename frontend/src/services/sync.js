@@ -0,0 +1,25 @@
+/**
+ * Sync API Service
+ * Incremental changes (messages, reads, notifications, matches) in one call
+ */
+
+import apiClient from './config';
+
+export const syncAPI = {
+  /**
+   * Get changes since a token, waiting for one if nothing changed
+   * @param {string|null} since - Token returned by the previous call (null to start)
+   * @param {number} timeout - Seconds to wait for a change
+   * @returns {Promise} API response with changes and the next token; when
+   *   `resync` is true, reload the data before syncing from that token
+   */
+  sync: (since = null, timeout = 25) => {
+    const queryParams = new URLSearchParams();
+    if (since) queryParams.append('since', since);
+    queryParams.append('timeout', timeout);
+
+    return apiClient.get(`/sync?${queryParams.toString()}`, { timeout: (timeout + 10) * 1000 });
+  },
+};
+
+export default syncAPI;
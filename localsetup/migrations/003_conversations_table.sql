@@ -0,0 +1,55 @@
+-- Migration: Add conversations summary table
+-- Description: One row per user pair (canonical order: user_low_id < user_high_id)
+-- holding the last message and per-side unread counters, so the inbox is an
+-- indexed range read instead of a GROUP BY over the whole messages history.
+
+CREATE TABLE IF NOT EXISTS conversations (
+    user_low_id INT NOT NULL,
+    user_high_id INT NOT NULL,
+    last_message_id INT NULL,
+    last_sender_id INT NULL,
+    last_message VARCHAR(255) NULL,
+    last_message_time TIMESTAMP NULL,
+    unread_low INT NOT NULL DEFAULT 0,   -- unread messages for user_low_id
+    unread_high INT NOT NULL DEFAULT 0,  -- unread messages for user_high_id
+
+    PRIMARY KEY (user_low_id, user_high_id),
+    INDEX idx_conversations_low_time (user_low_id, last_message_time),
+    INDEX idx_conversations_high_time (user_high_id, last_message_time),
+
+    FOREIGN KEY (user_low_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_high_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Backfill from existing messages
+INSERT INTO conversations (
+    user_low_id, user_high_id, last_message_id, last_sender_id,
+    last_message, last_message_time, unread_low, unread_high
+)
+SELECT
+    pair.user_low_id,
+    pair.user_high_id,
+    m.id,
+    m.sender_id,
+    LEFT(m.content, 255),
+    m.created_at,
+    pair.unread_low,
+    pair.unread_high
+FROM (
+    SELECT
+        LEAST(sender_id, receiver_id) AS user_low_id,
+        GREATEST(sender_id, receiver_id) AS user_high_id,
+        MAX(id) AS last_message_id,
+        SUM(is_read = FALSE AND receiver_id < sender_id) AS unread_low,
+        SUM(is_read = FALSE AND receiver_id > sender_id) AS unread_high
+    FROM messages
+    GROUP BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+) pair
+JOIN messages m ON m.id = pair.last_message_id
+ON DUPLICATE KEY UPDATE
+    last_sender_id = VALUES(last_sender_id),
+    last_message = VALUES(last_message),
+    last_message_time = VALUES(last_message_time),
+    unread_low = VALUES(unread_low),
+    unread_high = VALUES(unread_high),
+    last_message_id = VALUES(last_message_id);
@@ -0,0 +1,52 @@
+-- Migration: Add per-conversation read watermarks
+-- Description: One row per (reader, peer) holding the ID of the last message
+-- the reader has read from the peer. Messages from the peer with a higher ID
+-- are unread. Replaces the per-message is_read flag, which is no longer
+-- updated.
+
+CREATE TABLE IF NOT EXISTS conversation_reads (
+    reader_id INT NOT NULL,
+    peer_id INT NOT NULL,
+    last_read_message_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (reader_id, peer_id),
+
+    FOREIGN KEY (reader_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (peer_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Unread counts: range of one conversation direction above the watermark
+ALTER TABLE messages ADD INDEX idx_messages_direction_id (sender_id, receiver_id, id);
+
+-- Backfill: the watermark is just below the first unread message, or the
+-- last message if everything was read
+INSERT INTO conversation_reads (reader_id, peer_id, last_read_message_id)
+SELECT
+    receiver_id,
+    sender_id,
+    COALESCE(MIN(CASE WHEN is_read = FALSE THEN id END) - 1, MAX(id))
+FROM messages
+GROUP BY receiver_id, sender_id
+ON DUPLICATE KEY UPDATE
+    last_read_message_id = GREATEST(last_read_message_id, VALUES(last_read_message_id));
+
+-- Recompute the conversations unread counters from the watermarks
+UPDATE conversations c
+SET
+    unread_low = (
+        SELECT COUNT(*) FROM messages m
+        WHERE m.sender_id = c.user_high_id AND m.receiver_id = c.user_low_id
+            AND m.id > COALESCE((
+                SELECT r.last_read_message_id FROM conversation_reads r
+                WHERE r.reader_id = c.user_low_id AND r.peer_id = c.user_high_id
+            ), 0)
+    ),
+    unread_high = (
+        SELECT COUNT(*) FROM messages m
+        WHERE m.sender_id = c.user_low_id AND m.receiver_id = c.user_high_id
+            AND m.id > COALESCE((
+                SELECT r.last_read_message_id FROM conversation_reads r
+                WHERE r.reader_id = c.user_high_id AND r.peer_id = c.user_low_id
+            ), 0)
+    );
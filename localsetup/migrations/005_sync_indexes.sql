@@ -0,0 +1,15 @@
+-- Migration: Support incremental sync
+-- Description: Microsecond update times and indexes used by GET /sync to
+-- find read-state and match changes since a watermark.
+
+ALTER TABLE conversation_reads
+    MODIFY updated_at TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_conversation_reads_reader_updated (reader_id, updated_at),
+    ADD INDEX idx_conversation_reads_peer_updated (peer_id, updated_at);
+
+ALTER TABLE matches
+    MODIFY updated_at TIMESTAMP(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_matches_user1_updated (user1_id, updated_at),
+    ADD INDEX idx_matches_user2_updated (user2_id, updated_at);
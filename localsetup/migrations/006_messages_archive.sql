@@ -0,0 +1,28 @@
+-- Migration: Add cold storage for old messages
+-- Description: MySQL cannot partition tables with foreign keys, so old
+-- messages are moved by the archival job from `messages` (hot) to
+-- `messages_archive` (cold). Per-sender archived counts keep message
+-- statistics from scanning the archive.
+
+CREATE TABLE IF NOT EXISTS messages_archive (
+    id INT PRIMARY KEY,                 -- same ID as in messages
+    sender_id INT NOT NULL,
+    receiver_id INT NOT NULL,
+    content TEXT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    INDEX idx_messages_archive_conversation (sender_id, receiver_id, created_at),
+    INDEX idx_messages_archive_receiver (receiver_id),
+
+    FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS messages_archive_counts (
+    sender_id INT PRIMARY KEY,
+    message_count INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,6 @@
+-- Migration: Full-text search on messages
+-- Description: FULLTEXT indexes used by GET /messages/{user_id}/search.
+-- Words shorter than innodb_ft_min_token_size (3 by default) are not indexed.
+
+ALTER TABLE messages ADD FULLTEXT INDEX ft_messages_content (content);
+ALTER TABLE messages_archive ADD FULLTEXT INDEX ft_messages_archive_content (content);
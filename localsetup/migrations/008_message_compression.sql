@@ -0,0 +1,13 @@
+-- Migration: Optional compression of long message bodies
+-- Description: Messages longer than MESSAGE_COMPRESSION_THRESHOLD bytes are
+-- stored zlib-compressed in content_zip, with is_compressed set. For those
+-- rows `content` only holds a short preview (first 255 characters), which is
+-- also what the FULLTEXT index sees.
+
+ALTER TABLE messages
+    ADD COLUMN content_zip MEDIUMBLOB NULL AFTER content,
+    ADD COLUMN is_compressed BOOLEAN NOT NULL DEFAULT FALSE AFTER content_zip;
+
+ALTER TABLE messages_archive
+    ADD COLUMN content_zip MEDIUMBLOB NULL AFTER content,
+    ADD COLUMN is_compressed BOOLEAN NOT NULL DEFAULT FALSE AFTER content_zip;
@@ -0,0 +1,20 @@
+-- Migration: Maintained unread notification counters
+-- Description: One row per user with the number of unread notifications,
+-- adjusted by the notification routes and reconciled periodically, so the
+-- unread count is a primary key read instead of a COUNT(*).
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INT PRIMARY KEY,
+    unread_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Backfill from existing notifications
+INSERT INTO notification_counters (user_id, unread_count)
+SELECT user_id, COUNT(*)
+FROM notifications
+WHERE is_read = FALSE
+GROUP BY user_id
+ON DUPLICATE KEY UPDATE unread_count = VALUES(unread_count);
@@ -0,0 +1,8 @@
+-- Migration: Notification coalescing and retention
+-- Description: Indexes for finding an unread notification to merge into
+-- (same type and sender) and for deleting old read notifications in small
+-- batches.
+
+ALTER TABLE notifications
+    ADD INDEX idx_notifications_coalesce (user_id, is_read, type, from_user_id),
+    ADD INDEX idx_notifications_read_at (is_read, read_at);
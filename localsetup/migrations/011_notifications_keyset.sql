@@ -0,0 +1,5 @@
+-- Migration: Keyset pagination of notifications
+-- Description: Index read by GET /notifications?before_id=..., ordered by
+-- (created_at, id) within a user.
+
+ALTER TABLE notifications ADD INDEX idx_notifications_user_created_id (user_id, created_at, id);
@@ -0,0 +1,7 @@
+-- Migration: Full-text player search
+-- Description: ngram FULLTEXT indexes used by GET /search/players
+-- (PLAYER_SEARCH_ENGINE=fulltext). The ngram parser indexes every sequence of
+-- ngram_token_size characters (2 by default), so words match inside usernames.
+
+ALTER TABLE users ADD FULLTEXT INDEX ft_users_username (username) WITH PARSER ngram;
+ALTER TABLE user_profiles ADD FULLTEXT INDEX ft_user_profiles_bio (bio) WITH PARSER ngram;
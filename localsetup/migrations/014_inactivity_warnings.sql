@@ -0,0 +1,6 @@
+-- Migration: Inactivity warnings sent once
+-- Description: Time the last inactivity warning was enqueued for an account.
+-- The daily sweep skips accounts warned since their last activity, so each
+-- period of inactivity produces a single warning.
+
+ALTER TABLE users ADD COLUMN inactivity_warned_at TIMESTAMP NULL AFTER last_activity_at;